@@ -0,0 +1,205 @@
+"""
+Time and memory-profile the ranking methods on synthetic data.
+
+Run with `python benchmarks/bench.py --help` for usage details.
+Results are written as JSON, and can be compared with the results of another
+run (e.g. from another commit) with `--compare`.
+"""
+
+import argparse
+import gc
+import json
+import logging
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from itertools import product
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from gene_ranker import __version__
+from gene_ranker.dual_dataset import DualDataset
+from gene_ranker.methods import RANKING_METHODS
+from gene_ranker.ranker import rank_dual_dataset
+from gene_ranker.synthetic import synthetic_dual_matrices
+
+log = logging.getLogger("gene_ranker.benchmarks")
+
+
+def git_commit() -> str | None:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=Path(__file__).parent,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def run_once(case: pd.DataFrame, control: pd.DataFrame, key: str):
+    dual_dataset = DualDataset(case=case, control=control)
+    method = RANKING_METHODS[key]
+    extra_args = {key: vars(method.parser.parse_args([]))}
+    rank_dual_dataset(dual_dataset, {key: method}, extra_args)
+
+
+def benchmark(case: pd.DataFrame, control: pd.DataFrame, key: str, repeats: int):
+    """Time a method (best of `repeats` runs), then measure its peak memory"""
+    times = []
+    for _ in range(repeats):
+        gc.collect()
+        start = time.perf_counter()
+        run_once(case, control, key)
+        times.append(time.perf_counter() - start)
+
+    # Tracing allocations slows things down, so do it in a separate run
+    gc.collect()
+    tracemalloc.start()
+    run_once(case, control, key)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"best_seconds": min(times), "all_seconds": times, "peak_bytes": peak}
+
+
+def compare(results: list[dict], previous: list[dict]):
+    """Print how much faster or slower each benchmark got, to stderr"""
+
+    def key(x):
+        return (x["method"], x["genes"], x["samples"], x["sparsity"], x["ties"])
+
+    old = {key(x): x for x in previous}
+    print("method\tgenes\tsamples\ttime_ratio\tmemory_ratio", file=sys.stderr)
+    for result in results:
+        if (before := old.get(key(result))) is None:
+            continue
+        time_ratio = result["best_seconds"] / before["best_seconds"]
+        memory_ratio = result["peak_bytes"] / max(before["peak_bytes"], 1)
+        print(
+            f"{result['method']}\t{result['genes']}\t{result['samples']}\t"
+            f"{time_ratio:.3f}\t{memory_ratio:.3f}",
+            file=sys.stderr,
+        )
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--methods",
+        nargs="+",
+        choices=list(RANKING_METHODS.keys()),
+        default=list(RANKING_METHODS.keys()),
+        help="Methods to benchmark. Defaults to all of them.",
+    )
+    parser.add_argument(
+        "--genes",
+        nargs="+",
+        type=int,
+        default=[1_000, 10_000],
+        help="Numbers of genes to test. Defaults to %(default)s.",
+    )
+    parser.add_argument(
+        "--samples",
+        nargs="+",
+        type=int,
+        default=[10, 100],
+        help=(
+            "Total numbers of samples to test, split evenly between case "
+            "and control. Defaults to %(default)s."
+        ),
+    )
+    parser.add_argument(
+        "--sparsity",
+        type=float,
+        default=0.3,
+        help="Fraction of zero counts. Defaults to %(default)s.",
+    )
+    parser.add_argument(
+        "--ties",
+        type=float,
+        default=0.1,
+        help="Fraction of genes with heavily tied values. Defaults to %(default)s.",
+    )
+    parser.add_argument(
+        "--repeats",
+        type=int,
+        default=3,
+        help="Number of timed runs for each benchmark. Defaults to %(default)s.",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=None,
+        help="Output JSON file. Defaults to stdout.",
+    )
+    parser.add_argument(
+        "--compare",
+        type=Path,
+        default=None,
+        help="A previous JSON output to compare the results with.",
+    )
+    args = parser.parse_args(args)
+
+    results = []
+    for genes, samples in product(args.genes, args.samples):
+        n_case = samples // 2
+        case, control = synthetic_dual_matrices(
+            genes,
+            n_case,
+            samples - n_case,
+            sparsity=args.sparsity,
+            ties=args.ties,
+            seed=args.seed,
+        )
+        for key in args.methods:
+            log.info(f"Benchmarking '{key}' on {genes} genes x {samples} samples")
+            result = benchmark(case, control, key, args.repeats)
+            results.append(
+                {
+                    "method": key,
+                    "genes": genes,
+                    "samples": samples,
+                    "sparsity": args.sparsity,
+                    "ties": args.ties,
+                    **result,
+                }
+            )
+
+    report = {
+        "metadata": {
+            "commit": git_commit(),
+            "version": __version__,
+            "date": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "machine": platform.machine(),
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+    if args.output:
+        with args.output.open("w+") as stream:
+            json.dump(report, stream, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+
+    if args.compare:
+        with args.compare.open("r") as stream:
+            compare(results, json.load(stream)["results"])
+
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,14 @@ import argparse
 import logging
 import sys
 from pathlib import Path
+from typing import Optional
 
 from gene_ranker import __version__
 from gene_ranker.methods import RANKING_METHODS
-from gene_ranker.ranker import run_method
+
+# The other gene_ranker modules import pandas and numpy, which are slow to
+# import. They are imported only after the arguments are parsed, so that
+# e.g. `--version` and `--list-methods` are fast.
 
 log = logging.getLogger(__name__)
 
@@ -27,10 +31,86 @@ class PrintVersionAction(argparse.Action):
         return
 
 
-def bin(args=None):
+def make_cache(cache_dir: Optional[Path], cache_size: Optional[int]):
+    """Make a NormalizationCache from the command line options, if needed"""
+    if not cache_dir:
+        return None
 
-    parser = argparse.ArgumentParser()
+    from gene_ranker.cache import NormalizationCache
+
+    if cache_size is None:
+        return NormalizationCache(cache_dir)
+    return NormalizationCache(cache_dir, max_size=cache_size * 1024**2)
+
+
+def add_filter_arguments(parser: argparse.ArgumentParser):
+    """Add the options to filter genes before ranking them to a parser"""
+    group = parser.add_argument_group(
+        "gene filtering",
+        "Filter out genes before ranking them (and before normalizing them). "
+        "Expression criteria consider case and control samples together.",
+    )
+    group.add_argument(
+        "--min-mean",
+        help="Only rank genes with a mean expression over this value.",
+        type=float,
+        default=None,
+    )
+    group.add_argument(
+        "--min-samples-expressed",
+        help=(
+            "Only rank genes expressed (over --expression-threshold) in at "
+            "least this many samples."
+        ),
+        type=int,
+        default=None,
+    )
+    group.add_argument(
+        "--expression-threshold",
+        help=(
+            "The value over which a gene counts as expressed in a sample. "
+            "Defaults to %(default)s."
+        ),
+        type=float,
+        default=0,
+    )
+    group.add_argument(
+        "--allow-list",
+        help="File with the IDs of the only genes to rank, one per line.",
+        type=Path,
+        default=None,
+    )
+    group.add_argument(
+        "--deny-list",
+        help="File with the IDs of genes not to rank, one per line.",
+        type=Path,
+        default=None,
+    )
 
+
+def make_gene_filter(args: argparse.Namespace):
+    """Make a GeneFilter from the command line options, if needed"""
+    if (
+        args.min_mean is None
+        and args.min_samples_expressed is None
+        and args.allow_list is None
+        and args.deny_list is None
+    ):
+        return None
+
+    from gene_ranker.filtering import GeneFilter
+
+    return GeneFilter.from_files(
+        allow_list=args.allow_list,
+        deny_list=args.deny_list,
+        min_mean=args.min_mean,
+        min_samples_expressed=args.min_samples_expressed,
+        expression_threshold=args.expression_threshold,
+    )
+
+
+def add_info_arguments(parser: argparse.ArgumentParser):
+    """Add the --list-methods and --version options to a parser"""
     parser.add_argument(
         "--list-methods",
         help="List all available methods and a brief description.",
@@ -46,9 +126,156 @@ def bin(args=None):
         action=PrintVersionAction,
     )
 
+
+def add_output_arguments(parser: argparse.ArgumentParser, output_dir: bool = False):
+    """Add the options to choose where and how to write the rankings to a parser
+
+    Args:
+        parser (argparse.ArgumentParser): The parser to add the options to.
+        output_dir (bool): Also add --output-dir, to write one file per
+            contrast instead of a single --output-file.
+    """
+    target = parser.add_mutually_exclusive_group() if output_dir else parser
+    target.add_argument(
+        "--output-file",
+        help=(
+            "Output file path. Files ending in '.gz' or '.zst' are compressed. "
+            "Defaults to stdout."
+        )
+        + (
+            " All contrasts are written to it as one long table with a "
+            "'contrast' column."
+            if output_dir
+            else ""
+        ),
+        type=Path,
+        default=None,
+    )
+    if output_dir:
+        target.add_argument(
+            "--output-dir",
+            help=(
+                "Write the results of each contrast to "
+                "'<output-dir>/<contrast>.csv' (or with the extension of "
+                "--output-format)."
+            ),
+            type=Path,
+            default=None,
+        )
+
+    parser.add_argument(
+        "--output-format",
+        help=(
+            "Format of the output: 'csv', 'tsv', 'parquet', or 'rnk' (a "
+            "headerless, sorted tsv for GSEA). Defaults to guessing it from "
+            "the extension of the output file, or 'csv'."
+        ),
+        type=str,
+        default=None,
+    )
+
+    parser.add_argument(
+        "--sort-by",
+        help=(
+            "Sort the output by this column, from the highest to the lowest "
+            "value. The column is 'ranking' when running a single method, or "
+            "the name of the method when using --methods. Also chooses the "
+            "column to write in 'rnk' files."
+        ),
+        type=str,
+        default=None,
+    )
+
+
+def add_id_col_argument(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--id-col",
+        help="Name of the shared ID column between files",
+        type=str,
+        default="gene_id",
+    )
+
+
+def add_methods_argument(parser: argparse.ArgumentParser, required: bool = False):
+    parser.add_argument(
+        "--methods",
+        help=(
+            "Run several methods at once, loading the data only once. "
+            "Outputs one ranking column per method. Methods run with their "
+            "default options."
+        ),
+        nargs="+",
+        choices=list(RANKING_METHODS.keys()),
+        required=required,
+        default=None,
+    )
+
+
+def add_cache_arguments(parser: argparse.ArgumentParser):
+    """Add the options to cache normalized data to a parser"""
+    parser.add_argument(
+        "--cache-dir",
+        help=(
+            "Directory to cache normalized data in. Runs on the same input "
+            "data reuse the cached data instead of normalizing it again. "
+            "If not given, nothing is cached."
+        ),
+        type=Path,
+        default=None,
+    )
+
+    parser.add_argument(
+        "--cache-size",
+        help="Maximum size of the cache, in MiB. Defaults to 1024 (1 GiB).",
+        type=int,
+        default=None,
+    )
+
+
+def add_jobs_argument(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        help=(
+            "Number of processes to use. Methods that rank each gene "
+            "independently are run on blocks of genes in parallel. "
+            "Defaults to %(default)s."
+        ),
+        type=int,
+        default=1,
+    )
+
+
+def add_precision_argument(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--precision",
+        help=(
+            "Type to load and rank the values as. 'float32' halves the memory "
+            "used, and gives about the same rankings (sums are still "
+            "computed in float64). Defaults to %(default)s."
+        ),
+        choices=["float64", "float32"],
+        default="float64",
+    )
+
+
+def default_method_args(keys: list[str]) -> dict[str, dict]:
+    """Get the default extra arguments of some RANKING_METHODS"""
+    return {key: vars(RANKING_METHODS[key].parser.parse_args([])) for key in keys}
+
+
+def bin(args=None):
+
+    parser = argparse.ArgumentParser()
+
+    add_info_arguments(parser)
+
     parser.add_argument(
         "case_matrix",
-        help="Expression Matrix with log2 expression of case samples.",
+        help=(
+            "Expression Matrix with log2 expression of case samples. "
+            "Can be a csv, tsv, parquet, feather or npy file."
+        ),
         type=Path,
     )
     parser.add_argument(
@@ -57,15 +284,90 @@ def bin(args=None):
         type=Path,
     )
 
+    add_output_arguments(parser)
+    add_id_col_argument(parser)
+    add_methods_argument(parser)
+    add_cache_arguments(parser)
+
     parser.add_argument(
-        "--output-file", help="Output file path", type=Path, default=None
+        "--chunk-size",
+        help=(
+            "Read and rank the input this many genes at a time, writing the "
+            "results as they are computed. This bounds the memory used, but "
+            "only works with row-independent methods that do not need "
+            "normalized data. Genes should be in the same order in both files."
+        ),
+        type=int,
+        default=None,
     )
 
+    add_jobs_argument(parser)
+
     parser.add_argument(
-        "--id-col",
-        help="Name of shared ID comlumn between files",
-        type=str,
-        default="gene_id",
+        "--profile",
+        help=(
+            "Write a JSON report of the time and memory used by each stage "
+            "of the run (loading, aligning, normalizing, ranking and writing) "
+            "to this file."
+        ),
+        type=Path,
+        default=None,
+    )
+
+    parser.add_argument(
+        "--skip-constant",
+        help=(
+            "Rank genes with the same value in all samples (like genes that "
+            "are never expressed) on a single row per value, instead of once "
+            "each. This gives the same results faster when many genes are "
+            "constant. Always done for sparse (.mtx, .npz) inputs."
+        ),
+        action="store_true",
+    )
+
+    add_precision_argument(parser)
+    add_filter_arguments(parser)
+
+    stability = parser.add_argument_group(
+        "rank stability",
+        "Estimate how stable the rank of each gene is, by ranking many "
+        "resamples of the samples. Adds the observed rank, an interval of "
+        "resampled ranks, their median and a stability score (1 if the rank "
+        "never changes) for each method. Works with all methods except "
+        "deseq_shrinkage.",
+    )
+    stability.add_argument(
+        "--stability",
+        help=(
+            "How to resample: 'bootstrap' resamples the samples of each group "
+            "with replacement, 'permutation' shuffles the case/control labels. "
+            "With 'permutation', the columns describe the ranks under the null "
+            "hypothesis, and are named 'null_rank_low', 'null_rank_high', "
+            "'null_rank_median' and 'null_spread' instead."
+        ),
+        choices=["bootstrap", "permutation"],
+        default=None,
+    )
+    stability.add_argument(
+        "--resamples",
+        help="Number of resamples. Defaults to %(default)s.",
+        type=int,
+        default=1000,
+    )
+    stability.add_argument(
+        "--confidence",
+        help=(
+            "Fraction of resampled ranks in the rank interval. "
+            "Defaults to %(default)s."
+        ),
+        type=float,
+        default=0.95,
+    )
+    stability.add_argument(
+        "--seed",
+        help="Seed for the random resamples, for reproducible results.",
+        type=int,
+        default=None,
     )
 
     general_args = [x.dest for x in parser._actions] + ["method"]
@@ -81,19 +383,472 @@ def bin(args=None):
     args = parser.parse_args(args)
     extra_args = {k: v for k, v in vars(args).items() if k not in general_args}
 
-    result = run_method(
-        case_matrix=args.case_matrix,
-        control_matrix=args.control_matrix,
-        method=RANKING_METHODS[args.method],
+    from gene_ranker.profiling import Profiler, maybe_stage
+    from gene_ranker.ranker import run_method, run_methods
+    from gene_ranker.readers import is_sparse
+    from gene_ranker.stability import StabilityOptions
+    from gene_ranker.streaming import check_streamable, stream_methods
+    from gene_ranker.writers import ResultWriter
+
+    if args.methods and args.method:
+        parser.error("Cannot specify both a method and --methods.")
+    if not args.methods and not args.method:
+        parser.error("Specify a method to run, or several with --methods.")
+
+    cache = make_cache(args.cache_dir, args.cache_size)
+    profiler = Profiler() if args.profile else None
+    gene_filter = make_gene_filter(args)
+    try:
+        writer = ResultWriter(
+            args.output_file, args.output_format, args.sort_by, on=args.id_col
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.methods:
+        # Remove duplicates, but keep the order
+        keys = list(dict.fromkeys(args.methods))
+        methods = {key: RANKING_METHODS[key] for key in keys}
+        method_args = default_method_args(keys)
+    else:
+        methods = {"ranking": RANKING_METHODS[args.method]}
+        method_args = {"ranking": extra_args}
+
+    stability = None
+    if args.stability:
+        try:
+            stability = StabilityOptions(
+                mode=args.stability,
+                resamples=args.resamples,
+                confidence=args.confidence,
+                seed=args.seed,
+            )
+        except ValueError as e:
+            parser.error(str(e))
+        if no_kernel := [k for k, v in methods.items() if v.kernel is None]:
+            parser.error(f"Cannot estimate the rank stability of {no_kernel}.")
+
+    if args.jobs < 1:
+        parser.error("The number of jobs must be a positive number.")
+
+    if args.chunk_size:
+        if args.chunk_size < 1:
+            parser.error("The chunk size must be a positive number.")
+        if stability:
+            parser.error("Rank stability needs all genes at once. Drop --chunk-size.")
+        if is_sparse(args.case_matrix) or is_sparse(args.control_matrix):
+            parser.error("Sparse matrices cannot be read in chunks. Drop --chunk-size.")
+        if args.skip_constant:
+            parser.error("Cannot skip constant genes when reading in chunks.")
+        try:
+            check_streamable(methods)
+        except ValueError as e:
+            parser.error(str(e))
+
+        log.info(
+            "Streaming output to {}".format(
+                args.output_file if args.output_file else "stdout"
+            )
+        )
+        # The stages are interleaved when streaming, so they are timed as one
+        with maybe_stage(profiler, "stream"), writer:
+            stream_methods(
+                case_matrix=args.case_matrix,
+                control_matrix=args.control_matrix,
+                methods=methods,
+                out_stream=writer,
+                chunk_size=args.chunk_size,
+                shared_col=args.id_col,
+                extra_args=method_args,
+                jobs=args.jobs,
+                gene_filter=gene_filter,
+                precision=args.precision,
+            )
+        if profiler:
+            profiler.write(args.profile)
+        return
+
+    if args.methods:
+        result = run_methods(
+            case_matrix=args.case_matrix,
+            control_matrix=args.control_matrix,
+            methods=methods,
+            shared_col=args.id_col,
+            extra_args=method_args,
+            cache=cache,
+            jobs=args.jobs,
+            profiler=profiler,
+            gene_filter=gene_filter,
+            stability=stability,
+            precision=args.precision,
+            skip_constant=args.skip_constant,
+        )
+    else:
+        result = run_method(
+            case_matrix=args.case_matrix,
+            control_matrix=args.control_matrix,
+            method=RANKING_METHODS[args.method],
+            shared_col=args.id_col,
+            extra_args=extra_args,
+            cache=cache,
+            jobs=args.jobs,
+            profiler=profiler,
+            gene_filter=gene_filter,
+            stability=stability,
+            precision=args.precision,
+            skip_constant=args.skip_constant,
+        )
+
+    log.info(
+        "Writing output to {}".format(
+            args.output_file if args.output_file else "stdout"
+        )
+    )
+
+    with maybe_stage(profiler, "write") as stage, writer:
+        writer.write(result)
+        stage.record(result)
+
+    if profiler:
+        log.info(f"Writing profile report to {args.profile}")
+        profiler.write(args.profile)
+
+
+def batch_bin(args=None):
+    parser = argparse.ArgumentParser(
+        description=(
+            "Rank many case/control contrasts between the samples of a single "
+            "expression matrix."
+        )
+    )
+
+    add_info_arguments(parser)
+
+    parser.add_argument(
+        "matrix",
+        help="Expression Matrix with log2 expression of all samples.",
+        type=Path,
+    )
+    parser.add_argument(
+        "contrasts",
+        help=(
+            "JSON file with the contrasts to rank, mapping each contrast "
+            'name to its samples, like {"name": {"case": [...], "control": [...]}}.'
+        ),
+        type=Path,
+    )
+
+    add_methods_argument(parser, required=True)
+    add_output_arguments(parser, output_dir=True)
+    add_id_col_argument(parser)
+    add_cache_arguments(parser)
+    add_jobs_argument(parser)
+
+    add_precision_argument(parser)
+    add_filter_arguments(parser)
+
+    args = parser.parse_args(args)
+
+    from gene_ranker.contrasts import check_contrasts, rank_contrasts, read_contrasts
+    from gene_ranker.readers import read_matrix
+    from gene_ranker.writers import OUTPUT_FORMATS, ResultWriter, write_result
+
+    try:
+        contrasts = read_contrasts(args.contrasts)
+    except ValueError as e:
+        parser.error(f"Invalid contrasts file: {e}")
+
+    keys = list(dict.fromkeys(args.methods))
+    cache = make_cache(args.cache_dir, args.cache_size)
+
+    if args.output_format and args.output_format not in OUTPUT_FORMATS:
+        parser.error(f"Unknown output format '{args.output_format}'.")
+    if args.output_format == "rnk" and (not args.output_dir or len(keys) > 1):
+        parser.error("The 'rnk' format needs --output-dir and a single method.")
+    try:
+        writer = None
+        if not args.output_dir:
+            writer = ResultWriter(
+                args.output_file, args.output_format, args.sort_by, on=args.id_col
+            )
+    except ValueError as e:
+        parser.error(str(e))
+
+    data = read_matrix(args.matrix, args.id_col, dtype=args.precision)
+    log.info(
+        f"Loaded a {data.shape[1]} col by {data.shape[0]} rows matrix from {args.matrix}"
+    )
+    try:
+        check_contrasts(data, contrasts)
+    except ValueError as e:
+        parser.error(str(e))
+
+    results = rank_contrasts(
+        data,
+        contrasts,
+        methods={key: RANKING_METHODS[key] for key in keys},
         shared_col=args.id_col,
-        extra_args=extra_args,
+        extra_args=default_method_args(keys),
+        cache=cache,
+        jobs=args.jobs,
+        gene_filter=make_gene_filter(args),
+        precision=args.precision,
     )
 
+    if args.output_dir:
+        args.output_dir.mkdir(parents=True, exist_ok=True)
+        format = args.output_format or "csv"
+        for contrast, result in results:
+            target = args.output_dir / f"{contrast.name}.{format}"
+            log.info(f"Writing output to {target}")
+            write_result(result, target, format, args.sort_by, on=args.id_col)
+        return
+
     log.info(
         "Writing output to {}".format(
             args.output_file if args.output_file else "stdout"
         )
     )
+    with writer:
+        for contrast, result in results:
+            result.insert(0, "contrast", contrast.name)
+            writer.write(result)
 
-    out_stream = args.output_file.open("w+") if args.output_file else sys.stdout
-    result.to_csv(out_stream, index=False)
+
+def store_bin(args=None):
+    parser = argparse.ArgumentParser(
+        description=(
+            "Keep the per-gene statistics of a growing cohort in a store, and "
+            "rank it again as new samples arrive without reading the old ones. "
+            "Only works with methods that can be computed from the mean and "
+            "variance of each gene: fold_change, s2n_ratio, cohen_d, welch_t "
+            "and moderated_t."
+        )
+    )
+
+    parser.add_argument(
+        "--version",
+        "-v",
+        help="Print version and exit",
+        nargs=0,
+        action=PrintVersionAction,
+    )
+
+    # Options to rank the store, shared by all commands
+    ranking = argparse.ArgumentParser(add_help=False)
+    ranking.add_argument(
+        "--methods",
+        help="Methods to rank with. Defaults to all of the supported ones.",
+        nargs="+",
+        choices=list(RANKING_METHODS.keys()),
+        default=None,
+    )
+    ranking.add_argument(
+        "--output-file",
+        help="Write the rankings to this file. Defaults to stdout.",
+        type=Path,
+        default=None,
+    )
+    ranking.add_argument(
+        "--output-format",
+        help="Format of the output, as for `generanker`.",
+        type=str,
+        default=None,
+    )
+    ranking.add_argument(
+        "--no-rank",
+        help="Only update the store, without writing rankings.",
+        action="store_true",
+    )
+
+    commands = parser.add_subparsers(dest="command", required=True)
+    init = commands.add_parser(
+        "init",
+        parents=[ranking],
+        help="Make a new store from case and control matrices.",
+    )
+    init.add_argument("store", help="Path to the store to make.", type=Path)
+    init.add_argument("case_matrix", help="Matrix of case samples.", type=Path)
+    init.add_argument("control_matrix", help="Matrix of control samples.", type=Path)
+    init.add_argument(
+        "--id-col",
+        help="Name of the shared ID column between files",
+        type=str,
+        default="gene_id",
+    )
+
+    update = commands.add_parser(
+        "update",
+        parents=[ranking],
+        help="Add new samples to a store, and rank it again.",
+    )
+    update.add_argument("store", help="Path to the store to update.", type=Path)
+    update.add_argument(
+        "--case",
+        help="Matrices with new case samples.",
+        nargs="+",
+        type=Path,
+        default=[],
+    )
+    update.add_argument(
+        "--control",
+        help="Matrices with new control samples.",
+        nargs="+",
+        type=Path,
+        default=[],
+    )
+
+    rank = commands.add_parser("rank", parents=[ranking], help="Rank a store.")
+    rank.add_argument("store", help="Path to the store to rank.", type=Path)
+
+    args = parser.parse_args(args)
+
+    from gene_ranker.ranker import load_dual_dataset
+    from gene_ranker.readers import read_matrix
+    from gene_ranker.store import STATS_METHODS, StatsStore
+    from gene_ranker.writers import ResultWriter
+
+    methods = list(dict.fromkeys(args.methods or STATS_METHODS))
+    if unsupported := [x for x in methods if x not in STATS_METHODS]:
+        parser.error(
+            f"Methods {unsupported} cannot be computed from a store. "
+            f"Use one of {list(STATS_METHODS)}."
+        )
+
+    if args.command == "init":
+        dual_dataset = load_dual_dataset(
+            args.case_matrix, args.control_matrix, args.id_col
+        )
+        store = StatsStore.from_dual_dataset(dual_dataset)
+    else:
+        store = StatsStore.load(args.store)
+
+    if args.command == "update":
+        if not args.case and not args.control:
+            parser.error("Give some new samples with --case or --control.")
+        try:
+            for path in args.case:
+                log.info(f"Adding case samples from {path}")
+                store.update(case=read_matrix(path, store.on, dtype="float64"))
+            for path in args.control:
+                log.info(f"Adding control samples from {path}")
+                store.update(control=read_matrix(path, store.on, dtype="float64"))
+        except ValueError as e:
+            parser.error(f"Cannot update the store with {path}: {e}")
+
+    if args.command != "rank":
+        store.save(args.store)
+        log.info(
+            f"Saved {len(store.case_samples)} case and {len(store.control_samples)} "
+            f"control samples to {args.store}"
+        )
+
+    if args.no_rank:
+        return
+
+    try:
+        writer = ResultWriter(args.output_file, args.output_format, on=store.on)
+    except ValueError as e:
+        parser.error(str(e))
+    with writer:
+        writer.write(store.rank(methods))
+
+
+def serve_bin(args=None):
+    parser = argparse.ArgumentParser(
+        description=(
+            "Serve rankings of cohorts kept in memory. Cohorts are loaded once, "
+            "and ranking requests (methods and case/control samples) are "
+            "answered as JSON over HTTP. See the README for the requests."
+        )
+    )
+
+    parser.add_argument(
+        "--version",
+        "-v",
+        help="Print version and exit",
+        nargs=0,
+        action=PrintVersionAction,
+    )
+    parser.add_argument(
+        "--cohort",
+        help=(
+            "A cohort to serve, as NAME=MATRIX or NAME=CASE_MATRIX,CONTROL_MATRIX. "
+            "Can be given more than once. More cohorts can be added later "
+            "with a request, if --allow-register is given."
+        ),
+        action="append",
+        default=[],
+    )
+    add_id_col_argument(parser)
+    parser.add_argument(
+        "--host", help="Host to listen on.", type=str, default="127.0.0.1"
+    )
+    parser.add_argument("--port", help="TCP port to listen on.", type=int, default=8000)
+    parser.add_argument(
+        "--socket",
+        help="Listen on this Unix socket instead of a TCP port.",
+        type=Path,
+        default=None,
+    )
+    parser.add_argument(
+        "--max-cohorts",
+        help="Keep at most this many cohorts in memory, unloading the least "
+        "recently used.",
+        type=int,
+        default=4,
+    )
+    parser.add_argument(
+        "--max-contrasts",
+        help="Keep the aligned data of at most this many contrasts per cohort.",
+        type=int,
+        default=32,
+    )
+    parser.add_argument(
+        "--preload",
+        help="Load the cohorts on start, instead of on their first request.",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--allow-register",
+        help=(
+            "Let clients add cohorts with 'POST /cohorts'. The server then "
+            "reads any file a client asks for, so only use it with trusted "
+            "clients."
+        ),
+        action="store_true",
+    )
+
+    args = parser.parse_args(args)
+
+    if args.max_cohorts < 1 or args.max_contrasts < 1:
+        parser.error("--max-cohorts and --max-contrasts must be at least 1.")
+
+    from gene_ranker.server import CohortStore, make_server
+
+    store = CohortStore(args.max_cohorts, args.max_contrasts, args.id_col)
+    for spec in args.cohort:
+        name, _, paths = spec.partition("=")
+        paths = [Path(x) for x in paths.split(",") if x]
+        if not name or len(paths) not in (1, 2):
+            parser.error(f"Cannot understand cohort '{spec}'.")
+        if len(paths) == 1:
+            store.register(name, matrix=paths[0])
+        else:
+            store.register(name, case=paths[0], control=paths[1])
+        if args.preload:
+            store.get(name)
+
+    server = make_server(
+        store, args.host, args.port, args.socket, allow_register=args.allow_register
+    )
+    where = args.socket or "http://{}:{}".format(*server.server_address[:2])
+    log.info(f"Serving {len(store.sources)} cohorts on {where}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket:
+            args.socket.unlink(missing_ok=True)
@@ -0,0 +1,210 @@
+"""
+On-disk, content-addressed caches for normalized expression matrices and
+fitted models.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+import zipfile
+from pathlib import Path
+from typing import Any, Callable, Optional, TypeVar
+
+import numpy as np
+import pandas as pd
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CACHE_SIZE = 1024 * 1024**2
+"""Default maximum size of the cache on disk, in bytes (1 GiB)."""
+
+T = TypeVar("T")
+
+
+def hash_frame(data: pd.DataFrame, *extra: str) -> str:
+    """Compute a hash of the contents of a dataframe.
+
+    The hash covers the column names, the values (row by row, in order) and
+    any extra strings passed, such as the name of the ID column.
+    """
+    digest = hashlib.sha256()
+    for item in [*extra, *map(str, data.columns)]:
+        digest.update(item.encode())
+        digest.update(b"\0")
+    digest.update(pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes())
+
+    return digest.hexdigest()
+
+
+def _as_storable(values: pd.Index) -> np.ndarray:
+    # Object arrays cannot be saved without pickling. IDs are strings anyway.
+    values = np.asarray(values)
+    if values.dtype == object:
+        values = values.astype(str)
+    return values
+
+
+class NpzStore:
+    """A size-bounded directory of `.npz` entries, named after their keys.
+
+    When the directory grows over `max_size` bytes, the least recently used
+    entries are removed. Unreadable entries are removed when they are read.
+    """
+
+    def __init__(self, directory: Path, max_size: int = DEFAULT_CACHE_SIZE):
+        """Make a new NpzStore
+
+        Args:
+            directory (Path): The directory to keep the entries in. It is
+                created if it does not exist.
+            max_size (int): The maximum size of the entries, in bytes.
+        """
+        self.directory = Path(directory)
+        self.max_size = max_size
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.npz"
+
+    def _read(self, key: str, parse: Callable[[Any], T]) -> Optional[T]:
+        """Parse an entry with `parse`, which gets the opened `.npz` file.
+
+        Returns:
+            What `parse` returns, or None if the key is not stored or the
+            entry cannot be read.
+        """
+        path = self._path(key)
+        try:
+            with np.load(path) as stored:
+                result = parse(stored)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+            log.warning(f"Ignoring unreadable cache entry {path}: {e}")
+            path.unlink(missing_ok=True)
+            return None
+
+        # Mark the entry as recently used
+        os.utime(path)
+        log.debug(f"Cache hit for {key}")
+
+        return result
+
+    def _write(self, key: str, **arrays: np.ndarray):
+        """Store some arrays as an entry, then evict old entries."""
+        # Write to a temporary file first, so that readers never see a
+        # half-written entry.
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".npz.tmp")
+        try:
+            with os.fdopen(fd, "wb") as stream:
+                np.savez(stream, **arrays)
+            os.replace(tmp, self._path(key))
+        finally:
+            Path(tmp).unlink(missing_ok=True)
+
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits."""
+        entries = []
+        for path in self.directory.glob("*.npz"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            log.debug(f"Evicting {path} from the cache")
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+class NormalizationCache(NpzStore):
+    """A size-bounded, on-disk cache of normalized matrices.
+
+    Each entry holds a normalized matrix and its size factors, and is stored
+    in its own `.npz` file named after the hash of the un-normalized input.
+    When the cache grows over `max_size` bytes, the least recently used
+    entries are removed.
+    """
+
+    def get(self, key: str) -> Optional[tuple[pd.DataFrame, pd.Series]]:
+        """Get a normalized matrix and its size factors from the cache.
+
+        The matrix is indexed by the IDs, with samples as columns. The size
+        factors are indexed by sample.
+
+        Returns:
+            A (matrix, size factors) tuple, or None if the key is not cached.
+        """
+
+        def parse(stored) -> tuple[pd.DataFrame, pd.Series]:
+            index = pd.Index(stored["index"], name=str(stored["index_name"]))
+            columns = pd.Index(stored["columns"])
+            data = pd.DataFrame(stored["values"], index=index, columns=columns)
+            # Older entries have no separate index, as it is the columns
+            factor_index = (
+                pd.Index(stored["factor_index"])
+                if "factor_index" in stored.files
+                else columns
+            )
+            return data, pd.Series(stored["size_factors"], index=factor_index)
+
+        return self._read(key, parse)
+
+    def put(self, key: str, data: pd.DataFrame, size_factors: pd.Series):
+        """Store a normalized matrix (indexed by ID) and its size factors."""
+        self._write(
+            key,
+            values=data.to_numpy(dtype=float),
+            index=_as_storable(data.index),
+            index_name=np.array(str(data.index.name)),
+            columns=_as_storable(data.columns),
+            size_factors=np.asarray(size_factors, dtype=float),
+            factor_index=_as_storable(size_factors.index),
+        )
+
+
+class FitCache(NpzStore):
+    """A size-bounded, on-disk cache of fitted models.
+
+    Each entry holds the per-gene parameters of a model (one column per
+    parameter) and its per-sample size factors, like those of a DESeq2 fit.
+    """
+
+    def get(self, key: str) -> Optional[tuple[pd.DataFrame, pd.Series]]:
+        """Get the gene parameters and size factors of a model from the cache.
+
+        Returns:
+            A (parameters, size factors) tuple, or None if the key is not
+            cached.
+        """
+
+        def parse(stored) -> tuple[pd.DataFrame, pd.Series]:
+            genes = pd.DataFrame(
+                stored["parameters"],
+                index=pd.Index(stored["genes"], name="gene"),
+                columns=pd.Index(stored["parameter_names"]),
+            )
+            size_factors = pd.Series(
+                stored["size_factors"], index=pd.Index(stored["samples"])
+            )
+            return genes, size_factors
+
+        return self._read(key, parse)
+
+    def put(self, key: str, genes: pd.DataFrame, size_factors: pd.Series):
+        """Store the gene parameters (indexed by ID) and size factors of a model."""
+        self._write(
+            key,
+            parameters=genes.to_numpy(dtype=float),
+            genes=_as_storable(genes.index),
+            parameter_names=_as_storable(genes.columns),
+            size_factors=np.asarray(size_factors, dtype=float),
+            samples=_as_storable(size_factors.index),
+        )
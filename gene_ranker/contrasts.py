@@ -0,0 +1,161 @@
+"""
+Rank many case/control contrasts from the samples of a single matrix.
+"""
+
+import json
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, Optional
+
+import pandas as pd
+
+from gene_ranker.cache import NormalizationCache
+from gene_ranker.dual_dataset import DualDataset
+from gene_ranker.filtering import GeneFilter
+from gene_ranker.methods.base import RankingMethod
+from gene_ranker.ranker import rank_dual_dataset
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class Contrast:
+    """A comparison between two groups of samples of the same matrix"""
+
+    name: str
+    """The name of the contrast, used to name its output files"""
+    case: list[str]
+    """The names of the case samples"""
+    control: list[str]
+    """The names of the control samples"""
+
+
+def check_contrast_name(name: str):
+    """Check that a contrast name can be used as a file name.
+
+    Raise:
+        ValueError: If the name is empty, "." or "..", or has path separators
+            or null characters.
+    """
+    if not name or name in (".", ".."):
+        raise ValueError(f"Invalid contrast name '{name}'.")
+    if any(x in name for x in ("/", "\\", "\0")):
+        raise ValueError(
+            f"Contrast name '{name}' cannot contain path separators or null "
+            "characters."
+        )
+
+
+def read_contrasts(path: Path) -> list[Contrast]:
+    """Read a manifest of contrasts from a JSON file.
+
+    The manifest is an object mapping the name of each contrast to the
+    samples on each side, like so:
+    ```
+    {
+        "tumor_vs_normal": {"case": ["s1", "s2"], "control": ["s3", "s4"]},
+        ...
+    }
+    ```
+
+    Contrast names are used as file names, so they cannot contain path
+    separators, or be "." or "..".
+
+    Raise:
+        ValueError: If the manifest is malformed.
+    """
+    with Path(path).open("r") as stream:
+        manifest = json.load(stream)
+
+    if not isinstance(manifest, dict):
+        raise ValueError("The manifest must map contrast names to their samples.")
+
+    contrasts = []
+    for name, sides in manifest.items():
+        check_contrast_name(name)
+        if not isinstance(sides, dict) or not {"case", "control"} <= sides.keys():
+            raise ValueError(
+                f"Contrast '{name}' needs both 'case' and 'control' samples."
+            )
+        if not sides["case"] or not sides["control"]:
+            raise ValueError(f"Contrast '{name}' has no case or no control samples.")
+        contrasts.append(
+            Contrast(
+                name=name, case=list(sides["case"]), control=list(sides["control"])
+            )
+        )
+
+    return contrasts
+
+
+def check_contrasts(data: pd.DataFrame, contrasts: list[Contrast]):
+    """Check that the contrasts only use samples that are in the matrix.
+
+    Raise:
+        ValueError: If a contrast uses samples not in the matrix.
+    """
+    for contrast in contrasts:
+        missing = [x for x in contrast.case + contrast.control if x not in data.columns]
+        if missing:
+            raise ValueError(
+                f"Contrast '{contrast.name}' uses samples not in the matrix: {missing}"
+            )
+
+
+def rank_contrasts(
+    data: pd.DataFrame,
+    contrasts: list[Contrast],
+    methods: dict[str, RankingMethod],
+    shared_col: str = "gene_id",
+    extra_args: Optional[dict[str, dict]] = None,
+    cache: Optional[NormalizationCache] = None,
+    jobs: int = 1,
+    gene_filter: Optional[GeneFilter] = None,
+    precision: str = "float64",
+) -> Iterator[tuple[Contrast, pd.DataFrame]]:
+    """Run several RankingMethods on many contrasts from the same matrix.
+
+    The matrix is sorted only once, and the DualDataset of each contrast is
+    made from its columns without merging.
+
+    Args:
+        data (pd.DataFrame): The matrix with all the samples.
+        contrasts (list[Contrast]): The contrasts to rank.
+        methods (dict[str, RankingMethod]): The methods to run, keyed by the
+            name of their output column.
+        shared_col (str): The name of the ID column.
+        extra_args (dict[str, dict] or None): Extra arguments to pass to each
+            method, keyed by the same keys as `methods`.
+        cache (NormalizationCache or None): A cache for the normalized data.
+        jobs (int): The number of processes to use for row-independent methods.
+        gene_filter (GeneFilter or None): Which genes to rank. Expression
+            criteria are checked on the samples of each contrast.
+        precision (str): The type to rank the values as, either "float64"
+            or "float32".
+
+    Yields:
+        (contrast, result) tuples, where `result` is like the output of
+        `rank_dual_dataset`.
+    """
+    # Fail before ranking anything if a contrast is not valid
+    check_contrasts(data, contrasts)
+    data = data.sort_values(by=shared_col, ignore_index=True)
+
+    for contrast in contrasts:
+        log.info(
+            f"Ranking contrast '{contrast.name}' ({len(contrast.case)} case vs "
+            f"{len(contrast.control)} control samples)"
+        )
+        dual_dataset = DualDataset.from_matrix(
+            data, contrast.case, contrast.control, on=shared_col, dtype=precision
+        )
+
+        yield contrast, rank_dual_dataset(
+            dual_dataset,
+            methods,
+            extra_args,
+            cache=cache,
+            jobs=jobs,
+            gene_filter=gene_filter,
+        )
@@ -1,12 +1,52 @@
-import pandas as pd
+import copy
 from typing import Optional
 
+import numpy as np
+import pandas as pd
+
 
 def two_way_in(x, y):
     """Check if all items in x are in y and vice-versa."""
     return all([k in y for k in x]) and all([k in x for k in y])
 
 
+def _readonly(array: np.ndarray) -> np.ndarray:
+    view = array.view()
+    view.flags.writeable = False
+    return view
+
+
+def split_frame(frame: pd.DataFrame, on: str, dtype=float):
+    """Split a frame into sorted IDs, a (genes x samples) array and its columns.
+
+    Args:
+        frame (pd.DataFrame): The frame to split.
+        on (str): The name of the ID column.
+        dtype: The type of the values array.
+
+    Raise:
+        ValueError: If the 'on' column is not in the frame, or its IDs are not
+            unique.
+    """
+    if on not in frame.columns:
+        raise ValueError(f"Shared column '{on}' not in the dataset.")
+
+    ids = frame[on].to_numpy()
+    index = pd.Index(ids)
+    if not index.is_unique:
+        raise ValueError(f"The IDs in the '{on}' column are not unique.")
+
+    samples = [x for x in frame.columns if x != on]
+    values = frame[samples].to_numpy(dtype=dtype)
+    if index.is_monotonic_increasing:
+        values = np.ascontiguousarray(values)
+    else:
+        order = np.argsort(ids, kind="stable")
+        ids, values = ids[order], values[order]
+
+    return ids, values, frame.columns
+
+
 class DualDataset:
     """Represents two tangled datasets that can be dynamically updated
 
@@ -16,23 +56,41 @@ class DualDataset:
     slots are updated accordingly.
 
     The merge strategy is always `inner`.
+
+    Internally, each side is kept as an array of IDs (sorted) and a contiguous
+    (genes x samples) float array of values. The two sides are aligned on
+    their IDs, so that the same row in both arrays is the same gene.
+    The `case_values`, `control_values` and `ids` accessors give read-only
+    views of these arrays without copying them. The `case`, `control` and
+    `merged` DataFrames are built from the arrays only when they are accessed.
+
+    The `normalized` flag records if the values were already normalized (e.g.
+    with `norm_with_deseq`), so that they are not normalized twice.
+
+    The values are kept as `dtype` (float64 by default, or float32 to halve
+    the memory used), also when new frames are set.
     """
 
-    def __init__(self, case: pd.DataFrame, control: pd.DataFrame, on="gene_id"):
+    def __init__(
+        self, case: pd.DataFrame, control: pd.DataFrame, on="gene_id", dtype=float
+    ):
         """Make a new DualDataset
 
         Args:
             case (pd.DataFrame): The case dataframe
             control (pd.DataFrame): The control dataframe
             on (str): The name of the column to merge on
+            dtype: The type of the values, like np.float64 or np.float32.
 
         Raise:
             ValueError: If the 'on' column is not present in both case and control
                 datasets.
             ValueError: If the two case/control datasets share more columns other
                 than the 'on' column.
+            ValueError: If the IDs in the 'on' column are not unique.
         """
         self.on: str = on
+        self.dtype = np.dtype(dtype)
 
         if self.on not in case.columns or self.on not in control.columns:
             raise ValueError(f"Shared column '{self.on}' not in both datasets.")
@@ -42,72 +100,269 @@ class DualDataset:
         if any([x in control.columns for x in k]):
             raise ValueError("Case and control frames share columns other than `on`.")
 
-        self._case: Optional[pd.DataFrame] = case.sort_values(by=self.on)
-        self._case_cols = case.columns
-        self._control: Optional[pd.DataFrame] = control.sort_values(by=self.on)
-        self._control_cols = control.columns
+        self._set_sides(self._split(case), self._split(control))
+
+    def _set_sides(self, case: tuple, control: tuple):
+        self._case_ids, self._case_values, self._case_cols = case
+        self._control_ids, self._control_values, self._control_cols = control
+        self._aligned = False
+        self._case: Optional[pd.DataFrame] = None
+        self._control: Optional[pd.DataFrame] = None
         self._merged: Optional[pd.DataFrame] = None
+        self.normalized: bool = False
+
+        self.sync()
+
+    @classmethod
+    def from_split(cls, case: tuple, control: tuple, on="gene_id") -> "DualDataset":
+        """Make a new DualDataset from frames already split with `split_frame`.
+
+        This lets the (slow) splitting of each side happen elsewhere, e.g.
+        while the other side is still being read.
+
+        Args:
+            case (tuple): The case frame, as split by `split_frame`.
+            control (tuple): The control frame, as split by `split_frame`.
+            on (str): The name of the ID column.
+
+        Raise:
+            ValueError: If the two sides share columns other than `on`.
+        """
+        if set(case[2]) & set(control[2]) != {on}:
+            raise ValueError("Case and control frames share columns other than `on`.")
+
+        new = cls.__new__(cls)
+        new.on = on
+        new.dtype = case[1].dtype
+        new._set_sides(case, control)
+
+        return new
+
+    @classmethod
+    def from_arrays(
+        cls,
+        ids: np.ndarray,
+        case_values: np.ndarray,
+        control_values: np.ndarray,
+        case_samples: list[str],
+        control_samples: list[str],
+        on="gene_id",
+    ) -> "DualDataset":
+        """Make a new DualDataset from already aligned arrays, without copying them.
+
+        Args:
+            ids (np.ndarray): The IDs of the genes, sorted.
+            case_values (np.ndarray): A (genes x case samples) array of values.
+            control_values (np.ndarray): A (genes x control samples) array of
+                values, with rows in the same order as `case_values`.
+            case_samples (list[str]): The names of the case samples.
+            control_samples (list[str]): The names of the control samples.
+            on (str): The name of the ID column.
+
+        Raise:
+            ValueError: If the shapes of the arrays do not match.
+        """
+        if case_values.shape != (len(ids), len(case_samples)):
+            raise ValueError("The shape of the case values does not match.")
+        if control_values.shape != (len(ids), len(control_samples)):
+            raise ValueError("The shape of the control values does not match.")
+        if case_values.dtype != control_values.dtype:
+            raise ValueError("The case and control values have different types.")
+
+        new = cls.__new__(cls)
+        new.on = on
+        new.dtype = case_values.dtype
+        new._case_ids = new._control_ids = np.asarray(ids)
+        new._case_values = case_values
+        new._control_values = control_values
+        new._case_cols = pd.Index([on, *case_samples])
+        new._control_cols = pd.Index([on, *control_samples])
+        new._aligned = True
+        new._case = new._control = new._merged = None
+        new.normalized = False
+
+        return new
+
+    @classmethod
+    def from_matrix(
+        cls,
+        data: pd.DataFrame,
+        case_cols: list[str],
+        control_cols: list[str],
+        on="gene_id",
+        dtype=float,
+    ) -> "DualDataset":
+        """Make a new DualDataset from the columns of a single matrix.
+
+        Since the case and control samples come from the same matrix, they
+        are already aligned and no merge is needed. If `data` is already
+        sorted by the `on` column, no sorting is done either.
+
+        Args:
+            data (pd.DataFrame): The matrix with all samples.
+            case_cols (list[str]): The names of the case samples in `data`.
+            control_cols (list[str]): The names of the control samples in `data`.
+            on (str): The name of the ID column.
+            dtype: The type of the values, like np.float64 or np.float32.
+
+        Raise:
+            ValueError: If the 'on' column or any of the samples are not in `data`.
+            ValueError: If some samples are both case and control.
+        """
+        missing = [x for x in [on, *case_cols, *control_cols] if x not in data.columns]
+        if missing:
+            raise ValueError(f"Columns {missing} are not in the data.")
+        if on in case_cols or on in control_cols:
+            raise ValueError(f"The shared column '{on}' cannot be a sample.")
+        if set(case_cols) & set(control_cols):
+            raise ValueError("Case and control share some samples.")
+
+        ids = data[on].to_numpy()
+        order = None
+        if not pd.Index(ids).is_monotonic_increasing:
+            order = np.argsort(ids, kind="stable")
+            ids = ids[order]
+
+        def values(cols):
+            block = data[cols].to_numpy(dtype=dtype)
+            if order is not None:
+                return block[order]
+            return np.ascontiguousarray(block)
+
+        return cls.from_arrays(
+            ids, values(case_cols), values(control_cols), case_cols, control_cols, on
+        )
+
+    def copy(self) -> "DualDataset":
+        """Make a shallow copy of this DualDataset.
+
+        Setting new case, control or merged frames on the copy does not affect
+        the original, and vice-versa.
+        """
+        return copy.copy(self)
+
+    def _split(self, frame: pd.DataFrame):
+        """Split a frame into sorted IDs, values and column names"""
+        return split_frame(frame, self.on, self.dtype)
 
     def sync(self):
-        """Tangles the case/control datasets and then de-tangles them.
+        """Align the case/control datasets on their IDs.
 
         This assures that the row order and quantity is the same among the two
-        datasets as if they were just merged.
+        datasets as if they were just merged. Rows are only copied if some IDs
+        are not in both datasets.
         """
-        _ = self.merged # This call is not useless - it triggers self.merged(self).
-        self._case = None
-        self._control = None
+        if self._aligned:
+            return
+
+        case_ids, control_ids = self._case_ids, self._control_ids
+        if len(case_ids) == len(control_ids) and np.array_equal(case_ids, control_ids):
+            self._control_ids = case_ids
+        else:
+            common, case_rows, control_rows = np.intersect1d(
+                case_ids, control_ids, assume_unique=True, return_indices=True
+            )
+            self._case_ids = self._control_ids = common
+            self._case_values = self._case_values[case_rows]
+            self._control_values = self._control_values[control_rows]
+            self._case = None
+            self._control = None
+
+        self._aligned = True
+
+    def _build_frame(self, ids, values, columns) -> pd.DataFrame:
+        samples = [x for x in columns if x != self.on]
+        frame = pd.DataFrame(values, columns=samples, copy=True)
+        frame.insert(columns.get_loc(self.on), self.on, ids)
+        return frame
+
+    @property
+    def ids(self) -> np.ndarray:
+        """The (aligned) IDs of the genes, as a read-only array."""
+        self.sync()
+        return _readonly(self._case_ids)
+
+    @property
+    def case_values(self) -> np.ndarray:
+        """The (aligned) case values, as a read-only (genes x samples) array."""
+        self.sync()
+        return _readonly(self._case_values)
 
-    def _detangle(self, columns) -> pd.DataFrame:
-        cols = columns.tolist()
-        return self.merged[cols]
+    @property
+    def control_values(self) -> np.ndarray:
+        """The (aligned) control values, as a read-only (genes x samples) array."""
+        self.sync()
+        return _readonly(self._control_values)
+
+    @property
+    def case_samples(self) -> list[str]:
+        """The names of the case samples."""
+        return [x for x in self._case_cols if x != self.on]
+
+    @property
+    def control_samples(self) -> list[str]:
+        """The names of the control samples."""
+        return [x for x in self._control_cols if x != self.on]
 
     @property
     def merged(self):
         if self._merged is None:
-            if self._case is None or self._control is None:
-                raise ValueError("Cannot access merged without case and control")
-            self._merged = self.case.merge(self.control, on=self.on)
+            self.sync()
+            columns = pd.Index([*self._case_cols, *self.control_samples])
+            self._merged = self._build_frame(
+                self._case_ids,
+                np.hstack([self._case_values, self._control_values]),
+                columns,
+            )
 
         return self._merged
 
     @merged.setter
     def merged(self, value: pd.DataFrame):
-        if not two_way_in(self._merged.columns, value.columns):
+        if not two_way_in(self.merged.columns, value.columns):
             raise ValueError("Cannot set new merged dataframe with different columns.")
-        value = value.reset_index(drop=True) # in case the 'on' col is in the index
-        self._merged = value.sort_values(by=self.on)
+        value = value.reset_index(drop=True)  # in case the 'on' col is in the index
+        value = value.sort_values(by=self.on, ignore_index=True)
+        self._case_ids, self._case_values, _ = self._split(value[self._case_cols])
+        self._control_ids, self._control_values, _ = self._split(
+            value[self._control_cols]
+        )
+        self._aligned = False
         self._case = None
         self._control = None
+        self._merged = None
+        self.sync()
 
     @property
     def case(self):
         if self._case is None:
-            if self._merged is None:
-                raise ValueError("Cannot access case without merged frame")
-            self._case = self._detangle(self._case_cols)
+            self._case = self._build_frame(
+                self._case_ids, self._case_values, self._case_cols
+            )
 
         return self._case
 
     @property
     def control(self):
         if self._control is None:
-            if self._merged is None:
-                raise ValueError("Cannot access control without merged frame")
-            self._control = self._detangle(self._control_cols)
+            self._control = self._build_frame(
+                self._control_ids, self._control_values, self._control_cols
+            )
 
         return self._control
 
     @case.setter
     def case(self, value):
+        value = value.reset_index(drop=True)  # in case the 'on' col is in the index
+        self._case_ids, self._case_values, self._case_cols = self._split(value)
+        self._aligned = False
+        self._case = None
         self._merged = None
-        value = value.reset_index(drop=True) # in case the 'on' col is in the index
-        self._case_cols = value.columns
-        self._case = value.sort_values(by=self.on)
 
     @control.setter
     def control(self, value):
+        value = value.reset_index(drop=True)  # in case the 'on' col is in the index
+        self._control_ids, self._control_values, self._control_cols = self._split(value)
+        self._aligned = False
+        self._control = None
         self._merged = None
-        value = value.reset_index(drop=True) # in case the 'on' col is in the index
-        self._control_cols = value.columns
-        self._control = value.sort_values(by=self.on)
@@ -0,0 +1,139 @@
+"""
+Filter out genes before ranking them.
+"""
+
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from gene_ranker.dual_dataset import DualDataset
+from gene_ranker.stats import SufficientStats
+
+log = logging.getLogger(__name__)
+
+
+def read_gene_list(path: Path) -> set[str]:
+    """Read a list of gene IDs from a file.
+
+    The file has one ID per line. Only the first field of each line (split
+    on tabs or commas) is used, so the first column of a table also works.
+    Empty lines and lines starting with '#' are skipped.
+    """
+    genes = set()
+    with Path(path).open("r") as stream:
+        for line in stream:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            genes.add(line.replace(",", "\t").split("\t")[0].strip())
+
+    return genes
+
+
+def isin(ids: np.ndarray, genes: Iterable[str]) -> np.ndarray:
+    """Check which of the `ids` are in `genes`, through a hash table.
+
+    IDs that are not strings (e.g. numeric IDs) are compared as strings.
+    """
+    index = pd.Index(ids)
+    if index.dtype != object:
+        index = index.astype(str)
+    return index.isin(list(genes))
+
+
+@dataclass
+class GeneFilter:
+    """Criteria that genes must meet to be ranked.
+
+    Genes are kept only if they meet all of the criteria that are set.
+    Criteria left as None are not checked. Expression criteria consider the
+    case and control samples together.
+    """
+
+    min_mean: Optional[float] = None
+    """Keep genes with a mean expression over this value."""
+    min_samples_expressed: Optional[int] = None
+    """Keep genes expressed in at least this many samples."""
+    expression_threshold: float = 0
+    """The value over which a gene counts as expressed in a sample."""
+    allow: Optional[set[str]] = None
+    """Keep only genes with these IDs."""
+    deny: Optional[set[str]] = None
+    """Remove the genes with these IDs."""
+
+    @classmethod
+    def from_files(
+        cls,
+        allow_list: Optional[Path] = None,
+        deny_list: Optional[Path] = None,
+        **kwargs,
+    ) -> "GeneFilter":
+        """Make a GeneFilter, reading the allow and deny lists from files.
+
+        See `read_gene_list` for the format of the files. Other arguments are
+        passed to the GeneFilter.
+        """
+        return cls(
+            allow=read_gene_list(allow_list) if allow_list else None,
+            deny=read_gene_list(deny_list) if deny_list else None,
+            **kwargs,
+        )
+
+    def mask(self, ids: np.ndarray, *values: np.ndarray) -> np.ndarray:
+        """Get which genes pass the filter.
+
+        Args:
+            ids (np.ndarray): The IDs of the genes.
+            *values (np.ndarray): One or more (genes x samples) arrays of
+                expression values, like the case and control values. They
+                are considered together, without being concatenated.
+
+        Returns:
+            A boolean array, True for the genes to keep.
+        """
+        keep = np.ones(len(ids), dtype=bool)
+
+        if self.min_mean is not None:
+            stats = [SufficientStats.from_array(x) for x in values]
+            total = sum(x.n * x.mean for x in stats)
+            keep &= total / sum(x.n for x in stats) > self.min_mean
+        if self.min_samples_expressed is not None:
+            expressed = sum(
+                np.count_nonzero(x > self.expression_threshold, axis=1) for x in values
+            )
+            keep &= expressed >= self.min_samples_expressed
+        if self.allow is not None:
+            keep &= isin(ids, self.allow)
+        if self.deny is not None:
+            keep &= ~isin(ids, self.deny)
+
+        return keep
+
+    def apply(self, dual_dataset: DualDataset) -> DualDataset:
+        """Filter the genes of a DualDataset.
+
+        Both sides are filtered in the same way, so they stay aligned.
+        If all genes pass, the same DualDataset is returned.
+        """
+        keep = self.mask(
+            dual_dataset.ids, dual_dataset.case_values, dual_dataset.control_values
+        )
+        log.debug(f"Keeping {keep.sum()} of {len(keep)} genes after filtering")
+        if keep.all():
+            return dual_dataset
+
+        filtered = DualDataset.from_arrays(
+            dual_dataset.ids[keep],
+            dual_dataset.case_values[keep],
+            dual_dataset.control_values[keep],
+            dual_dataset.case_samples,
+            dual_dataset.control_samples,
+            on=dual_dataset.on,
+        )
+        filtered.normalized = dual_dataset.normalized
+
+        return filtered
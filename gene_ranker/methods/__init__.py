@@ -1,63 +1,137 @@
-from gene_ranker.methods.base import RankingMethod, norm_wrapper
-from gene_ranker.methods.bws import bws_rank
-from gene_ranker.methods.cohen import cohen_d_ranking
-from gene_ranker.methods.deseq_shrinkage import deseq_shrinkage_ranking
-from gene_ranker.methods.fold_change import fold_change_ranking
-from gene_ranker.methods.signal_to_noise import signal_to_noise_ratio
+from gene_ranker.methods.options import cohen_parser, deseq_parser
+from gene_ranker.methods.registry import MethodRegistry, RankingMethod
 
-RANKING_METHODS = {
-    "fold_change": RankingMethod(
-        name="Fold Change",
-        exec=fold_change_ranking,
-        parser=None,
-        desc="Use a non-normalized, raw fold change metric.",
-    ),
-    "deseq_shrinkage": RankingMethod(
-        name="DESeq2 Shrinkage",
-        exec=deseq_shrinkage_ranking,
-        parser=None,
-        desc="Use DESeq2-shrunk fold changes. Always normalizes the input",
-    ),
-    "cohen_d": RankingMethod(
-        name="Cohen's d",
-        exec=cohen_d_ranking,
-        parser=None,
-        desc="Use the Cohen's d metric",
-    ),
-    "norm_cohen_d": RankingMethod(
-        name="Normalized Cohen's d",
-        exec=norm_wrapper(cohen_d_ranking),
-        parser=None,
-        desc="Use a DESeq2-normalized Cohen's d metric",
-    ),
-    "norm_fold_change": RankingMethod(
-        name="Normalized Fold Change",
-        exec=norm_wrapper(fold_change_ranking),
-        parser=None,
-        desc="Use a DESeq2-normalized fold change metric",
-    ),
-    "s2n_ratio": RankingMethod(
-        name="Signal to noise ratio",
-        exec=signal_to_noise_ratio,
-        parser=None,
-        desc="Use the signal to noise ratio (diff of means divided by variance)",
-    ),
-    "norm_s2n_ratio": RankingMethod(
-        name="Normalized signal to noise ratio",
-        exec=norm_wrapper(signal_to_noise_ratio),
-        parser=None,
-        desc="Use the signal to noise ratio metric on normalized data",
-    ),
-    "bws_test": RankingMethod(
-        name="Baumgartner-Weiss-Schindler test statistic",
-        exec=bws_rank,
-        parser=None,
-        desc="Use the BWS test statistic, which works well with high N samples",
-    ),
-    "norm_bws_test": RankingMethod(
-        name="Normalized Baumgartner-Weiss-Schindler test statistic",
-        exec=norm_wrapper(bws_rank),
-        parser=None,
-        desc="Same as BWS, but on normalized data",
-    ),
+# The methods are given as "module:function" strings, so that their modules
+# (and their dependencies) are only imported when they are run.
+RANKING_METHODS = MethodRegistry(
+    {
+        "fold_change": RankingMethod(
+            name="Fold Change",
+            exec="gene_ranker.methods.fold_change:fold_change_ranking",
+            parser=None,
+            desc="Use a non-normalized, raw fold change metric.",
+            row_independent=True,
+            kernel="gene_ranker.methods.fold_change:fold_change",
+        ),
+        "deseq_shrinkage": RankingMethod(
+            name="DESeq2 Shrinkage",
+            exec="gene_ranker.methods.deseq_shrinkage:deseq_shrinkage_ranking",
+            parser=deseq_parser,
+            desc="Use DESeq2-shrunk fold changes. Always normalizes the input",
+        ),
+        "cohen_d": RankingMethod(
+            name="Cohen's d",
+            exec="gene_ranker.methods.cohen:cohen_d_ranking",
+            parser=cohen_parser,
+            desc="Use the Cohen's d metric",
+            row_independent=True,
+            kernel="gene_ranker.methods.cohen:cohen_d",
+        ),
+        "norm_cohen_d": RankingMethod(
+            name="Normalized Cohen's d",
+            exec="gene_ranker.methods.cohen:norm_cohen_d_ranking",
+            parser=cohen_parser,
+            desc="Use a DESeq2-normalized Cohen's d metric",
+            normalized=True,
+            row_independent=True,
+            kernel="gene_ranker.methods.cohen:cohen_d",
+        ),
+        "norm_fold_change": RankingMethod(
+            name="Normalized Fold Change",
+            exec="gene_ranker.methods.fold_change:norm_fold_change_ranking",
+            parser=None,
+            desc="Use a DESeq2-normalized fold change metric",
+            normalized=True,
+            row_independent=True,
+            kernel="gene_ranker.methods.fold_change:fold_change",
+        ),
+        "s2n_ratio": RankingMethod(
+            name="Signal to noise ratio",
+            exec="gene_ranker.methods.signal_to_noise:signal_to_noise_ratio",
+            parser=None,
+            desc="Use the signal to noise ratio (diff of means divided by variance)",
+            row_independent=True,
+            kernel="gene_ranker.methods.signal_to_noise:signal_to_noise",
+        ),
+        "norm_s2n_ratio": RankingMethod(
+            name="Normalized signal to noise ratio",
+            exec="gene_ranker.methods.signal_to_noise:norm_signal_to_noise_ratio",
+            parser=None,
+            desc="Use the signal to noise ratio metric on normalized data",
+            normalized=True,
+            row_independent=True,
+            kernel="gene_ranker.methods.signal_to_noise:signal_to_noise",
+        ),
+        "bws_test": RankingMethod(
+            name="Baumgartner-Weiss-Schindler test statistic",
+            exec="gene_ranker.methods.bws:bws_rank",
+            parser=None,
+            desc="Use the BWS test statistic, which works well with high N samples",
+            row_independent=True,
+            kernel="gene_ranker.methods.bws:bws_statistic",
+            kernel_memory=12.0,
+        ),
+        "norm_bws_test": RankingMethod(
+            name="Normalized Baumgartner-Weiss-Schindler test statistic",
+            exec="gene_ranker.methods.bws:norm_bws_rank",
+            parser=None,
+            desc="Same as BWS, but on normalized data",
+            normalized=True,
+            row_independent=True,
+            kernel="gene_ranker.methods.bws:bws_statistic",
+            kernel_memory=12.0,
+        ),
+        # These only have a kernel: gene_ranker runs it on the aligned arrays
+        "welch_t": RankingMethod(
+            name="Welch's t statistic",
+            exec=None,
+            parser=None,
+            desc="Use Welch's t statistic, which does not assume equal variances",
+            row_independent=True,
+            kernel="gene_ranker.methods.welch:welch_t",
+        ),
+        "moderated_t": RankingMethod(
+            name="Moderated t statistic",
+            exec=None,
+            parser=None,
+            desc="Use a limma-like t statistic, with variances shrunk to a prior",
+            kernel="gene_ranker.methods.moderated_t:moderated_t",
+        ),
+        "mann_whitney_auc": RankingMethod(
+            name="Mann-Whitney AUC",
+            exec=None,
+            parser=None,
+            desc="Use the Mann-Whitney U statistic as an AUC (0.5 is no change)",
+            row_independent=True,
+            kernel="gene_ranker.methods.mann_whitney:mann_whitney_auc",
+            kernel_memory=16.0,
+        ),
+        "median_ratio": RankingMethod(
+            name="Log ratio of medians",
+            exec=None,
+            parser=None,
+            desc="Use the log ratio of the medians, robust to outlier samples",
+            row_independent=True,
+            kernel="gene_ranker.methods.medians:median_log_ratio",
+        ),
+    }
+)
+
+# These used to be imported here. Keep them importable, but only on demand.
+_LAZY_ATTRIBUTES = {
+    "norm_wrapper": "gene_ranker.methods.base",
+    "bws_rank": "gene_ranker.methods.bws",
+    "cohen_d_ranking": "gene_ranker.methods.cohen",
+    "deseq_shrinkage_ranking": "gene_ranker.methods.deseq_shrinkage",
+    "fold_change_ranking": "gene_ranker.methods.fold_change",
+    "signal_to_noise_ratio": "gene_ranker.methods.signal_to_noise",
 }
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        from importlib import import_module
+
+        return getattr(import_module(_LAZY_ATTRIBUTES[name]), name)
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,11 +1,15 @@
-from argparse import ArgumentParser
-from dataclasses import dataclass
-from functools import wraps
+import logging
+from functools import update_wrapper, wraps
 from typing import Callable, Optional
 
+import numpy as np
 import pandas as pd
 from numpy import log2
-from pydeseq2.preprocessing import deseq2_norm
+
+from gene_ranker.cache import NormalizationCache, hash_frame
+from gene_ranker.methods.registry import RankingMethod  # For backwards compatibility
+
+log = logging.getLogger(__name__)
 
 
 def move_col_to_front(data: pd.DataFrame, col_name) -> pd.DataFrame:
@@ -27,11 +31,9 @@ def fail_if_empty(func):
 
     @wraps(func)
     def wrap(dual_dataset, *args, **kwargs):
-        case = dual_dataset.case.set_index(dual_dataset.on)
-        control = dual_dataset.control.set_index(dual_dataset.on)
-        if case.empty:
+        if dual_dataset.case_values.size == 0:
             raise ValueError("Case matrix is empty. Cannot compute fold change.")
-        if control.empty:
+        if dual_dataset.control_values.size == 0:
             raise ValueError("Control matrix is empty. Cannot compute fold change.")
 
         return func(dual_dataset, *args, **kwargs)
@@ -43,45 +45,47 @@ class MissingExternalDependency(Exception):
     """Raised when an external dependency is missing"""
 
 
-@dataclass
-class RankingMethod:
-    """Represents a standard RankingMethod"""
-
-    name: str
-    """The human-friendly name of the method"""
-    exec: Callable
-    """The callable to call with this method"""
-    parser: Optional[Callable]
-    """An ArgumentParser to use to add options to the callable for this method."""
-    desc: Optional[str] = None
-    """A human-friendly description of the method."""
-
-    def __post_init__(self):
-        if self.parser is None:
-            # Set a dummy parser with no options.
-            self.parser = ArgumentParser(self.name, description=self.desc)
-
-
-def norm_with_deseq(data: pd.DataFrame, id_col=None):
+def norm_with_deseq(
+    data: pd.DataFrame, id_col=None, cache: Optional[NormalizationCache] = None
+):
     """Normalize a dataframe with the "mean of ratios" method as used by Deseq
 
     Args:
         data (pandas.DataFrame): A dataframe to normalize.
         id_col (Optional[str]): Optionally, the column with IDs. If not passed,
             assumes the ID column is not present.
+        cache (Optional[NormalizationCache]): A cache to look up the result in
+            before normalizing, and to store the result in afterwards.
 
     Returns:
         A pandas.DataFrame with normalized counts. The ID column is untouched.
     """
+    # PyDESeq2 is slow to import, so only import it when needed
+    from pydeseq2.preprocessing import deseq2_norm
+
+    key = hash_frame(data, str(id_col)) if cache else None
+    cached = cache.get(key) if cache else None
+
     # Move the ID col to the index if needed
     assert id_col in data.columns
     if id_col:
         data = data.set_index(id_col)
-    # Convert back to counts
-    data = round((2**data) - 1)
-    data = data.map(int)
-    data = data.transpose()
-    data = deseq2_norm(data)[0].transpose()
+
+    if cached:
+        log.info("Using cached normalized data")
+        data = cached[0]
+    else:
+        # Convert back to counts, in float64 even if the values are float32
+        data = round((2 ** data.astype(np.float64)) - 1)
+        data = data.astype(int)
+        data = data.transpose()
+        data, size_factors = deseq2_norm(data)
+        data = data.transpose()
+
+        if cache:
+            cache.put(
+                key, data, pd.Series(np.asarray(size_factors), index=data.columns)
+            )
 
     # Return to logged values
     data = log2(data + 1)
@@ -93,18 +97,46 @@ def norm_with_deseq(data: pd.DataFrame, id_col=None):
     return data
 
 
-def norm_wrapper(exec: Callable):
+def normalize_dual_dataset(dual_dataset, cache: Optional[NormalizationCache] = None):
+    """Normalize a DualDataset in-place with `norm_with_deseq`.
+
+    Does nothing if the dataset is already flagged as normalized.
+
+    Args:
+        dual_dataset (DualDataset): The dataset to normalize.
+        cache (Optional[NormalizationCache]): Passed to `norm_with_deseq`.
+
+    Returns:
+        The same, now normalized, DualDataset.
+    """
+    if dual_dataset.normalized:
+        return dual_dataset
+
+    dual_dataset.sync()
+    dual_dataset.merged = norm_with_deseq(
+        dual_dataset.merged, dual_dataset.on, cache=cache
+    )
+    dual_dataset.normalized = True
+
+    return dual_dataset
+
+
+class norm_wrapper:
     """
     Wrap a standard ranking method to call it with normalized data
 
     Uses the 'norm_with_deseq' function to normalize the data and then call
-    the wrapped method.
+    the wrapped method. Data that is already normalized is passed through.
+
+    This is a class, not a closure, so that wrapped methods can be pickled and
+    sent to other processes.
     """
 
-    def wrapped(dual_dataset, *args, **kwargs):
-        dual_dataset.sync()
-        dual_dataset.merged = norm_with_deseq(dual_dataset.merged, dual_dataset.on)
+    def __init__(self, exec: Callable):
+        self.exec = exec
+        update_wrapper(self, exec)
 
-        return exec(dual_dataset, *args, **kwargs)
+    def __call__(self, dual_dataset, *args, **kwargs):
+        normalize_dual_dataset(dual_dataset)
 
-    return wrapped
+        return self.exec(dual_dataset, *args, **kwargs)
@@ -1,39 +1,18 @@
 import numpy as np
 import pandas as pd
-from numpy import ma
-from itertools import compress
 
 from gene_ranker.dual_dataset import DualDataset
-from gene_ranker.methods.base import fail_if_empty
+from gene_ranker.methods.base import fail_if_empty, norm_wrapper
+from gene_ranker.rankdata import rank_rows
 
-def find_repeats(values):
-    uniq = np.unique_counts(values)
-    mask = [x != 1 for x in list(uniq.counts)]
-    return list(compress(list(uniq.values), mask))
 
 def rankdata(data):
-    def _rank1d(data, use_missing=False):
-        n = data.count()
-        rk = np.empty(data.size, dtype=float)
-        idx = data.argsort()
-        rk[idx[:n]] = np.arange(1, n + 1)
-
-        if use_missing:
-            rk[idx[n:]] = (n + 1) / 2.0
-        else:
-            rk[idx[n:]] = 0
-
-        repeats = find_repeats(data.copy())
-        for r in repeats:
-            condition = (data == r).filled(False)
-            rk[condition] = rk[condition].max()
-        return rk
-
-    data = ma.array(data, copy=False)
-    if data.ndim > 1:
-        return _rank1d(data.ravel()).reshape(data.shape)
-    else:
-        return _rank1d(data)
+    """Rank all the values of an array together, giving ties their maximum rank.
+
+    See `gene_ranker.rankdata.rank_rows`, which ranks each row separately.
+    """
+    data = np.asarray(data)
+    return rank_rows(data.ravel(), ties="max").reshape(data.shape)
 
 
 def bws_score(x, y, alternative):
@@ -66,23 +45,64 @@ def bws_score(x, y, alternative):
     return B
 
 
+def bws_statistic(
+    case: np.ndarray, control: np.ndarray, alternative: str = "one-sided"
+) -> np.ndarray:
+    """Compute the BWS statistic for every row of two matrices at once.
+
+    This is the vectorized version of `bws_score`: rows are genes, columns
+    are samples. All rows are ranked together and the B statistic is computed
+    with a handful of whole-matrix operations.
+    Float32 values are ranked and scored in float32, and only the per-row
+    sums are accumulated in float64.
+
+    Args:
+        case (np.ndarray): A (genes x case samples) array.
+        control (np.ndarray): A (genes x control samples) array, with rows in
+            the same order as `case`.
+        alternative (str): Either "two-sided" or "one-sided".
+
+    Returns:
+        A 1D array with the B statistic of each row.
+    """
+    case, control = np.asarray(case), np.asarray(control)
+    dtype = np.float32 if np.result_type(case, control) == np.float32 else np.float64
+    case, control = case.astype(dtype, copy=False), control.astype(dtype, copy=False)
+    if case.shape[0] != control.shape[0]:
+        raise ValueError("Case and control arrays must have the same number of rows.")
+
+    n, m = case.shape[1], control.shape[1]
+    ranks = rank_rows(np.concatenate((case, control), axis=1), ties="max")
+    Ri = np.sort(ranks[:, :n], axis=1)
+    Hj = np.sort(ranks[:, n:], axis=1)
+    i, j = np.arange(1, n + 1, dtype=dtype), np.arange(1, m + 1, dtype=dtype)
+
+    Bx_num = Ri - (m + n) / n * i
+    By_num = Hj - (m + n) / m * j
+
+    if alternative == "two-sided":
+        Bx_num *= Bx_num
+        By_num *= By_num
+    else:
+        Bx_num *= np.abs(Bx_num)
+        By_num *= np.abs(By_num)
+
+    Bx_den = i / (n + 1) * (1 - i / (n + 1)) * m * (m + n) / n
+    By_den = j / (m + 1) * (1 - j / (m + 1)) * n * (m + n) / m
+
+    Bx = 1 / n * np.sum(Bx_num / Bx_den, axis=1, dtype=np.float64)
+    By = 1 / m * np.sum(By_num / By_den, axis=1, dtype=np.float64)
+
+    return (Bx + By) / 2 if alternative == "two-sided" else (Bx - By) / 2
+
+
 @fail_if_empty
 def bws_rank(dual_dataset: DualDataset) -> pd.DataFrame:
-    dual_dataset.sync()
-
-    case = dual_dataset.case.loc[:, dual_dataset.case.columns != dual_dataset.on]
-    control = dual_dataset.control.loc[
-        :, dual_dataset.control.columns != dual_dataset.on
-    ]
-    stats = []
-
-    # The double unpack in because .iterrows() -> (index, row)
-    for (_, case), (_, control) in zip(case.iterrows(), control.iterrows()):
-        # I needed to get the private method for the statistic that is then
-        # resampled many times for the test. The signature therefore is a bit
-        # cryptic. The last 0 is the axis.
-        stats.append(bws_score(case, control, "one-sided"))
-
-    return pd.DataFrame(
-        {dual_dataset.on: dual_dataset.merged[dual_dataset.on], "ranking": stats}
+    stats = bws_statistic(
+        dual_dataset.case_values, dual_dataset.control_values, "one-sided"
     )
+
+    return pd.DataFrame({dual_dataset.on: dual_dataset.ids, "ranking": stats})
+
+
+norm_bws_rank = norm_wrapper(bws_rank)
@@ -2,6 +2,7 @@ import shutil
 import subprocess
 import tempfile
 
+import numpy as np
 import pandas as pd
 
 from gene_ranker.dual_dataset import DualDataset
@@ -9,11 +10,44 @@ from gene_ranker.methods.base import (
     MissingExternalDependency,
     fail_if_empty,
     move_col_to_front,
+    norm_wrapper,
 )
+from gene_ranker.methods.options import COHEN_BACKENDS
+from gene_ranker.stats import SufficientStats
 
 
-@fail_if_empty
-def cohen_d_ranking(dual_dataset: DualDataset) -> pd.DataFrame:
+def cohen_d(case: np.ndarray, control: np.ndarray) -> np.ndarray:
+    """Compute Cohen's d for every row of two matrices at once.
+
+    Rows are genes, columns are samples. The effect size is the difference of
+    the means (case - control) divided by the pooled standard deviation,
+    computed as in fast-cohen: each variance has `ddof=1`, and they are pooled
+    with `n_case + n_control - 2` degrees of freedom.
+
+    Args:
+        case (np.ndarray): A (genes x case samples) array.
+        control (np.ndarray): A (genes x control samples) array, with rows in
+            the same order as `case`.
+
+    Returns:
+        A 1D array with the Cohen's d of each row.
+    """
+    return cohen_d_from_stats(
+        SufficientStats.from_array(case), SufficientStats.from_array(control)
+    )
+
+
+def cohen_d_from_stats(case: SufficientStats, control: SufficientStats) -> np.ndarray:
+    """Like `cohen_d`, but from the sufficient statistics of the rows."""
+    n, m = case.n, control.n
+
+    pooled_var = ((n - 1) * case.var() + (m - 1) * control.var()) / (n + m - 2)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (case.mean - control.mean) / np.sqrt(pooled_var)
+
+
+def _fast_cohen(dual_dataset: DualDataset) -> pd.DataFrame:
     if not shutil.which("fast-cohen"):
         raise MissingExternalDependency(
             (
@@ -39,3 +73,35 @@ def cohen_d_ranking(dual_dataset: DualDataset) -> pd.DataFrame:
         data = data.rename(columns={"row_names": dual_dataset.on, "cohen_d": "ranking"})
 
     return data
+
+
+@fail_if_empty
+def cohen_d_ranking(dual_dataset: DualDataset, backend: str = "native") -> pd.DataFrame:
+    """Rank genes by their Cohen's d between case and control.
+
+    Args:
+        dual_dataset (DualDataset): A DualDataset to calculate the result from.
+        backend (str): Either "native", to compute the metric in memory, or
+            "fast-cohen", to call the external `fast-cohen` executable.
+            Defaults to "native".
+    Returns:
+        A pd.DataFrame with two columns, a `gene_id` column and a `ranking` column.
+    """
+    if backend not in COHEN_BACKENDS:
+        raise ValueError(
+            f"Unknown Cohen's d backend '{backend}'. Choose from {COHEN_BACKENDS}."
+        )
+    if backend == "fast-cohen":
+        return _fast_cohen(dual_dataset)
+
+    frame = pd.DataFrame(
+        {
+            dual_dataset.on: dual_dataset.ids,
+            "ranking": cohen_d(dual_dataset.case_values, dual_dataset.control_values),
+        }
+    )
+
+    return frame
+
+
+norm_cohen_d_ranking = norm_wrapper(cohen_d_ranking)
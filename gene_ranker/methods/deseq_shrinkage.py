@@ -1,45 +1,210 @@
-import pandas as pd
 import logging
+from pathlib import Path
+from typing import Optional
 
-from gene_ranker.methods.base import fail_if_empty
-from gene_ranker.dual_dataset import DualDataset
+import numpy as np
+import pandas as pd
+import pydeseq2
+from pydeseq2.ds import DeseqDataSet, DeseqStats
 
-from pydeseq2.ds import DeseqStats, DeseqDataSet
+from gene_ranker.cache import FitCache, hash_frame
+from gene_ranker.dual_dataset import DualDataset
+from gene_ranker.methods.base import MissingExternalDependency, fail_if_empty
 
 log = logging.getLogger(__name__)
 
+DESIGN = "~status"
+CONTRAST = ["status", "case", "control"]
+COEFF = "status[T.control]"
 
-@fail_if_empty
-def deseq_shrinkage_ranking(dual_dataset: DualDataset) -> pd.DataFrame:
-    case_cols = [x for x in dual_dataset.case.columns if x != dual_dataset.on]
-    ctrl_cols = [x for x in dual_dataset.control.columns if x != dual_dataset.on]
-    labels = ["case"] * len(case_cols) + ["control"] * len(ctrl_cols)
-    metadata = pd.DataFrame({"sample": case_cols + ctrl_cols, "status": labels})
-    metadata = metadata.set_index("sample")
-    data = dual_dataset.merged.set_index(dual_dataset.on)
-
-    data = round((2**data) - 1)
-    data = data.map(int)
-    data = data.transpose()
-
-    data = DeseqDataSet(
-        counts=data,
+LFC_PREFIX = "LFC:"
+"""Prefix of the columns with the (unshrunk) fold changes in a stored fit."""
+
+FIT_CACHE_PYDESEQ2 = ">=0.5.4,<0.6"
+"""The PyDESeq2 versions that stored fits are tested with (see `check_fit`).
+
+It is the `fit-cache` extra of the package, not a requirement of it, since
+only the fit cache needs the internals of PyDESeq2.
+"""
+
+
+def _counts_and_metadata(dual_dataset: DualDataset):
+    """Get the (samples x genes) counts and the metadata for PyDESeq2"""
+    samples = dual_dataset.case_samples + dual_dataset.control_samples
+    labels = ["case"] * len(dual_dataset.case_samples) + ["control"] * len(
+        dual_dataset.control_samples
+    )
+    metadata = pd.DataFrame({"status": labels}, index=pd.Index(samples, name="sample"))
+
+    # Convert back to counts. `np.rint` rounds half to even, like `round`.
+    values = np.hstack([dual_dataset.case_values, dual_dataset.control_values])
+    counts = np.rint(2 ** values.astype(np.float64) - 1).astype(int)
+    counts = pd.DataFrame(counts.T, index=metadata.index, columns=dual_dataset.ids)
+
+    return counts, metadata
+
+
+def fit_deseq(
+    counts: pd.DataFrame, metadata: pd.DataFrame, n_cpus: Optional[int] = None
+) -> DeseqStats:
+    """Fit DESeq2 to the counts, up to what is needed to shrink fold changes.
+
+    Runs the whole DESeq2 fit (size factors, dispersions, fold changes and
+    outlier refitting), but only the part of the Wald test that gives the
+    standard errors of the fold changes, which are used to fit the prior
+    of the shrinkage. P-values are not computed or filtered.
+    """
+    dds = DeseqDataSet(
+        counts=counts, metadata=metadata, design=DESIGN, quiet=True, n_cpus=n_cpus
+    )
+    dds.deseq2()
+
+    stats = DeseqStats(dds, CONTRAST, quiet=True, n_cpus=n_cpus)
+    stats.run_wald_test()
+
+    return stats
+
+
+def check_fit(stats: DeseqStats):
+    """Check that a DESeq2 fit has the attributes used to store and rebuild it.
+
+    Some of them (`_normed_means`, `non_zero_idx`, `non_zero_genes` and the
+    standard errors in `SE`) are internals of PyDESeq2, so they may change
+    with any release. The versions they are known to work with are
+    `FIT_CACHE_PYDESEQ2`.
+
+    Raise:
+        MissingExternalDependency: If any of the attributes is missing.
+    """
+    dds = stats.dds
+    missing = [
+        f"var['{x}']"
+        for x in ("dispersions", "_normed_means", "non_zero")
+        if x not in dds.var
+    ]
+    missing += [x for x in ("non_zero_idx", "non_zero_genes") if not hasattr(dds, x)]
+    if not isinstance(getattr(stats, "SE", None), pd.Series):
+        missing.append("SE")
+
+    if missing:
+        raise MissingExternalDependency(
+            f"The DESeq2 fit of PyDESeq2 {pydeseq2.__version__} has no {missing}, "
+            f"so it cannot be cached. Install pydeseq2{FIT_CACHE_PYDESEQ2} (or the "
+            "'fit-cache' extra of gene_ranker)."
+        )
+
+
+def fit_to_frames(stats: DeseqStats) -> tuple[pd.DataFrame, pd.Series]:
+    """Get the parameters of a DESeq2 fit as a per-gene frame and size factors.
+
+    Must be called before the fold changes are shrunk.
+
+    Raise:
+        MissingExternalDependency: If the fit cannot be stored (see
+            `check_fit`).
+    """
+    check_fit(stats)
+    dds = stats.dds
+    genes = pd.DataFrame(
+        {
+            "dispersions": dds.var["dispersions"].to_numpy(dtype=float),
+            "normed_means": dds.var["_normed_means"].to_numpy(dtype=float),
+            "non_zero": dds.var["non_zero"].to_numpy(dtype=float),
+            "SE": stats.SE.to_numpy(dtype=float),
+        },
+        index=pd.Index(dds.var_names, name="gene"),
+    )
+    for column in stats.LFC.columns:
+        genes[LFC_PREFIX + column] = stats.LFC[column].to_numpy(dtype=float)
+
+    return genes, dds.obs["size_factors"].copy()
+
+
+def fit_from_frames(
+    counts: pd.DataFrame,
+    metadata: pd.DataFrame,
+    genes: pd.DataFrame,
+    size_factors: pd.Series,
+    n_cpus: Optional[int] = None,
+) -> DeseqStats:
+    """Rebuild a DESeq2 fit made by `fit_deseq` from its stored parameters.
+
+    Nothing is fitted again, so the result can be passed to `lfc_shrink`
+    straight away. The parameters must have been stored by the same version
+    of PyDESeq2, since some are internals of it (see `check_fit`).
+    """
+    # Outliers were already refitted when the parameters were stored
+    dds = DeseqDataSet(
+        counts=counts,
         metadata=metadata,
-        design="~status",
+        design=DESIGN,
+        refit_cooks=False,
         quiet=True,
+        n_cpus=n_cpus,
     )
+    dds.obs["size_factors"] = size_factors.loc[dds.obs_names].to_numpy()
+    dds.var["dispersions"] = genes["dispersions"].to_numpy()
+    dds.var["_normed_means"] = genes["normed_means"].to_numpy()
+    dds.var["non_zero"] = genes["non_zero"].to_numpy().astype(bool)
+    dds.non_zero_idx = np.flatnonzero(dds.var["non_zero"])
+    dds.non_zero_genes = dds.var_names[dds.var["non_zero"]]
 
-    data.deseq2()
-    stats = DeseqStats(data, ["status", "case", "control"])
-    stats.summary() # This computes parameters - it's not just for show
-    stats.lfc_shrink("status[T.control]")
+    lfc_columns = dds.obsm["design_matrix"].columns
+    dds.varm["LFC"] = pd.DataFrame(
+        genes[[LFC_PREFIX + x for x in lfc_columns]].to_numpy(),
+        index=dds.var_names,
+        columns=lfc_columns,
+    )
 
+    stats = DeseqStats(dds, CONTRAST, quiet=True, n_cpus=n_cpus)
+    stats.SE = pd.Series(genes["SE"].to_numpy(), index=dds.var_names)
+
+    return stats
+
+
+@fail_if_empty
+def deseq_shrinkage_ranking(
+    dual_dataset: DualDataset,
+    n_cpus: Optional[int] = None,
+    fit_cache: Optional[Path] = None,
+) -> pd.DataFrame:
+    """Rank genes by their DESeq2 (apeGLM) shrunk fold changes.
+
+    Args:
+        dual_dataset (DualDataset): The data to rank.
+        n_cpus (int or None): The number of CPUs PyDESeq2 can use. If None,
+            uses all of them.
+        fit_cache (Path or None): A directory to store the fitted model in.
+            If the same counts, with the same case and control samples, were
+            already fitted, the stored fit is used instead of fitting again.
+    """
+    counts, metadata = _counts_and_metadata(dual_dataset)
+
+    cache = FitCache(fit_cache) if fit_cache else None
+    # Stored fits are only reused by the PyDESeq2 version that made them
+    key = (
+        hash_frame(counts, DESIGN, pydeseq2.__version__, *metadata["status"])
+        if cache
+        else None
+    )
+    cached = cache.get(key) if cache else None
+
+    if cached:
+        log.info("Using cached DESeq2 fit")
+        stats = fit_from_frames(counts, metadata, *cached, n_cpus=n_cpus)
+    else:
+        stats = fit_deseq(counts, metadata, n_cpus=n_cpus)
+        if cache:
+            try:
+                cache.put(key, *fit_to_frames(stats))
+            except MissingExternalDependency as e:
+                log.warning(f"Not caching the DESeq2 fit: {e}")
+
+    stats.lfc_shrink(COEFF)
     shrunk = stats.LFC
 
     result = pd.DataFrame(
-        {dual_dataset.on: shrunk.index, "ranking": list(shrunk["status[T.control]"])}
+        {dual_dataset.on: shrunk.index, "ranking": shrunk[COEFF].to_numpy()}
     )
 
-    print(result)
-
     return result
@@ -1,9 +1,32 @@
-from statistics import mean
-
+import numpy as np
 import pandas as pd
 
 from gene_ranker.dual_dataset import DualDataset
-from gene_ranker.methods.base import fail_if_empty
+from gene_ranker.methods.base import fail_if_empty, norm_wrapper
+from gene_ranker.stats import SufficientStats
+
+
+def fold_change(case: np.ndarray, control: np.ndarray) -> np.ndarray:
+    """Compute `mean(case) - mean(control)` for every row of two matrices.
+
+    Args:
+        case (np.ndarray): A (genes x case samples) array.
+        control (np.ndarray): A (genes x control samples) array, with rows in
+            the same order as `case`.
+
+    Returns:
+        A 1D array with the fold change of each row.
+    """
+    return fold_change_from_stats(
+        SufficientStats.from_array(case), SufficientStats.from_array(control)
+    )
+
+
+def fold_change_from_stats(
+    case: SufficientStats, control: SufficientStats
+) -> np.ndarray:
+    """Like `fold_change`, but from the sufficient statistics of the rows."""
+    return case.mean - control.mean
 
 
 @fail_if_empty
@@ -19,18 +42,12 @@ def fold_change_ranking(dual_dataset: DualDataset) -> pd.DataFrame:
     Returns:
         A pd.DataFrame with two columns, a `gene_id` column and a `ranking` column.
     """
-    dual_dataset.sync()
-
-    case = dual_dataset.case.set_index(dual_dataset.on)
-    control = dual_dataset.control.set_index(dual_dataset.on)
-    case_means = case.apply(mean, axis=1)
-    control_means = control.apply(mean, axis=1)
-
     # Assume that the values are logged
-    fcs = case_means.to_numpy() - control_means.to_numpy()
+    fcs = fold_change(dual_dataset.case_values, dual_dataset.control_values)
 
-    frame = pd.DataFrame(
-        {dual_dataset.on: dual_dataset.case[dual_dataset.on], "ranking": fcs}
-    )
+    frame = pd.DataFrame({dual_dataset.on: dual_dataset.ids, "ranking": fcs})
 
     return frame
+
+
+norm_fold_change_ranking = norm_wrapper(fold_change_ranking)
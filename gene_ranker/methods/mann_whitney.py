@@ -0,0 +1,43 @@
+import numpy as np
+
+from gene_ranker.rankdata import rank_rows
+
+
+def mann_whitney_u(case: np.ndarray, control: np.ndarray) -> np.ndarray:
+    """Compute the Mann-Whitney U statistic of the case samples for every row.
+
+    All the values of each row are ranked together (ties get their average
+    rank), and U is the sum of the ranks of the case values, minus its
+    smallest possible value.
+
+    Args:
+        case (np.ndarray): A (genes x case samples) array.
+        control (np.ndarray): A (genes x control samples) array, with rows in
+            the same order as `case`.
+
+    Returns:
+        A 1D array with the U statistic of each row.
+    """
+    n = case.shape[1]
+    ranks = rank_rows(np.concatenate((case, control), axis=1), ties="average")
+
+    return np.sum(ranks[:, :n], axis=1, dtype=np.float64) - n * (n + 1) / 2
+
+
+def mann_whitney_auc(case: np.ndarray, control: np.ndarray) -> np.ndarray:
+    """Compute the area under the ROC curve of the case samples for every row.
+
+    This is the Mann-Whitney U divided by its maximum: the probability that a
+    case value is higher than a control value (counting ties as one half).
+    0.5 means no difference.
+
+    Args:
+        case (np.ndarray): A (genes x case samples) array.
+        control (np.ndarray): A (genes x control samples) array, with rows in
+            the same order as `case`.
+
+    Returns:
+        A 1D array with the AUC of each row.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return mann_whitney_u(case, control) / (case.shape[1] * control.shape[1])
@@ -0,0 +1,20 @@
+import numpy as np
+
+
+def median_log_ratio(case: np.ndarray, control: np.ndarray) -> np.ndarray:
+    """Compute the log ratio of the medians of two matrices, for every row.
+
+    Expects logged values. Since the log is monotonic, the log of the median
+    of the counts is the median of the logged values, so the log ratio of the
+    medians is `median(case) - median(control)`. With an even number of
+    samples, the two middle logged values are averaged.
+
+    Args:
+        case (np.ndarray): A (genes x case samples) array.
+        control (np.ndarray): A (genes x control samples) array, with rows in
+            the same order as `case`.
+
+    Returns:
+        A 1D array with the log ratio of the medians of each row.
+    """
+    return np.median(case, axis=1) - np.median(control, axis=1)
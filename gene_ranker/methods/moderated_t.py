@@ -0,0 +1,107 @@
+import logging
+
+import numpy as np
+from scipy.special import digamma, polygamma
+
+from gene_ranker.stats import SufficientStats
+
+log = logging.getLogger(__name__)
+
+
+def trigamma_inverse(x: float, tol: float = 1e-8, max_iter: int = 50) -> float:
+    """Solve `trigamma(y) = x` for y, with Newton's method (as in limma)."""
+    if x > 1e7:
+        return 1 / np.sqrt(x)
+    if x < 1e-6:
+        return 1 / x
+
+    y = 0.5 + 1 / x
+    for _ in range(max_iter):
+        tri = polygamma(1, y)
+        step = tri * (1 - tri / x) / polygamma(2, y)
+        y += step
+        if -step / y < tol:
+            break
+
+    return float(y)
+
+
+def fit_variance_prior(variances: np.ndarray, df: float) -> tuple[float, float]:
+    """Fit a scaled inverse chi-squared prior to the variances of the genes.
+
+    The prior is fitted with the method of moments on the log variances, as
+    in limma's `fitFDist`. Genes with a variance of zero (or NaN) are ignored.
+
+    Args:
+        variances (np.ndarray): The variance of each gene.
+        df (float): The degrees of freedom of each variance.
+
+    Returns:
+        The degrees of freedom and the scale of the prior. The degrees of
+        freedom are infinite if the variances vary no more than expected
+        from sampling alone.
+    """
+    usable = variances[np.isfinite(variances) & (variances > 0)]
+    if len(usable) < 2:
+        log.warning("Too few genes with a variance to fit a prior. Not moderating.")
+        return 0.0, 0.0
+
+    half = df / 2
+    log_var = np.log(usable) - digamma(half) + np.log(half)
+    mean = np.mean(log_var)
+    excess = np.var(log_var, ddof=1) - polygamma(1, half)
+
+    if excess <= 0:
+        return np.inf, float(np.exp(mean))
+
+    prior_df = 2 * trigamma_inverse(excess)
+    scale = np.exp(mean + digamma(prior_df / 2) - np.log(prior_df / 2))
+
+    return float(prior_df), float(scale)
+
+
+def moderated_t(case: np.ndarray, control: np.ndarray) -> np.ndarray:
+    """Compute a moderated t statistic for every row of two matrices.
+
+    Like limma's moderated t: the pooled variance of each gene is shrunk
+    towards a prior fitted on the variances of all genes, which stabilizes
+    the statistic of genes with few samples or very low variance. Since the
+    prior depends on all genes, so does the statistic of each of them.
+
+    Args:
+        case (np.ndarray): A (genes x case samples) array.
+        control (np.ndarray): A (genes x control samples) array, with rows in
+            the same order as `case`.
+
+    Returns:
+        A 1D array with the moderated t statistic of each row.
+    """
+    return moderated_t_from_stats(
+        SufficientStats.from_array(case), SufficientStats.from_array(control)
+    )
+
+
+def moderated_t_from_stats(
+    case: SufficientStats, control: SufficientStats
+) -> np.ndarray:
+    """Like `moderated_t`, but from the sufficient statistics of the rows."""
+    n, m = case.n, control.n
+    df = n + m - 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pooled_var = ((n - 1) * case.var() + (m - 1) * control.var()) / df
+
+    # All genes have the same samples, so the same degrees of freedom
+    gene_df = float(df[0]) if len(df) else 0.0
+    if gene_df < 1:
+        return np.full(len(n), np.nan)
+
+    prior_df, prior_var = fit_variance_prior(pooled_var, gene_df)
+    if np.isinf(prior_df):
+        posterior_var = np.full_like(pooled_var, prior_var)
+    else:
+        posterior_var = (prior_df * prior_var + gene_df * pooled_var) / (
+            prior_df + gene_df
+        )
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (case.mean - control.mean) / np.sqrt(posterior_var * (1 / n + 1 / m))
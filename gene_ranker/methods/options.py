@@ -0,0 +1,40 @@
+"""
+Command line options of the built-in ranking methods.
+
+These are kept apart from the methods themselves, and only use the standard
+library, so that the command line can be built without importing the methods.
+"""
+
+from argparse import ArgumentParser
+from pathlib import Path
+
+COHEN_BACKENDS = ("native", "fast-cohen")
+
+cohen_parser = ArgumentParser(add_help=False)
+cohen_parser.add_argument(
+    "--backend",
+    help=(
+        "How to compute Cohen's d. 'native' computes it in memory, "
+        "'fast-cohen' calls the external fast-cohen executable."
+    ),
+    choices=COHEN_BACKENDS,
+    default="native",
+)
+
+deseq_parser = ArgumentParser(add_help=False)
+deseq_parser.add_argument(
+    "--n-cpus",
+    help="Number of CPUs to fit the DESeq2 model with. Defaults to all of them.",
+    type=int,
+    default=None,
+)
+deseq_parser.add_argument(
+    "--fit-cache",
+    help=(
+        "Directory to keep fitted DESeq2 models (size factors, dispersions "
+        "and fold changes) in. Runs on the same counts and samples reuse the "
+        "fit, and only shrink the fold changes."
+    ),
+    type=Path,
+    default=None,
+)
@@ -0,0 +1,223 @@
+"""
+The registry of ranking methods.
+
+This module only uses the standard library, so that listing the methods (or
+building the command line interface) does not import any of their
+dependencies. Methods only import their dependencies when they are run.
+"""
+
+import logging
+from argparse import ArgumentParser
+from collections.abc import MutableMapping
+from dataclasses import dataclass
+from importlib import import_module
+from importlib.metadata import entry_points
+from typing import Any, Callable, Iterator, Optional, Protocol, Union
+
+log = logging.getLogger(__name__)
+
+ENTRY_POINT_GROUP = "gene_ranker.methods"
+"""The entry point group that third-party packages can register methods in."""
+
+
+class LazyCallable:
+    """A callable that imports its target only when first called.
+
+    The target is given as a "module:attribute" string. Only the string is
+    pickled, so the target is imported again by whoever unpickles it.
+    """
+
+    def __init__(self, spec: str):
+        module, _, attribute = spec.partition(":")
+        if not module or not attribute:
+            raise ValueError(f"Invalid spec '{spec}'. Use 'module:attribute'.")
+        self.spec = spec
+        self._target: Optional[Callable] = None
+
+    def resolve(self) -> Callable:
+        """Import and return the target."""
+        if self._target is None:
+            module, _, attribute = self.spec.partition(":")
+            target = import_module(module)
+            for name in attribute.split("."):
+                target = getattr(target, name)
+            self._target = target
+
+        return self._target
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+    def __getstate__(self):
+        return {"spec": self.spec}
+
+    def __setstate__(self, state):
+        self.spec = state["spec"]
+        self._target = None
+
+    def __repr__(self):
+        return f"LazyCallable('{self.spec}')"
+
+
+class Kernel(Protocol):
+    """A function computing a ranking metric straight from arrays.
+
+    It takes a (genes x case samples) and a (genes x control samples) array,
+    with the same genes in the same order, plus any options of the method as
+    keyword arguments. It returns a 1D array with the statistic of each gene,
+    where higher values are ranked first.
+    """
+
+    def __call__(self, case: Any, control: Any, **options) -> Any: ...
+
+
+class KernelRanking:
+    """Run a `Kernel` on a DualDataset, as the `exec` of a RankingMethod.
+
+    This is a class, not a closure, so that it can be pickled and sent to
+    other processes.
+    """
+
+    def __init__(self, kernel: Union[Kernel, LazyCallable], normalized: bool = False):
+        self.kernel = kernel
+        self.normalized = normalized
+
+    def __call__(self, dual_dataset, **options):
+        from gene_ranker.methods.base import fail_if_empty
+
+        return fail_if_empty(self._rank)(dual_dataset, **options)
+
+    def _rank(self, dual_dataset, **options):
+        import pandas as pd
+
+        from gene_ranker.methods.base import normalize_dual_dataset
+
+        if self.normalized:
+            normalize_dual_dataset(dual_dataset)
+
+        values = self.kernel(
+            dual_dataset.case_values, dual_dataset.control_values, **options
+        )
+        if len(values) != len(dual_dataset.ids):
+            raise ValueError(
+                f"The kernel gave {len(values)} values "
+                f"for {len(dual_dataset.ids)} genes."
+            )
+
+        return pd.DataFrame({dual_dataset.on: dual_dataset.ids, "ranking": values})
+
+    def __repr__(self):
+        return f"KernelRanking({self.kernel!r}, normalized={self.normalized})"
+
+
+@dataclass
+class RankingMethod:
+    """Represents a standard RankingMethod"""
+
+    name: str
+    """The human-friendly name of the method"""
+    exec: Union[Callable, str, None]
+    """The callable to call with this method.
+
+    It can also be a "module:function" string, in which case the module is only
+    imported when the method is run. If None, the `kernel` is run instead.
+    """
+    parser: Optional[Callable]
+    """An ArgumentParser to use to add options to the callable for this method."""
+    desc: Optional[str] = None
+    """A human-friendly description of the method."""
+    normalized: bool = False
+    """Whether the method runs on DESeq2-normalized data."""
+    row_independent: bool = False
+    """Whether the ranking of each gene depends only on the values of that gene.
+
+    Such methods can be run on separate chunks of genes, and give the same results.
+    """
+    kernel: Union[Kernel, str, None] = None
+    """A function computing the metric straight from two arrays, if there is one.
+
+    See `Kernel`. It is used to quickly rank many resamples of the data. If
+    there is no `exec`, it is also used to rank the data, and the alignment,
+    chunking, parallel runs and output are left to `gene_ranker`. It can also
+    be a "module:function" string.
+    """
+
+    kernel_memory: float = 2.0
+    """How much memory the `kernel` uses, as a multiple of the size of its input.
+
+    This covers the temporary arrays the kernel makes (like centered copies,
+    or the sort and rank buffers of rank-based tests), and is used to size the
+    batches of resamples (see `StabilityOptions.max_batch_bytes`).
+    """
+
+    def __post_init__(self):
+        if isinstance(self.exec, str):
+            self.exec = LazyCallable(self.exec)
+        if isinstance(self.kernel, str):
+            self.kernel = LazyCallable(self.kernel)
+        if self.exec is None:
+            if self.kernel is None:
+                raise ValueError(f"Method '{self.name}' needs an exec or a kernel.")
+            self.exec = KernelRanking(self.kernel, self.normalized)
+        if self.parser is None:
+            # Set a dummy parser with no options.
+            self.parser = ArgumentParser(self.name, description=self.desc)
+
+
+class MethodRegistry(MutableMapping):
+    """A mapping of method keys to RankingMethods.
+
+    On first use, methods registered by other packages in the
+    `gene_ranker.methods` entry point group are added to it. Each entry point
+    should point to a RankingMethod, and its name is used as the method key.
+    """
+
+    def __init__(self, methods: Optional[dict[str, RankingMethod]] = None):
+        self._methods: dict[str, RankingMethod] = dict(methods or {})
+        self._plugins_loaded = False
+
+    def _load_plugins(self):
+        if self._plugins_loaded:
+            return
+        self._plugins_loaded = True
+
+        for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+            if entry_point.name in self._methods:
+                log.warning(
+                    f"Method '{entry_point.name}' from {entry_point.value} "
+                    "overrides a method with the same name."
+                )
+            try:
+                method = entry_point.load()
+            except Exception as e:
+                log.warning(f"Could not load method '{entry_point.name}': {e}")
+                continue
+            if not isinstance(method, RankingMethod):
+                log.warning(
+                    f"Entry point '{entry_point.name}' is not a RankingMethod. Skipping."
+                )
+                continue
+            self._methods[entry_point.name] = method
+
+    def __getitem__(self, key: str) -> RankingMethod:
+        self._load_plugins()
+        return self._methods[key]
+
+    def __setitem__(self, key: str, value: RankingMethod):
+        self._load_plugins()
+        self._methods[key] = value
+
+    def __delitem__(self, key: str):
+        self._load_plugins()
+        del self._methods[key]
+
+    def __iter__(self) -> Iterator[str]:
+        self._load_plugins()
+        return iter(self._methods)
+
+    def __len__(self) -> int:
+        self._load_plugins()
+        return len(self._methods)
+
+    def __repr__(self):
+        return f"MethodRegistry({list(self)})"
@@ -1,38 +1,62 @@
-from statistics import mean
 import logging
 
 import pandas as pd
 import numpy as np
-from numpy import std
 
 from gene_ranker.dual_dataset import DualDataset
-from gene_ranker.methods.base import fail_if_empty
+from gene_ranker.methods.base import fail_if_empty, norm_wrapper
+from gene_ranker.stats import SufficientStats
 
 log = logging.getLogger(__name__)
 
 
-@fail_if_empty
-def signal_to_noise_ratio(dual_dataset: DualDataset) -> pd.DataFrame:
-    dual_dataset.sync()
+def signal_to_noise(case: np.ndarray, control: np.ndarray) -> np.ndarray:
+    """Compute the signal to noise ratio for every row of two matrices.
+
+    The signal is `mean(case) - mean(control)`, the noise is the sum of the
+    (`ddof=1`) standard deviations of case and control. Zero noise values are
+    replaced with a very small value.
 
-    case = dual_dataset.case.set_index(dual_dataset.on)
-    control = dual_dataset.control.set_index(dual_dataset.on)
+    Args:
+        case (np.ndarray): A (genes x case samples) array.
+        control (np.ndarray): A (genes x control samples) array, with rows in
+            the same order as `case`.
+
+    Returns:
+        A 1D array with the signal to noise ratio of each row.
+    """
+    return signal_to_noise_from_stats(
+        SufficientStats.from_array(case), SufficientStats.from_array(control)
+    )
 
-    case_means = case.apply(mean, axis=1)
-    case_stdev = case.apply(lambda x: std(x, ddof=1), axis=1)
-    control_means = control.apply(mean, axis=1)
-    control_stdev = control.apply(lambda x: std(x, ddof=1), axis=1)
 
+def signal_to_noise_from_stats(
+    case: SufficientStats, control: SufficientStats
+) -> np.ndarray:
+    """Like `signal_to_noise`, but from the sufficient statistics of the rows."""
     # Assume that the values are logged
-    signal = case_means.to_numpy() - control_means.to_numpy()
-    noise = case_stdev.to_numpy() + control_stdev.to_numpy()
+    signal = case.mean - control.mean
+    noise = case.std(ddof=1) + control.std(ddof=1)
 
     if np.any(noise == 0):
-        log.warn("Some noise values are 0. Setting them to a very small value")
+        log.warning("Some noise values are 0. Setting them to a very small value")
         noise[noise == 0] = 1e-5
 
+    return signal / noise
+
+
+@fail_if_empty
+def signal_to_noise_ratio(dual_dataset: DualDataset) -> pd.DataFrame:
     frame = pd.DataFrame(
-        {dual_dataset.on: dual_dataset.case[dual_dataset.on], "ranking": signal / noise}
+        {
+            dual_dataset.on: dual_dataset.ids,
+            "ranking": signal_to_noise(
+                dual_dataset.case_values, dual_dataset.control_values
+            ),
+        }
     )
 
     return frame
+
+
+norm_signal_to_noise_ratio = norm_wrapper(signal_to_noise_ratio)
@@ -0,0 +1,29 @@
+import numpy as np
+
+from gene_ranker.stats import SufficientStats
+
+
+def welch_t(case: np.ndarray, control: np.ndarray) -> np.ndarray:
+    """Compute Welch's t statistic for every row of two matrices.
+
+    The difference of the means (case - control) is divided by its standard
+    error, without assuming that case and control have the same variance.
+
+    Args:
+        case (np.ndarray): A (genes x case samples) array.
+        control (np.ndarray): A (genes x control samples) array, with rows in
+            the same order as `case`.
+
+    Returns:
+        A 1D array with the t statistic of each row.
+    """
+    return welch_t_from_stats(
+        SufficientStats.from_array(case), SufficientStats.from_array(control)
+    )
+
+
+def welch_t_from_stats(case: SufficientStats, control: SufficientStats) -> np.ndarray:
+    """Like `welch_t`, but from the sufficient statistics of the rows."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        error = np.sqrt(case.var() / case.n + control.var() / control.n)
+        return (case.mean - control.mean) / error
@@ -0,0 +1,103 @@
+"""
+Run row-independent ranking methods on blocks of genes in parallel.
+
+Worker processes get the values through shared memory (see `shared.py`),
+so they are not copied to each of them.
+"""
+
+import logging
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Callable, Union
+
+import numpy as np
+import pandas as pd
+
+from gene_ranker.dual_dataset import DualDataset
+from gene_ranker.shared import SharedDualDataset, rank_shared_block
+
+log = logging.getLogger(__name__)
+
+
+def split_dual_dataset(dual_dataset: DualDataset, n_blocks: int) -> list[DualDataset]:
+    """Split a DualDataset in blocks of consecutive genes.
+
+    The blocks keep the gene order of the original dataset, and have the same
+    `normalized` flag.
+
+    Args:
+        dual_dataset (DualDataset): The dataset to split.
+        n_blocks (int): How many blocks to make. Fewer are made if there are
+            not enough genes.
+    """
+    ids = dual_dataset.ids
+    case, control = dual_dataset.case_values, dual_dataset.control_values
+    n_blocks = max(1, min(n_blocks, len(ids)))
+    bounds = np.linspace(0, len(ids), n_blocks + 1).astype(int)
+
+    blocks = []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        # Slicing rows gives views, so the blocks share the original memory
+        block = DualDataset.from_arrays(
+            ids[start:end],
+            case[start:end],
+            control[start:end],
+            dual_dataset.case_samples,
+            dual_dataset.control_samples,
+            on=dual_dataset.on,
+        )
+        block.normalized = dual_dataset.normalized
+        blocks.append(block)
+
+    return blocks
+
+
+def _rank_block(exec: Callable, dual_dataset: DualDataset, kwargs: dict):
+    return exec(dual_dataset=dual_dataset, **kwargs)
+
+
+def rank_in_blocks(
+    executor: Executor,
+    exec: Callable,
+    dual_dataset: Union[DualDataset, SharedDualDataset],
+    kwargs: dict,
+    n_blocks: int,
+) -> pd.DataFrame:
+    """Run a row-independent ranking function on blocks of genes, in parallel.
+
+    The results are put back together in the original gene order, so they
+    are the same as running `exec` on the whole dataset.
+
+    With a process pool, the values are handed to the workers in shared
+    memory. Pass a SharedDualDataset to reuse the same shared values for
+    several functions; a DualDataset is shared only for this call.
+
+    Args:
+        executor (Executor): The executor to submit the blocks to.
+        exec (Callable): The ranking function, like `RankingMethod.exec`.
+            It must be picklable (e.g. defined at the module level).
+        dual_dataset (DualDataset or SharedDualDataset): The data to rank.
+        kwargs (dict): Extra arguments to pass to `exec`.
+        n_blocks (int): How many blocks to split the genes in.
+    """
+    if isinstance(dual_dataset, SharedDualDataset):
+        blocks = dual_dataset.blocks(n_blocks)
+        log.debug(f"Ranking {len(blocks)} shared blocks of genes in parallel")
+        futures = [
+            executor.submit(rank_shared_block, exec, block, kwargs) for block in blocks
+        ]
+        return pd.concat([x.result() for x in futures], ignore_index=True)
+
+    if isinstance(executor, ProcessPoolExecutor):
+        with SharedDualDataset(dual_dataset) as shared:
+            return rank_in_blocks(executor, exec, shared, kwargs, n_blocks)
+
+    blocks = split_dual_dataset(dual_dataset, n_blocks)
+    log.debug(f"Ranking {len(blocks)} blocks of genes in parallel")
+    futures = [executor.submit(_rank_block, exec, block, kwargs) for block in blocks]
+
+    return pd.concat([x.result() for x in futures], ignore_index=True)
+
+
+def make_executor(jobs: int) -> Executor:
+    """Make a process pool with `jobs` worker processes."""
+    return ProcessPoolExecutor(max_workers=jobs)
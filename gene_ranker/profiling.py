@@ -0,0 +1,164 @@
+"""
+Time the stages of a run, and measure the memory they use.
+
+A `Profiler` is passed to the ranking functions (e.g. `run_method`), which
+wrap each stage of the run (loading, aligning, normalizing, ranking and
+writing) in `Profiler.stage`. Each finished stage is recorded as a `Stage`,
+and passed to the hooks subscribed to the profiler.
+"""
+
+import json
+import logging
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+log = logging.getLogger(__name__)
+
+
+def peak_rss() -> Optional[int]:
+    """Get the peak resident set size of this process and its children, in bytes.
+
+    Returns None if it cannot be measured on this platform.
+    """
+    if resource is None:
+        return None
+
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    scale = 1 if sys.platform == "darwin" else 1024
+
+    return max(usage, children) * scale
+
+
+def size_of(obj: Any) -> Optional[int]:
+    """Get the size of the data in a DataFrame, DualDataset or array, in bytes.
+
+    Returns None for other objects.
+    """
+    if hasattr(obj, "case_values") and hasattr(obj, "control_values"):
+        return int(obj.case_values.nbytes + obj.control_values.nbytes)
+    if hasattr(obj, "memory_usage"):
+        return int(obj.memory_usage(index=True).sum())
+    if hasattr(obj, "nbytes"):
+        return int(obj.nbytes)
+
+    return None
+
+
+@dataclass
+class Stage:
+    """A finished stage of a run"""
+
+    name: str
+    """The name of the stage, like 'load' or 'rank:fold_change'"""
+    seconds: float
+    """How long the stage took, in seconds"""
+    peak_rss_bytes: Optional[int] = None
+    """The peak RSS of the process at the end of the stage, in bytes"""
+    size_bytes: Optional[int] = None
+    """The size of the output of the stage, in bytes, if it was recorded"""
+    shape: Optional[tuple[int, ...]] = None
+    """The shape of the output of the stage, if it was recorded"""
+    info: dict = field(default_factory=dict)
+    """Any other information about the stage"""
+
+
+class StageRecorder:
+    """Collects information about a running stage.
+
+    Yielded by `Profiler.stage`, so that the stage can record its output.
+    """
+
+    def __init__(self):
+        self.output = None
+        self.info = {}
+
+    def record(self, output: Any, **info):
+        """Record the output of the stage (to measure its size) and other info."""
+        self.output = output
+        self.info.update(info)
+
+
+class Profiler:
+    """Records the time and memory used by the stages of a run.
+
+    Hooks can be subscribed to the profiler with `subscribe`. They are called
+    with each `Stage` as soon as it is finished.
+    """
+
+    def __init__(self):
+        self.stages: list[Stage] = []
+        self._hooks: list[Callable[[Stage], None]] = []
+        self._start = time.perf_counter()
+
+    def subscribe(self, hook: Callable[[Stage], None]):
+        """Call `hook` with every stage that finishes from now on."""
+        self._hooks.append(hook)
+
+    def unsubscribe(self, hook: Callable[[Stage], None]):
+        """Stop calling `hook`."""
+        self._hooks.remove(hook)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[StageRecorder]:
+        """Time the code in a `with` block as a stage called `name`.
+
+        The stage is recorded even if the block raises an error.
+        """
+        recorder = StageRecorder()
+        start = time.perf_counter()
+        try:
+            yield recorder
+        finally:
+            seconds = time.perf_counter() - start
+            output = recorder.output
+            shape = getattr(output, "shape", None)
+            stage = Stage(
+                name=name,
+                seconds=seconds,
+                peak_rss_bytes=peak_rss(),
+                size_bytes=size_of(output) if output is not None else None,
+                shape=tuple(int(x) for x in shape) if shape is not None else None,
+                info=recorder.info,
+            )
+            log.debug(f"Stage '{name}' took {seconds:.3f}s")
+            self.stages.append(stage)
+            for hook in self._hooks:
+                hook(stage)
+
+    def report(self) -> dict:
+        """Summarize the run as a JSON-serializable dictionary."""
+        from gene_ranker import __version__
+
+        return {
+            "version": __version__,
+            "total_seconds": time.perf_counter() - self._start,
+            "peak_rss_bytes": peak_rss(),
+            "stages": [asdict(x) for x in self.stages],
+        }
+
+    def write(self, path: Path):
+        """Write the report to a JSON file."""
+        with path.open("w+") as stream:
+            json.dump(self.report(), stream, indent=2)
+
+
+@contextmanager
+def maybe_stage(profiler: Optional[Profiler], name: str) -> Iterator[StageRecorder]:
+    """Like `Profiler.stage`, but does nothing if there is no profiler."""
+    if profiler is None:
+        yield StageRecorder()
+        return
+
+    with profiler.stage(name) as recorder:
+        yield recorder
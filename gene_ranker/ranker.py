@@ -3,14 +3,28 @@ Rank genes based on various metrics.
 """
 
 import logging
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack, nullcontext
 from pathlib import Path
-from statistics import mean
 from typing import Optional
 
 import pandas as pd
 
-from gene_ranker.dual_dataset import DualDataset
-from gene_ranker.methods.base import RankingMethod
+from gene_ranker.cache import NormalizationCache
+from gene_ranker.dual_dataset import DualDataset, split_frame
+from gene_ranker.filtering import GeneFilter
+from gene_ranker.methods import RANKING_METHODS
+from gene_ranker.methods.base import RankingMethod, normalize_dual_dataset
+from gene_ranker.parallel import make_executor, rank_in_blocks
+from gene_ranker.profiling import Profiler, maybe_stage
+from gene_ranker.readers import is_sparse, read_columns, read_matrix
+from gene_ranker.shared import SharedDualDataset
+from gene_ranker.sparse import ConstantGenes, load_sparse_dual_dataset, split_constant
+from gene_ranker.stability import (
+    StabilityOptions,
+    rank_stability,
+    stability_columns,
+)
 
 log = logging.getLogger(__name__)
 
@@ -24,7 +38,8 @@ def filter_dataset(
     """Filters a dataset according to simple criteria.
 
     Filters based on the average expression of the genes (across all samples)
-    and a pre-determined list of genes.
+    and a pre-determined list of genes. See `GeneFilter` for more criteria,
+    and to filter DualDatasets.
 
     Args:
         data (pd.DataFrame): The dataframe to filter.
@@ -35,22 +50,327 @@ def filter_dataset(
         only_in (list[str] or None): Keep genes only in this list. If None,
             does not filter. Defaults to None.
     """
-    data = data.set_index(id_col)
-    if avg_mean_threshold:
-        means = data.apply(mean, axis=1)
-        keep = means[means > avg_mean_threshold].index
-        data = data.filter(items=keep.tolist(), axis=0)
+    gene_filter = GeneFilter(
+        min_mean=avg_mean_threshold or None,
+        allow=set(only_in) if only_in else None,
+    )
+    samples = [x for x in data.columns if x != id_col]
+    keep = gene_filter.mask(data[id_col].to_numpy(), data[samples].to_numpy())
+
+    data = data.loc[keep, [id_col, *samples]]
+
+    return data.reset_index(drop=True)
+
+
+def check_columns(case_matrix: Path, control_matrix: Path, shared_col: str):
+    """Check that two matrices can be merged, reading only their columns.
+
+    Raise:
+        ValueError: If the ID column is not in both matrices, or they share
+            some samples.
+    """
+    case_cols = read_columns(case_matrix, shared_col)
+    control_cols = read_columns(control_matrix, shared_col)
+    if shared_col not in case_cols or shared_col not in control_cols:
+        raise ValueError(f"Shared column '{shared_col}' not in both datasets.")
+    if set(case_cols) & set(control_cols) != {shared_col}:
+        raise ValueError("Case and control frames share columns other than `on`.")
+
+
+def _load_side(
+    path: Path,
+    shared_col: str,
+    dtype: str,
+    name: str,
+    profiler: Optional[Profiler],
+):
+    """Read a matrix and split it into sorted IDs and values (see `split_frame`)."""
+    with maybe_stage(profiler, f"load:{name}") as stage:
+        data = read_matrix(path, shared_col, dtype)
+        stage.record(data, path=str(path))
+        log.info(
+            f"Loaded a {data.shape[1]} col by {data.shape[0]} rows {name} matrix from {path}"
+        )
+        try:
+            return split_frame(data, shared_col, dtype)
+        except ValueError as e:
+            raise ValueError(f"Cannot use the {name} matrix {path}: {e}")
+
+
+def load_dual_dataset(
+    case_matrix: Path,
+    control_matrix: Path,
+    shared_col: str = "gene_id",
+    profiler: Optional[Profiler] = None,
+    dtype: str = "float64",
+) -> DualDataset:
+    """Read the case and control matrices from disk and tangle them.
+
+    The two matrices are read at the same time, in two threads, with an
+    explicit schema: string IDs and `dtype` values. Their columns are checked
+    before reading the values, and the IDs of each side are checked and
+    sorted as soon as it is read.
+
+    Args:
+        case_matrix (Path): Path to the case matrix to be read. In any format
+            supported by `read_matrix`.
+        control_matrix (Path): Same as above, with the control matrix.
+        shared_col (str): The name of the ID column shared by the two matrices.
+        profiler (Profiler or None): Records the 'load:case', 'load:control'
+            and 'align' stages, if given.
+        dtype (str): The type to read the values as, one of `VALUE_DTYPES`.
+
+    Raise:
+        ValueError: If the matrices cannot be merged.
+    """
+    check_columns(case_matrix, control_matrix, shared_col)
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        case = pool.submit(_load_side, case_matrix, shared_col, dtype, "case", profiler)
+        control = pool.submit(
+            _load_side, control_matrix, shared_col, dtype, "control", profiler
+        )
+        case, control = case.result(), control.result()
+
+    with maybe_stage(profiler, "align") as stage:
+        dual_dataset = DualDataset.from_split(case, control, on=shared_col)
+        stage.record(dual_dataset, genes=len(dual_dataset.ids))
+
+    n_genes = len(dual_dataset.ids)
+    if n_genes < max(len(case[0]), len(control[0])):
+        log.warning(
+            f"Only {n_genes} of the {len(case[0])} case and {len(control[0])} "
+            "control genes are in both matrices."
+        )
+
+    return dual_dataset
+
+
+def load_any_dual_dataset(
+    case_matrix: Path,
+    control_matrix: Path,
+    shared_col: str = "gene_id",
+    profiler: Optional[Profiler] = None,
+    dtype: str = "float64",
+) -> tuple[DualDataset, Optional[ConstantGenes]]:
+    """Load two matrices with `load_sparse_dual_dataset` if they are sparse,
+    or with `load_dual_dataset` otherwise.
+
+    Returns:
+        The DualDataset, and the genes left out of it because they are zero
+        in all samples (None for dense matrices).
+
+    Raise:
+        ValueError: If only one of the matrices is sparse.
+    """
+    if is_sparse(case_matrix) != is_sparse(control_matrix):
+        raise ValueError(
+            "Either both or neither of the case and control matrices must be sparse."
+        )
+    if is_sparse(case_matrix):
+        return load_sparse_dual_dataset(
+            case_matrix, control_matrix, shared_col, profiler, dtype
+        )
+
+    return (
+        load_dual_dataset(case_matrix, control_matrix, shared_col, profiler, dtype),
+        None,
+    )
 
-    if only_in:
-        data = data.filter(items=only_in, axis=0)
 
-    data[id_col] = data.index
-    data = data.reset_index(drop=True)
+def registry_key(method: RankingMethod, default: str) -> str:
+    """Get the key of a method in `RANKING_METHODS`, or `default` if it has none."""
+    for key, registered in RANKING_METHODS.items():
+        if registered is method:
+            return key
 
-    col_order = [id_col] + [x for x in data.columns if x != id_col]
-    data = data[col_order]
+    return default
 
-    return data
+
+def rank_dual_dataset(
+    dual_dataset: DualDataset,
+    methods: dict[str, RankingMethod],
+    extra_args: Optional[dict[str, dict]] = None,
+    cache: Optional[NormalizationCache] = None,
+    jobs: int = 1,
+    executor: Optional[Executor] = None,
+    profiler: Optional[Profiler] = None,
+    gene_filter: Optional[GeneFilter] = None,
+    stability: Optional[StabilityOptions] = None,
+    skip_constant: bool = False,
+    constant_genes: Optional[ConstantGenes] = None,
+) -> pd.DataFrame:
+    """Run several RankingMethods on the same DualDataset.
+
+    Methods that need normalized data all share a single normalized copy of
+    the dataset, so the normalization is done at most once.
+    If a `gene_filter` is given, genes are filtered before anything else, so
+    filtered out genes are never normalized or ranked.
+    Genes with the same value in all samples (see `skip_constant`) can be
+    ranked once per value instead of once per gene.
+
+    Args:
+        dual_dataset (DualDataset): The data to rank.
+        methods (dict[str, RankingMethod]): The methods to run. The keys are
+            used as the names of the ranking columns in the output.
+        extra_args (dict[str, dict] or None): Extra arguments to pass to each
+            method, keyed by the same keys as `methods`.
+        cache (NormalizationCache or None): A cache for the normalized data.
+        jobs (int): The number of processes to use. If more than one,
+            row-independent methods are run on blocks of genes in parallel.
+            Other methods always run in this process.
+        executor (Executor or None): An existing executor to use to run
+            methods in parallel, instead of making a new one. The genes are
+            still split in `jobs` blocks.
+        profiler (Profiler or None): Records the 'filter' and 'normalize'
+            stages and a 'rank:<key>' stage for each method, if given. The
+            stages are named after the key of the method in
+            `RANKING_METHODS` (e.g. 'rank:fold_change', even for the
+            single-method "ranking" key), if it has one.
+        gene_filter (GeneFilter or None): Which genes to rank. If None,
+            ranks all of them.
+        stability (StabilityOptions or None): If given, also estimate how
+            stable the rank of each gene is (see `rank_stability`). This adds
+            the `stability_columns` of the mode for each method, prefixed by
+            its key (except for the single-method "ranking" key). Only works
+            with methods that have a `kernel`.
+        skip_constant (bool): Rank the genes with the same value in all
+            samples (after filtering) once per value, with the methods that
+            rank each gene independently. The genes that are zero in all
+            samples, which the normalization ignores, are also left out of
+            it. For the methods that need normalized data, the genes are
+            chosen after normalizing, so the results are the same as
+            without skipping. Methods that do not rank each gene
+            independently, or rank stability, always get all the genes.
+        constant_genes (ConstantGenes or None): Genes that are zero in all
+            samples, and were already taken out of `dual_dataset` (e.g. by
+            `load_sparse_dual_dataset`). They are filtered like the others.
+            Giving them implies `skip_constant`.
+
+    Returns:
+        A pd.DataFrame with the ID column and one ranking column per method.
+    """
+    extra_args = extra_args or {}
+    normalized = None
+    result = None
+
+    if stability:
+        if no_kernel := [k for k, v in methods.items() if v.kernel is None]:
+            raise ValueError(
+                f"Cannot estimate the rank stability of methods {no_kernel}: "
+                "they cannot be computed on resampled data."
+            )
+
+    if gene_filter:
+        with maybe_stage(profiler, "filter") as stage:
+            dual_dataset = gene_filter.apply(dual_dataset)
+            stage.record(dual_dataset, genes=len(dual_dataset.ids))
+        log.info(f"Ranking {len(dual_dataset.ids)} genes after filtering")
+        if constant_genes is not None:
+            constant_genes = constant_genes.filter(
+                gene_filter,
+                len(dual_dataset.case_samples),
+                len(dual_dataset.control_samples),
+            )
+
+    skip_constant = skip_constant or constant_genes is not None
+    zeros = None
+    if skip_constant:
+        # Genes that are zero everywhere do not change the normalization
+        dual_dataset, zeros = split_constant(dual_dataset, zero=True)
+        if constant_genes is not None:
+            zeros = constant_genes.concat(zeros)
+        log.info(f"Leaving out {len(zeros)} genes that are zero in all samples")
+
+    # The genes each method gets, for the raw and the normalized data
+    splits = {}
+
+    def genes_to_rank(data: DualDataset, method: RankingMethod):
+        """Get the data to rank, and the constant genes to rank apart."""
+        if not skip_constant:
+            return data, None
+        if method.row_independent and not stability:
+            if ("split", id(data)) not in splits:
+                varying, constant = split_constant(data)
+                log.info(
+                    f"Ranking {len(constant) + len(zeros)} genes that are the "
+                    "same in all samples once per value"
+                )
+                splits[("split", id(data))] = (varying, zeros.concat(constant))
+            return splits[("split", id(data))]
+        if ("full", id(data)) not in splits:
+            splits[("full", id(data))] = (zeros.restore(data), None)
+        return splits[("full", id(data))]
+
+    if executor:
+        pool = nullcontext(executor)
+    else:
+        pool = make_executor(jobs) if jobs > 1 else nullcontext()
+
+    with pool as executor, ExitStack() as shared_data:
+        # The values handed to worker processes, shared once for all methods
+        shared = {}
+        for key, method in methods.items():
+            if method.normalized:
+                if normalized is None:
+                    log.info("Normalizing input data...")
+                    with maybe_stage(profiler, "normalize") as stage:
+                        normalized = normalize_dual_dataset(dual_dataset.copy(), cache)
+                        stage.record(normalized)
+                data = normalized
+            else:
+                data = dual_dataset
+            data, constant = genes_to_rank(data, method)
+
+            log.debug(f"Running method '{key}'...")
+            kwargs = extra_args.get(key, {})
+            name = registry_key(method, key)
+            with maybe_stage(profiler, f"rank:{name}") as stage:
+                if executor and method.row_independent:
+                    blocks = data
+                    if isinstance(executor, ProcessPoolExecutor):
+                        if id(data) not in shared:
+                            shared[id(data)] = shared_data.enter_context(
+                                SharedDualDataset(data)
+                            )
+                        blocks = shared[id(data)]
+                    ranking = rank_in_blocks(
+                        executor, method.exec, blocks, kwargs, jobs
+                    )
+                else:
+                    ranking = method.exec(dual_dataset=data, **kwargs)
+                if constant:
+                    ranking = pd.concat(
+                        [ranking, constant.rank(method, data, **kwargs)],
+                        ignore_index=True,
+                    ).sort_values(data.on, kind="stable", ignore_index=True)
+                stage.record(ranking)
+            ranking = ranking.rename(columns={"ranking": key})
+
+            if stability:
+                with maybe_stage(profiler, f"stability:{name}") as stage:
+                    stable = rank_stability(
+                        method.kernel,
+                        data,
+                        stability,
+                        method.kernel_memory,
+                        method.row_independent,
+                    )
+                    stage.record(stable)
+                if key != "ranking":
+                    stable = stable.rename(
+                        columns={
+                            x: f"{key}_{x}" for x in stability_columns(stability.mode)
+                        }
+                    )
+                ranking = ranking.merge(stable, on=dual_dataset.on, how="left")
+
+            if result is None:
+                result = ranking
+            else:
+                result = result.merge(ranking, on=dual_dataset.on, how="outer")
+
+    return result
 
 
 def run_method(
@@ -59,28 +379,106 @@ def run_method(
     method: RankingMethod,
     shared_col: str = "gene_id",
     extra_args: Optional[dict] = None,
+    cache: Optional[NormalizationCache] = None,
+    jobs: int = 1,
+    profiler: Optional[Profiler] = None,
+    gene_filter: Optional[GeneFilter] = None,
+    stability: Optional[StabilityOptions] = None,
+    precision: str = "float64",
+    skip_constant: bool = False,
 ) -> pd.DataFrame:
     """Run a RankingMethod on two frames.
 
     Args:
-        case_matrix (Path): Path to the case matrix to be read. In `csv` format.
+        case_matrix (Path): Path to the case matrix to be read. In any format
+            supported by `read_matrix`.
         control_matrix (Path): Same as above, with the control matrix.
         method (RankingMethod): A valid RankingMethod.
+        cache (NormalizationCache or None): A cache for the normalized data.
+        jobs (int): The number of processes to use, if the method is
+            row-independent.
+        profiler (Profiler or None): A profiler to record the stages of the
+            run in. Subscribe to it to be notified as each stage finishes.
+        gene_filter (GeneFilter or None): Which genes to rank. If None,
+            ranks all of them.
+        stability (StabilityOptions or None): If given, also estimate how
+            stable the rank of each gene is.
+        precision (str): The type to load and rank the values as, either
+            "float64" or "float32" (half the memory, about the same ranks).
+        skip_constant (bool): Do not rank the genes with the same value in
+            all samples. Always done for sparse inputs.
     """
-    case_matrix_data: pd.DataFrame = pd.read_csv(case_matrix)
-    control_matrix_data: pd.DataFrame = pd.read_csv(control_matrix)
-
-    log.info(
-        f"Loaded a {case_matrix_data.shape[1]} col by {case_matrix_data.shape[0]} rows case matrix from {case_matrix}"
-    )
-    log.info(
-        f"Loaded a {control_matrix_data.shape[1]} col by {control_matrix_data.shape[0]} rows control matrix from {control_matrix}"
+    dual_dataset, constant_genes = load_any_dual_dataset(
+        case_matrix, control_matrix, shared_col, profiler, dtype=precision
     )
 
-    dual_dataset = DualDataset(
-        case=case_matrix_data, control=control_matrix_data, on=shared_col
+    return rank_dual_dataset(
+        dual_dataset,
+        {"ranking": method},
+        {"ranking": extra_args or {}},
+        cache=cache,
+        jobs=jobs,
+        profiler=profiler,
+        gene_filter=gene_filter,
+        stability=stability,
+        skip_constant=skip_constant,
+        constant_genes=constant_genes,
     )
 
-    result = method.exec(dual_dataset=dual_dataset, **extra_args)
 
-    return result
+def run_methods(
+    case_matrix: Path,
+    control_matrix: Path,
+    methods: dict[str, RankingMethod],
+    shared_col: str = "gene_id",
+    extra_args: Optional[dict[str, dict]] = None,
+    cache: Optional[NormalizationCache] = None,
+    jobs: int = 1,
+    profiler: Optional[Profiler] = None,
+    gene_filter: Optional[GeneFilter] = None,
+    stability: Optional[StabilityOptions] = None,
+    precision: str = "float64",
+    skip_constant: bool = False,
+) -> pd.DataFrame:
+    """Run several RankingMethods on two frames, loading them only once.
+
+    Args:
+        case_matrix (Path): Path to the case matrix to be read. In any format
+            supported by `read_matrix`.
+        control_matrix (Path): Same as above, with the control matrix.
+        methods (dict[str, RankingMethod]): The methods to run, keyed by the
+            name of their output column (usually their `RANKING_METHODS` key).
+        extra_args (dict[str, dict] or None): Extra arguments to pass to each
+            method, keyed by the same keys as `methods`.
+        cache (NormalizationCache or None): A cache for the normalized data.
+        jobs (int): The number of processes to use for row-independent methods.
+        profiler (Profiler or None): A profiler to record the stages of the
+            run in.
+        gene_filter (GeneFilter or None): Which genes to rank. If None,
+            ranks all of them.
+        stability (StabilityOptions or None): If given, also estimate how
+            stable the rank of each gene is.
+        precision (str): The type to load and rank the values as, either
+            "float64" or "float32" (half the memory, about the same ranks).
+        skip_constant (bool): Do not rank the genes with the same value in
+            all samples. Always done for sparse inputs.
+
+    Returns:
+        A pd.DataFrame with the ID column and one ranking column per method.
+    """
+    dual_dataset, constant_genes = load_any_dual_dataset(
+        case_matrix, control_matrix, shared_col, profiler, dtype=precision
+    )
+
+    return rank_dual_dataset(
+        dual_dataset,
+        methods,
+        extra_args,
+        cache,
+        jobs,
+        profiler=profiler,
+        gene_filter=gene_filter,
+        stability=stability,
+        skip_constant=skip_constant,
+        constant_genes=constant_genes,
+    )
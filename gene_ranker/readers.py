@@ -0,0 +1,345 @@
+"""
+Read expression matrices from disk, in various formats.
+"""
+
+import logging
+from pathlib import Path
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+from gene_ranker.methods.base import MissingExternalDependency
+
+log = logging.getLogger(__name__)
+
+CSV_SUFFIXES = (".csv",)
+TSV_SUFFIXES = (".tsv", ".tab", ".txt")
+PARQUET_SUFFIXES = (".parquet", ".pq")
+ARROW_SUFFIXES = (".feather", ".arrow", ".ipc")
+NPY_SUFFIXES = (".npy",)
+SPARSE_SUFFIXES = (".mtx", ".npz")
+COMPRESSION_SUFFIXES = (".gz", ".bz2", ".xz", ".zst", ".zip")
+
+VALUE_DTYPES = ("float64", "float32")
+"""The types the values of a matrix can be read as."""
+
+
+def _format_suffix(path: Path) -> str:
+    """Get the suffix that identifies the format of a file.
+
+    Compression suffixes are skipped, so "matrix.csv.gz" gives ".csv".
+    """
+    suffixes = [x.lower() for x in path.suffixes]
+    while suffixes and suffixes[-1] in COMPRESSION_SUFFIXES:
+        suffixes.pop()
+
+    return suffixes[-1] if suffixes else ""
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise MissingExternalDependency(
+            "Reading Parquet or Arrow files requires `pyarrow`. "
+            "Install it with `pip install pyarrow`."
+        )
+    return pyarrow
+
+
+def _csv_engine() -> str:
+    """Get the fastest CSV parser available to `pd.read_csv`.
+
+    The pyarrow parser reads the file with several threads, but only
+    supports an explicit schema well, so it is only used with one.
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return "c"
+    return "pyarrow"
+
+
+def npy_sidecars(path: Path) -> tuple[Path, Path]:
+    """Get the paths to the sidecar files of a `.npy` matrix.
+
+    For `matrix.npy`, the gene IDs are read from `matrix.genes.txt` and the
+    sample names from `matrix.samples.txt`, one per line.
+    """
+    return path.with_suffix(".genes.txt"), path.with_suffix(".samples.txt")
+
+
+def is_sparse(path: Path) -> bool:
+    """Check if a file holds a sparse matrix, from its extension."""
+    return _format_suffix(Path(path)) in SPARSE_SUFFIXES
+
+
+def sparse_sidecars(path: Path) -> tuple[Path, Path]:
+    """Get the paths to the sidecar files of a sparse matrix.
+
+    Like `npy_sidecars`: for `matrix.mtx` (or `matrix.mtx.gz`, or
+    `matrix.npz`), the gene IDs are read from `matrix.genes.txt` and the
+    sample names from `matrix.samples.txt`, one per line.
+    """
+    name = path.name
+    for suffix in reversed(path.suffixes):
+        if suffix.lower() not in COMPRESSION_SUFFIXES + SPARSE_SUFFIXES:
+            break
+        name = name[: -len(suffix)]
+
+    return path.with_name(f"{name}.genes.txt"), path.with_name(f"{name}.samples.txt")
+
+
+def _read_lines(path: Path) -> list[str]:
+    with path.open("r") as stream:
+        return [line.rstrip("\r\n") for line in stream if line.strip()]
+
+
+def read_npy(
+    path: Path, id_col: str = "gene_id", dtype: Optional[str] = None
+) -> pd.DataFrame:
+    """Read a (genes x samples) `.npy` matrix, with its sidecar files.
+
+    The matrix is memory-mapped, not read into memory, unless it has to be
+    converted to another `dtype`.
+    If the sample names sidecar is missing, the samples are named
+    `<file stem>_<column number>`.
+    """
+    genes_path, samples_path = npy_sidecars(path)
+    if not genes_path.exists():
+        raise ValueError(f"Cannot read {path}: missing gene IDs file {genes_path}")
+
+    values = np.load(path, mmap_mode="r")
+    if values.ndim != 2:
+        raise ValueError(f"Expected a 2D matrix in {path}, got {values.ndim}D.")
+
+    genes = _read_lines(genes_path)
+    if samples_path.exists():
+        samples = _read_lines(samples_path)
+    else:
+        samples = [f"{path.stem}_{i}" for i in range(values.shape[1])]
+
+    if len(genes) != values.shape[0] or len(samples) != values.shape[1]:
+        raise ValueError(
+            f"The {values.shape} matrix in {path} does not match its "
+            f"{len(genes)} gene IDs and {len(samples)} sample names."
+        )
+
+    if dtype is not None:
+        values = values.astype(dtype, copy=False)
+    data = pd.DataFrame(values, columns=samples, copy=False)
+    data.insert(0, id_col, genes)
+
+    return data
+
+
+def read_sparse(path: Path, dtype: Optional[str] = None):
+    """Read a sparse (genes x samples) matrix, with its sidecar files.
+
+    Matrix Market (`.mtx`, optionally compressed) and `scipy.sparse` (`.npz`)
+    files are supported. See `sparse_sidecars` for the sidecar files.
+    If the sample names sidecar is missing, the samples are named
+    `<file name>_<column number>`.
+
+    Returns:
+        An (IDs, values, samples) tuple, where `values` is a
+        `scipy.sparse.csr_array` and IDs is an array of strings.
+    """
+    from scipy import io, sparse
+
+    path = Path(path)
+    genes_path, samples_path = sparse_sidecars(path)
+    if not genes_path.exists():
+        raise ValueError(f"Cannot read {path}: missing gene IDs file {genes_path}")
+
+    if _format_suffix(path) == ".npz":
+        values = sparse.load_npz(path)
+    else:
+        values = io.mmread(path)
+    values = sparse.csr_array(values, dtype=dtype or np.float64)
+    if values.ndim != 2:
+        raise ValueError(f"Expected a 2D matrix in {path}, got {values.ndim}D.")
+
+    genes = _read_lines(genes_path)
+    if samples_path.exists():
+        samples = _read_lines(samples_path)
+    else:
+        stem = genes_path.name[: -len(".genes.txt")]
+        samples = [f"{stem}_{i}" for i in range(values.shape[1])]
+
+    if len(genes) != values.shape[0] or len(samples) != values.shape[1]:
+        raise ValueError(
+            f"The {values.shape} matrix in {path} does not match its "
+            f"{len(genes)} gene IDs and {len(samples)} sample names."
+        )
+
+    return np.array(genes, dtype=object), values, samples
+
+
+def read_arrow(path: Path) -> pd.DataFrame:
+    """Read an Arrow IPC (Feather v2) file, memory-mapping it."""
+    pyarrow = _import_pyarrow()
+    from pyarrow import ipc
+
+    with pyarrow.memory_map(str(path), "r") as source:
+        table = ipc.open_file(source).read_all()
+
+    return table.to_pandas()
+
+
+def read_columns(path: Path, id_col: str = "gene_id") -> list[str]:
+    """Read only the names of the columns of a matrix, without its values.
+
+    Supports the same formats as `read_matrix`.
+    """
+    path = Path(path)
+    suffix = _format_suffix(path)
+
+    if suffix in PARQUET_SUFFIXES:
+        _import_pyarrow()
+        from pyarrow import parquet
+
+        names = parquet.read_schema(path, memory_map=True).names
+        return [x for x in names if not x.startswith("__index_level_")]
+    if suffix in ARROW_SUFFIXES:
+        pyarrow = _import_pyarrow()
+        from pyarrow import ipc
+
+        with pyarrow.memory_map(str(path), "r") as source:
+            return ipc.open_file(source).schema.names
+    if suffix in NPY_SUFFIXES:
+        return read_npy(path, id_col).columns.tolist()
+    if suffix in SPARSE_SUFFIXES:
+        return [id_col, *read_sparse(path)[2]]
+
+    sep = "\t" if suffix in TSV_SUFFIXES else ","
+    return pd.read_csv(path, sep=sep, nrows=0).columns.tolist()
+
+
+def _cast(data: pd.DataFrame, id_col: str, dtype: str) -> pd.DataFrame:
+    """Convert the values of a matrix to `dtype` and its IDs to strings."""
+    if id_col in data.columns and data[id_col].dtype != object:
+        data[id_col] = data[id_col].astype(str)
+    samples = [x for x in data.columns if x != id_col]
+    if any(data[x].dtype != dtype for x in samples):
+        data[samples] = data[samples].astype(dtype)
+
+    return data
+
+
+def read_matrix(
+    path: Path, id_col: str = "gene_id", dtype: Optional[str] = None
+) -> pd.DataFrame:
+    """Read an expression matrix, detecting its format from the file extension.
+
+    Supported formats are:
+        - `.csv` and `.tsv` (or `.tab`, `.txt`) text files, optionally compressed;
+        - `.parquet` (or `.pq`) files;
+        - `.feather` (or `.arrow`, `.ipc`) Arrow IPC files, which are memory-mapped;
+        - `.npy` matrices plus a gene IDs sidecar (see `npy_sidecars`),
+          which are memory-mapped;
+        - sparse `.mtx` (Matrix Market) or `.npz` (`scipy.sparse`) matrices
+          plus a gene IDs sidecar (see `sparse_sidecars`). They are made
+          dense: use `load_sparse_dual_dataset` to keep them sparse.
+
+    Parquet and Arrow files need `pyarrow` to be installed.
+    Unknown extensions are read as `csv`.
+
+    Args:
+        path (Path): The path to the file to read.
+        id_col (str): The name of the ID column. Used to name the ID column
+            of `.npy` matrices, which have none, and to find it if `dtype`
+            is given.
+        dtype (str or None): If given, one of `VALUE_DTYPES`. The values are
+            read as this type and the IDs as strings, instead of guessing the
+            type of each column. Text files are then parsed with the
+            multithreaded pyarrow parser, if it is installed.
+
+    Returns:
+        A pd.DataFrame with the ID column and one column per sample.
+    """
+    path = Path(path)
+    suffix = _format_suffix(path)
+    if dtype is not None and dtype not in VALUE_DTYPES:
+        raise ValueError(f"Cannot read values as {dtype}. Use one of {VALUE_DTYPES}.")
+
+    if suffix in PARQUET_SUFFIXES:
+        _import_pyarrow()
+        data = pd.read_parquet(path, engine="pyarrow", memory_map=True)
+    elif suffix in ARROW_SUFFIXES:
+        data = read_arrow(path)
+    elif suffix in NPY_SUFFIXES:
+        return read_npy(path, id_col, dtype)
+    elif suffix in SPARSE_SUFFIXES:
+        ids, values, samples = read_sparse(path, dtype)
+        data = pd.DataFrame(values.toarray(), columns=samples, copy=False)
+        data.insert(0, id_col, ids)
+        return data
+    else:
+        if suffix not in CSV_SUFFIXES + TSV_SUFFIXES:
+            log.warning(
+                f"Unknown file extension '{suffix}' for {path}. Reading as csv."
+            )
+        sep = "\t" if suffix in TSV_SUFFIXES else ","
+        if dtype is None:
+            return pd.read_csv(path, sep=sep)
+
+        schema = {x: dtype for x in read_columns(path, id_col)}
+        schema[id_col] = str
+        return pd.read_csv(path, sep=sep, dtype=schema, engine=_csv_engine())
+
+    return _cast(data, id_col, dtype) if dtype is not None else data
+
+
+def read_matrix_chunks(
+    path: Path, chunk_size: int, id_col: str = "gene_id"
+) -> Iterator[pd.DataFrame]:
+    """Read an expression matrix in chunks of at most `chunk_size` rows.
+
+    Supports the same formats as `read_matrix`, but never holds more than
+    about one chunk of the file in memory.
+
+    Args:
+        path (Path): The path to the file to read.
+        chunk_size (int): The maximum number of rows in each chunk.
+        id_col (str): The name of the ID column. Only used for `.npy` matrices.
+
+    Yields:
+        pd.DataFrames with the ID column and one column per sample.
+    """
+    path = Path(path)
+    suffix = _format_suffix(path)
+
+    if suffix in PARQUET_SUFFIXES:
+        _import_pyarrow()
+        from pyarrow import parquet
+
+        for batch in parquet.ParquetFile(path, memory_map=True).iter_batches(
+            batch_size=chunk_size
+        ):
+            yield batch.to_pandas()
+    elif suffix in ARROW_SUFFIXES:
+        pyarrow = _import_pyarrow()
+        from pyarrow import ipc
+
+        with pyarrow.memory_map(str(path), "r") as source:
+            reader = ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                for start in range(0, batch.num_rows, chunk_size):
+                    yield batch.slice(start, chunk_size).to_pandas()
+    elif suffix in SPARSE_SUFFIXES:
+        raise ValueError(f"Sparse matrices like {path} cannot be read in chunks.")
+    elif suffix in NPY_SUFFIXES:
+        data = read_npy(path, id_col)
+        for start in range(0, data.shape[0], chunk_size):
+            yield data.iloc[start : start + chunk_size].reset_index(drop=True)
+    else:
+        if suffix not in CSV_SUFFIXES + TSV_SUFFIXES:
+            log.warning(
+                f"Unknown file extension '{suffix}' for {path}. Reading as csv."
+            )
+        sep = "\t" if suffix in TSV_SUFFIXES else ","
+        with pd.read_csv(path, sep=sep, chunksize=chunk_size) as reader:
+            yield from reader
@@ -0,0 +1,531 @@
+"""
+A long-lived server that keeps cohorts in memory and ranks contrasts on demand.
+
+The server speaks JSON over HTTP, on a TCP port or on a Unix socket:
+
+    GET  /cohorts          List the known cohorts, and which are loaded.
+    POST /cohorts          Register (and load) a cohort, if the server allows it:
+                           {"name": ..., "matrix": path} or
+                           {"name": ..., "case": path, "control": path}
+    POST /rank             Rank a contrast of a cohort:
+                           {"cohort": ..., "methods": [...],
+                            "case": [samples], "control": [samples],
+                            "args": {method: {option: value}} (only the
+                                     CLIENT_OPTIONS),
+                            "format": "json" or "csv"}
+
+Loaded cohorts, and the aligned (and normalized) data of their contrasts, are
+kept in memory and dropped when they are the least recently used. They are
+loaded (or aligned, or normalized) by the first request that needs them, while
+other requests for them wait, and requests for other data go on.
+"""
+
+import io
+import json
+import logging
+import os
+import socketserver
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Hashable, Optional
+
+import pandas as pd
+
+from gene_ranker.dual_dataset import DualDataset
+from gene_ranker.methods import RANKING_METHODS, RankingMethod
+from gene_ranker.methods.base import normalize_dual_dataset
+from gene_ranker.ranker import load_dual_dataset, rank_dual_dataset
+from gene_ranker.readers import read_matrix
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MAX_COHORTS = 4
+DEFAULT_MAX_CONTRASTS = 32
+
+CLIENT_OPTIONS = frozenset({"backend", "n_cpus"})
+"""The method options that clients can set in their requests.
+
+Other options (like `fit_cache`, a path on the server) keep their defaults.
+"""
+
+
+class NotFound(KeyError):
+    """Raised when a cohort is not known to the server"""
+
+
+class LoadError(RuntimeError):
+    """Raised when a cohort cannot be loaded.
+
+    The message does not include the cause, which is logged instead, so that
+    clients do not learn about the files of the server.
+    """
+
+
+class OnceCache:
+    """A least recently used cache of values that are slow to make.
+
+    Each value is made only once: requests for a value that is being made
+    wait for it, instead of making it again. Values are made outside of the
+    lock, so making one does not hold up requests for the others.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._values: OrderedDict[Hashable, Any] = OrderedDict()
+        self._pending: dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, make: Callable[[], Any]) -> Any:
+        """Get the value of a key, calling `make` to make it if needed.
+
+        If `make` fails, the requests waiting for the value fail with the same
+        error, and the next request tries again.
+        """
+        with self._lock:
+            if key in self._values:
+                self._values.move_to_end(key)
+                return self._values[key]
+            future = self._pending.get(key)
+            if future is None:
+                future = self._pending[key] = Future()
+                owner = True
+            else:
+                owner = False
+
+        if not owner:
+            return future.result()
+
+        try:
+            value = make()
+        except BaseException as e:
+            with self._lock:
+                if self._pending.get(key) is future:
+                    del self._pending[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            # Keys discarded while the value was made are not kept
+            if self._pending.get(key) is future:
+                del self._pending[key]
+                self._values[key] = value
+                while len(self._values) > self.max_size:
+                    evicted, _ = self._values.popitem(last=False)
+                    log.debug(f"Dropping {evicted!r}")
+        future.set_result(value)
+
+        return value
+
+    def discard(self, key: Hashable):
+        """Drop the value of a key, and do not keep the one being made."""
+        with self._lock:
+            self._values.pop(key, None)
+            self._pending.pop(key, None)
+
+    def peek(self, key: Hashable) -> Any:
+        """Get the value of a key if it is kept, or None, without using it."""
+        with self._lock:
+            return self._values.get(key)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._values)
+
+
+@dataclass
+class Cohort:
+    """A matrix with all the samples of a cohort, sorted by ID.
+
+    Cohorts loaded from a case and a control matrix remember which samples
+    were which, to use them as the default contrast.
+    """
+
+    data: pd.DataFrame
+    on: str
+    case: list[str] = field(default_factory=list)
+    control: list[str] = field(default_factory=list)
+    contrasts: OnceCache = field(
+        default_factory=lambda: OnceCache(DEFAULT_MAX_CONTRASTS)
+    )
+    """The data of recent contrasts, by (case, control, normalized)."""
+
+
+class CohortStore:
+    """Loads cohorts on demand, and keeps the most recently used in memory."""
+
+    def __init__(
+        self,
+        max_cohorts: int = DEFAULT_MAX_COHORTS,
+        max_contrasts: int = DEFAULT_MAX_CONTRASTS,
+        id_col: str = "gene_id",
+    ):
+        """Make a new CohortStore
+
+        Args:
+            max_cohorts (int): How many cohorts to keep loaded at most.
+            max_contrasts (int): How many contrasts of each cohort to keep
+                the aligned data of. The normalized data of a contrast counts
+                as another contrast.
+            id_col (str): The name of the ID column of the matrices.
+        """
+        self.max_cohorts = max_cohorts
+        self.max_contrasts = max_contrasts
+        self.id_col = id_col
+        self.sources: dict[str, dict[str, Path]] = {}
+        self._loaded = OnceCache(max_cohorts)
+        self._lock = threading.Lock()
+
+    def register(self, name: str, **paths: Path):
+        """Register a cohort, from a `matrix` or from `case` and `control` paths.
+
+        The cohort is loaded when it is first used.
+
+        Raise:
+            ValueError: If the paths are not a matrix or a case/control pair.
+        """
+        if set(paths) not in ({"matrix"}, {"case", "control"}):
+            raise ValueError("Give either a 'matrix', or a 'case' and a 'control'.")
+        with self._lock:
+            self.sources[name] = {k: Path(v) for k, v in paths.items()}
+            self._loaded.discard(name)
+
+    def unregister(self, name: str):
+        """Forget a cohort, and unload it."""
+        with self._lock:
+            self.sources.pop(name, None)
+            self._loaded.discard(name)
+
+    def _load(self, name: str, paths: dict[str, Path]) -> Cohort:
+        log.info(f"Loading cohort '{name}'")
+        try:
+            if "matrix" in paths:
+                data = read_matrix(paths["matrix"], self.id_col, dtype="float64")
+                data = data.sort_values(by=self.id_col, ignore_index=True)
+                return Cohort(
+                    data, self.id_col, contrasts=OnceCache(self.max_contrasts)
+                )
+
+            dual_dataset = load_dual_dataset(
+                paths["case"], paths["control"], self.id_col
+            )
+        except Exception as e:
+            log.exception(f"Failed to load cohort '{name}'")
+            raise LoadError(f"Could not load cohort '{name}'.") from e
+
+        return Cohort(
+            dual_dataset.merged,
+            self.id_col,
+            case=dual_dataset.case_samples,
+            control=dual_dataset.control_samples,
+            contrasts=OnceCache(self.max_contrasts),
+        )
+
+    def get(self, name: str) -> Cohort:
+        """Get a cohort, loading it if needed.
+
+        Raise:
+            NotFound: If the cohort was never registered.
+            LoadError: If the cohort cannot be loaded.
+        """
+        with self._lock:
+            if name not in self.sources:
+                raise NotFound(f"Unknown cohort '{name}'.")
+            paths = self.sources[name]
+
+        return self._loaded.get(name, lambda: self._load(name, paths))
+
+    def contrast(
+        self,
+        name: str,
+        case: Optional[list[str]] = None,
+        control: Optional[list[str]] = None,
+        normalized: bool = False,
+    ) -> DualDataset:
+        """Get the aligned data of a contrast of a cohort.
+
+        Args:
+            name (str): The name of the cohort.
+            case (list[str] or None): The case samples. If None, uses the case
+                samples the cohort was loaded with.
+            control (list[str] or None): Same as above, for the controls.
+            normalized (bool): Whether to get the normalized data.
+
+        Raise:
+            NotFound: If the cohort was never registered.
+            LoadError: If the cohort cannot be loaded.
+            ValueError: If the samples are not valid.
+        """
+        cohort = self.get(name)
+        case = list(case) if case else cohort.case
+        control = list(control) if control else cohort.control
+        if not case or not control:
+            raise ValueError("Give the 'case' and 'control' samples to rank.")
+
+        return self._contrast(cohort, case, control, normalized)
+
+    def _contrast(
+        self, cohort: Cohort, case: list[str], control: list[str], normalized: bool
+    ) -> DualDataset:
+        def make() -> DualDataset:
+            if normalized:
+                data = self._contrast(cohort, case, control, normalized=False)
+                return normalize_dual_dataset(data.copy())
+            return DualDataset.from_matrix(cohort.data, case, control, cohort.on)
+
+        return cohort.contrasts.get((tuple(case), tuple(control), normalized), make)
+
+    def status(self) -> dict:
+        """Describe the registered cohorts."""
+        with self._lock:
+            sources = dict(self.sources)
+
+        status = {}
+        for name, paths in sources.items():
+            cohort = self._loaded.peek(name)
+            status[name] = {
+                "sources": {k: str(v) for k, v in paths.items()},
+                "loaded": cohort is not None,
+                "contrasts": len(cohort.contrasts) if cohort else 0,
+            }
+
+        return status
+
+    def rank(
+        self,
+        name: str,
+        methods: list[str],
+        case: Optional[list[str]] = None,
+        control: Optional[list[str]] = None,
+        extra_args: Optional[dict[str, dict]] = None,
+    ) -> pd.DataFrame:
+        """Rank a contrast of a cohort with several methods.
+
+        Methods that need normalized data use the resident normalized data,
+        so it is normalized only once per contrast.
+
+        Args:
+            name (str): The name of the cohort.
+            methods (list[str]): The keys of the methods to rank with.
+            case (list[str] or None): The case samples, see `contrast`.
+            control (list[str] or None): The control samples, see `contrast`.
+            extra_args (dict[str, dict] or None): Options of the methods,
+                by method key. Only the `CLIENT_OPTIONS` can be given, and
+                their values are checked like on the command line.
+
+        Raise:
+            NotFound: If the cohort was never registered.
+            ValueError: If the methods, options or samples are not valid.
+        """
+        if not methods:
+            raise ValueError("Give at least one method to rank with.")
+        if unknown := [x for x in methods if x not in RANKING_METHODS]:
+            raise ValueError(f"Unknown methods {unknown}.")
+
+        extra_args = {} if extra_args is None else extra_args
+        if not isinstance(extra_args, dict) or not all(
+            isinstance(x, dict) for x in extra_args.values()
+        ):
+            raise ValueError("Give the 'args' as {method: {option: value}}.")
+        if unused := [x for x in extra_args if x not in methods]:
+            raise ValueError(f"Options given for methods {unused}, which are not run.")
+
+        args = {
+            key: method_args(RANKING_METHODS[key], extra_args.get(key, {}))
+            for key in methods
+        }
+
+        result = None
+        for normalized in (False, True):
+            group = {
+                k: RANKING_METHODS[k]
+                for k in methods
+                if RANKING_METHODS[k].normalized == normalized
+            }
+            if not group:
+                continue
+            dual_dataset = self.contrast(name, case, control, normalized)
+            ranking = rank_dual_dataset(dual_dataset, group, args)
+            result = (
+                ranking
+                if result is None
+                else result.merge(ranking, on=dual_dataset.on, how="outer")
+            )
+
+        return result[[result.columns[0], *methods]]
+
+
+def method_args(method: RankingMethod, options: dict[str, Any]) -> dict[str, Any]:
+    """Get the arguments of a method, with some options set by a client.
+
+    The values are converted and checked by the parser of the method, like
+    on the command line.
+
+    Raise:
+        ValueError: If an option is not one of the `CLIENT_OPTIONS` of the
+            method, or its value is not valid.
+    """
+    parser = method.parser
+    args = vars(parser.parse_args([]))
+    actions = {x.dest: x for x in parser._actions if x.option_strings}
+    allowed = sorted(CLIENT_OPTIONS & set(actions))
+
+    for option, value in options.items():
+        if option not in allowed:
+            raise ValueError(
+                f"Option '{option}' cannot be set for method '{method.name}'. "
+                f"Use one of {allowed}."
+            )
+        action = actions[option]
+        try:
+            value = action.type(str(value)) if action.type else str(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid value {value!r} for option '{option}'.")
+        if action.choices is not None and value not in action.choices:
+            raise ValueError(
+                f"Invalid value {value!r} for option '{option}'. "
+                f"Use one of {list(action.choices)}."
+            )
+        args[option] = value
+
+    return args
+
+
+class RankingHandler(BaseHTTPRequestHandler):
+    """Answers the requests to a ranking server"""
+
+    server_version = "gene_ranker"
+
+    @property
+    def store(self) -> CohortStore:
+        return self.server.store
+
+    def address_string(self):
+        # Unix sockets have no client address
+        return self.client_address[0] if self.client_address else "local"
+
+    def log_message(self, format, *args):
+        log.debug(f"{self.address_string()} - {format % args}")
+
+    def _send(self, status: HTTPStatus, body: str, content_type="application/json"):
+        payload = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _error(self, status: HTTPStatus, message: str):
+        self._send(status, json.dumps({"error": message}))
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not isinstance(body, dict):
+            raise ValueError("The request body must be a JSON object.")
+        return body
+
+    def do_GET(self):
+        if self.path != "/cohorts":
+            return self._error(HTTPStatus.NOT_FOUND, f"No such path {self.path}")
+        self._send(HTTPStatus.OK, json.dumps(self.store.status()))
+
+    def do_POST(self):
+        try:
+            body = self._read_json()
+            if self.path == "/cohorts":
+                if not self.server.allow_register:
+                    return self._error(
+                        HTTPStatus.FORBIDDEN, "This server does not add cohorts."
+                    )
+                if "name" not in body:
+                    raise ValueError("Give the 'name' of the cohort.")
+                name = body.pop("name")
+                self.store.register(name, **body)
+                try:
+                    self.store.get(name)
+                except LoadError:
+                    self.store.unregister(name)
+                    raise
+                return self._send(HTTPStatus.OK, json.dumps(self.store.status()))
+            if self.path == "/rank":
+                return self._rank(body)
+        except NotFound as e:
+            return self._error(HTTPStatus.NOT_FOUND, str(e.args[0]))
+        except LoadError as e:
+            return self._error(HTTPStatus.INTERNAL_SERVER_ERROR, str(e))
+        except (ValueError, KeyError, TypeError) as e:
+            return self._error(HTTPStatus.BAD_REQUEST, str(e))
+        except Exception:
+            log.exception("Failed to answer request")
+            return self._error(
+                HTTPStatus.INTERNAL_SERVER_ERROR, "Failed to answer the request."
+            )
+
+        self._error(HTTPStatus.NOT_FOUND, f"No such path {self.path}")
+
+    def _rank(self, body: dict):
+        if "cohort" not in body:
+            raise ValueError("Give the 'cohort' to rank.")
+        result = self.store.rank(
+            body["cohort"],
+            body.get("methods", []),
+            case=body.get("case"),
+            control=body.get("control"),
+            extra_args=body.get("args"),
+        )
+        if body.get("format", "json") == "csv":
+            stream = io.StringIO()
+            result.to_csv(stream, index=False)
+            return self._send(HTTPStatus.OK, stream.getvalue(), "text/csv")
+
+        self._send(HTTPStatus.OK, result.to_json(orient="records"))
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """An HTTP server listening on a Unix socket"""
+
+    daemon_threads = True
+
+    def server_bind(self):
+        # Remove a socket left over by a previous server
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        super().server_bind()
+
+
+def make_server(
+    store: CohortStore,
+    host: str = "127.0.0.1",
+    port: int = 0,
+    socket_path: Optional[Path] = None,
+    allow_register: bool = False,
+):
+    """Make a server answering ranking requests with the cohorts in `store`.
+
+    Args:
+        store (CohortStore): The cohorts to serve.
+        host (str): The host to listen on, if listening on a TCP port.
+        port (int): The TCP port to listen on. If 0, a free port is chosen.
+        socket_path (Path or None): If given, listen on this Unix socket
+            instead of a TCP port.
+        allow_register (bool): Whether clients can add cohorts with
+            `POST /cohorts`. Since they give the paths to load, only allow it
+            if the clients can be trusted with reading the files of the
+            server.
+
+    Returns:
+        The server. Call `serve_forever` on it to start answering requests.
+    """
+    if socket_path:
+        server = UnixHTTPServer(str(socket_path), RankingHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), RankingHandler)
+    server.store = store
+    server.allow_register = allow_register
+
+    return server
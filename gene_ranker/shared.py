@@ -0,0 +1,257 @@
+"""
+Hand the values of a DualDataset to worker processes through shared memory.
+
+Sending a DualDataset to another process pickles its values, so each worker
+gets its own copy. Instead, `SharedDualDataset` copies the case and control
+values once into `multiprocessing.shared_memory` segments, and sends workers
+only small `SharedBlock` handles. Workers attach to the segments and rank
+zero-copy views of their rows.
+
+The segments are owned by the process that made them, and are removed:
+- when the `SharedDualDataset` is closed, or its `with` block ends (even on
+  errors, or on Ctrl-C);
+- when the interpreter exits, if they were not closed before;
+- by the `multiprocessing` resource tracker if the process dies without
+  running any Python code (e.g. it is killed).
+"""
+
+import atexit
+import gc
+import logging
+import os
+import sys
+import threading
+from dataclasses import dataclass
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable
+
+import numpy as np
+
+from gene_ranker.dual_dataset import DualDataset
+
+log = logging.getLogger(__name__)
+
+_owned: dict[str, SharedMemory] = {}
+"""The segments made by this process that are not removed yet."""
+_owned_lock = threading.Lock()
+_attach_lock = threading.Lock()
+
+# Forked workers must not remove the segments of their parent
+os.register_at_fork(after_in_child=_owned.clear)
+
+
+def _release(shm: SharedMemory):
+    with _owned_lock:
+        _owned.pop(shm.name, None)
+    try:
+        shm.close()
+    except BufferError:
+        # Some views are still alive: the memory is unmapped when they are
+        # collected, but the segment can already be removed
+        log.debug(f"Shared memory segment {shm.name} is still in use")
+    try:
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+
+
+@atexit.register
+def _release_all():
+    with _owned_lock:
+        leftover = list(_owned.values())
+    for shm in leftover:
+        log.debug(f"Removing shared memory segment {shm.name} at exit")
+        _release(shm)
+
+
+def _attach(name: str) -> SharedMemory:
+    """Attach to an existing segment, without tracking it in this process.
+
+    Only the owner of a segment should remove it. Before Python 3.13,
+    attaching registers the segment with the resource tracker of this
+    process, which removes it when the process exits, so it has to be
+    attached without registering it.
+    """
+    if sys.version_info >= (3, 13):
+        return SharedMemory(name=name, track=False)
+
+    with _attach_lock:
+        register = resource_tracker.register
+        resource_tracker.register = lambda *args: None
+        try:
+            return SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+@dataclass(frozen=True)
+class SharedArray:
+    """A picklable handle to a C-contiguous array in a shared memory segment."""
+
+    name: str
+    """The name of the shared memory segment."""
+    shape: tuple[int, ...]
+    dtype: str
+
+    @classmethod
+    def share(cls, array: np.ndarray) -> tuple["SharedArray", SharedMemory]:
+        """Copy an array into a new shared memory segment.
+
+        The segment is removed at exit if it is not released before.
+
+        Returns:
+            The handle to the array, and the segment, owned by the caller.
+        """
+        array = np.asarray(array)
+        # Empty segments are not allowed
+        shm = SharedMemory(create=True, size=max(array.nbytes, 1))
+        with _owned_lock:
+            _owned[shm.name] = shm
+        view = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+        view[...] = array
+        del view
+
+        return cls(shm.name, array.shape, array.dtype.str), shm
+
+    def view(self, shm: SharedMemory) -> np.ndarray:
+        """Get a read-only view of the array in an attached segment."""
+        view = np.ndarray(self.shape, dtype=np.dtype(self.dtype), buffer=shm.buf)
+        view.flags.writeable = False
+        return view
+
+
+@dataclass(frozen=True)
+class SharedBlock:
+    """A picklable handle to a block of consecutive genes of a SharedDualDataset.
+
+    Only the IDs of the block are copied in the handle.
+    """
+
+    case: SharedArray
+    control: SharedArray
+    start: int
+    """The first row of the block."""
+    ids: np.ndarray
+    case_samples: list[str]
+    control_samples: list[str]
+    on: str
+    normalized: bool
+
+    def dual_dataset(
+        self, case_shm: SharedMemory, control_shm: SharedMemory
+    ) -> DualDataset:
+        """Make a DualDataset of the block, viewing the attached segments."""
+        rows = slice(self.start, self.start + len(self.ids))
+        dual_dataset = DualDataset.from_arrays(
+            self.ids,
+            self.case.view(case_shm)[rows],
+            self.control.view(control_shm)[rows],
+            self.case_samples,
+            self.control_samples,
+            on=self.on,
+        )
+        dual_dataset.normalized = self.normalized
+
+        return dual_dataset
+
+
+def _detach(shm: SharedMemory):
+    try:
+        shm.close()
+    except BufferError:
+        # Views caught in reference cycles are only freed by the collector
+        gc.collect()
+        shm.close()
+
+
+def rank_shared_block(exec: Callable, block: SharedBlock, kwargs: dict):
+    """Run a ranking function on a SharedBlock, in a worker process.
+
+    The segments are attached only while `exec` runs, so the result must not
+    be a view of the input values (no ranking function returns one).
+    """
+    case_shm = _attach(block.case.name)
+    try:
+        control_shm = _attach(block.control.name)
+        try:
+            return exec(
+                dual_dataset=block.dual_dataset(case_shm, control_shm), **kwargs
+            )
+        finally:
+            _detach(control_shm)
+    finally:
+        _detach(case_shm)
+
+
+class SharedDualDataset:
+    """The values of a DualDataset, copied in shared memory.
+
+    Use it as a context manager, so the shared memory is always released:
+    ```
+    with SharedDualDataset(dual_dataset) as shared:
+        futures = [
+            executor.submit(rank_shared_block, exec, block, {})
+            for block in shared.blocks(4)
+        ]
+        results = [x.result() for x in futures]
+    ```
+    The segments must outlive the tasks that use them.
+    """
+
+    def __init__(self, dual_dataset: DualDataset):
+        self.ids = dual_dataset.ids
+        self.case_samples = dual_dataset.case_samples
+        self.control_samples = dual_dataset.control_samples
+        self.on = dual_dataset.on
+        self.normalized = dual_dataset.normalized
+        self._segments = []
+
+        try:
+            self.case, shm = SharedArray.share(dual_dataset.case_values)
+            self._segments.append(shm)
+            self.control, shm = SharedArray.share(dual_dataset.control_values)
+            self._segments.append(shm)
+        except BaseException:
+            self.close()
+            raise
+        log.debug(
+            f"Shared {sum(x.size for x in self._segments)} bytes of values "
+            f"in segments {[x.name for x in self._segments]}"
+        )
+
+    def blocks(self, n_blocks: int) -> list[SharedBlock]:
+        """Split the genes in blocks of consecutive genes, like
+        `split_dual_dataset`.
+
+        Args:
+            n_blocks (int): How many blocks to make. Fewer are made if there
+                are not enough genes.
+        """
+        n_blocks = max(1, min(n_blocks, len(self.ids)))
+        bounds = np.linspace(0, len(self.ids), n_blocks + 1).astype(int)
+
+        return [
+            SharedBlock(
+                self.case,
+                self.control,
+                int(start),
+                self.ids[start:end],
+                self.case_samples,
+                self.control_samples,
+                self.on,
+                self.normalized,
+            )
+            for start, end in zip(bounds[:-1], bounds[1:])
+        ]
+
+    def close(self):
+        """Remove the shared memory segments. Blocks can no longer be opened."""
+        while self._segments:
+            _release(self._segments.pop())
+
+    def __enter__(self) -> "SharedDualDataset":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,266 @@
+"""
+Keep sparse inputs sparse, and rank the genes that are the same in all
+samples only once per value.
+
+Zero-heavy matrices (e.g. pseudobulk or low-depth data) often have many
+genes that are zero in every sample. These are found on the sparse matrices,
+and only the other genes are made dense. Genes that are zero everywhere are
+ignored by the DESeq2 normalization, so they can be left out of it without
+changing it. Genes that are the same in all samples (before or after
+normalizing) are ranked on a single row per value, and get the value the
+method gives to that row.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from gene_ranker.dual_dataset import DualDataset
+from gene_ranker.filtering import GeneFilter
+from gene_ranker.methods.registry import RankingMethod
+from gene_ranker.profiling import Profiler, maybe_stage
+from gene_ranker.readers import read_sparse
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class ConstantGenes:
+    """Genes with the same value in every case and control sample."""
+
+    ids: np.ndarray
+    """The IDs of the genes."""
+    values: np.ndarray
+    """The value of each gene, in all samples."""
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def concat(self, other: "ConstantGenes") -> "ConstantGenes":
+        return ConstantGenes(
+            np.concatenate([self.ids, other.ids]),
+            np.concatenate([self.values, other.values]),
+        )
+
+    def filter(
+        self, gene_filter: GeneFilter, n_case: int, n_control: int
+    ) -> "ConstantGenes":
+        """Keep only the genes that pass a GeneFilter.
+
+        The filter sees `n_case` and `n_control` samples with the value of
+        each gene, without making them.
+        """
+        column = self.values[:, None]
+        keep = gene_filter.mask(
+            self.ids,
+            np.broadcast_to(column, (len(self), n_case)),
+            np.broadcast_to(column, (len(self), n_control)),
+        )
+
+        return ConstantGenes(self.ids[keep], self.values[keep])
+
+    def restore(self, dual_dataset: DualDataset) -> DualDataset:
+        """Add the genes back to a DualDataset they were taken out of."""
+        if not len(self):
+            return dual_dataset
+
+        ids = np.concatenate([dual_dataset.ids, self.ids])
+        order = np.argsort(ids, kind="stable")
+
+        def add_rows(values: np.ndarray) -> np.ndarray:
+            rows = np.repeat(self.values[:, None], values.shape[1], axis=1)
+            return np.concatenate([values, rows.astype(values.dtype)])[order]
+
+        result = DualDataset.from_arrays(
+            ids[order],
+            add_rows(dual_dataset.case_values),
+            add_rows(dual_dataset.control_values),
+            dual_dataset.case_samples,
+            dual_dataset.control_samples,
+            on=dual_dataset.on,
+        )
+        result.normalized = dual_dataset.normalized
+
+        return result
+
+    def rank(self, method: RankingMethod, like: DualDataset, **options) -> pd.DataFrame:
+        """Rank the genes with a row-independent method.
+
+        The method is run once for each different value, on a row with that
+        value in every sample, so each gene gets what the method would give
+        it if it was ranked with the others.
+
+        Args:
+            method (RankingMethod): The method to rank with.
+            like (DualDataset): The data the genes were taken out of. Gives
+                the samples, the type of the values and whether they are
+                normalized.
+            **options: The options of the method.
+
+        Returns:
+            A pd.DataFrame with the ID column and a 'ranking' column.
+        """
+        values, genes = np.unique(self.values, return_inverse=True)
+        labels = np.array([f"constant_{i:09d}" for i in range(len(values))])
+        rows = values[:, None].astype(like.dtype)
+
+        rows_dataset = DualDataset.from_arrays(
+            labels,
+            np.repeat(rows, len(like.case_samples), axis=1),
+            np.repeat(rows, len(like.control_samples), axis=1),
+            like.case_samples,
+            like.control_samples,
+            on=like.on,
+        )
+        rows_dataset.normalized = like.normalized
+        ranking = method.exec(dual_dataset=rows_dataset, **options)
+        ranking = ranking.set_index(like.on)["ranking"].reindex(labels)
+
+        return pd.DataFrame(
+            {like.on: self.ids, "ranking": ranking.to_numpy()[genes.ravel()]}
+        )
+
+
+def split_constant(
+    dual_dataset: DualDataset, zero: bool = False
+) -> tuple[DualDataset, ConstantGenes]:
+    """Take out the genes that have the same value in all samples.
+
+    Args:
+        dual_dataset (DualDataset): The data to split.
+        zero (bool): Only take out the genes that are zero in all samples.
+
+    Returns:
+        A DualDataset with the other genes (the same one, if there are no
+        constant genes), and the constant genes.
+    """
+    case, control = dual_dataset.case_values, dual_dataset.control_values
+    low = np.minimum(
+        case.min(axis=1, initial=np.inf), control.min(axis=1, initial=np.inf)
+    )
+    high = np.maximum(
+        case.max(axis=1, initial=-np.inf), control.max(axis=1, initial=-np.inf)
+    )
+    # NaNs are never equal, so genes with NaNs are never constant
+    constant = low == high
+    if zero:
+        constant &= low == 0
+    ids = dual_dataset.ids
+
+    if not constant.any():
+        return dual_dataset, ConstantGenes(ids[:0], low[:0])
+
+    varying = ~constant
+    result = DualDataset.from_arrays(
+        ids[varying],
+        case[varying],
+        control[varying],
+        dual_dataset.case_samples,
+        dual_dataset.control_samples,
+        on=dual_dataset.on,
+    )
+    result.normalized = dual_dataset.normalized
+
+    return result, ConstantGenes(ids[constant], low[constant])
+
+
+def zero_rows(values) -> np.ndarray:
+    """Find the rows of a sparse matrix that are zero in every column.
+
+    Args:
+        values (scipy.sparse.csr_array): The matrix.
+
+    Returns:
+        A boolean array, True for the rows of zeros.
+    """
+    values = values.copy()
+    values.eliminate_zeros()
+
+    return np.diff(values.indptr) == 0
+
+
+def _load_sparse_side(path: Path, dtype: str, name: str, profiler: Optional[Profiler]):
+    """Read a sparse matrix, and sort its rows by ID."""
+    with maybe_stage(profiler, f"load:{name}") as stage:
+        ids, values, samples = read_sparse(path, dtype)
+        if not pd.Index(ids).is_unique:
+            raise ValueError(
+                f"The gene IDs of the {name} matrix {path} are not unique."
+            )
+        order = np.argsort(ids, kind="stable")
+        stage.record(values, path=str(path), stored=int(values.nnz))
+        log.info(
+            f"Loaded a sparse {values.shape[1]} col by {values.shape[0]} rows "
+            f"{name} matrix from {path}"
+        )
+
+        return ids[order], values[order], samples
+
+
+def load_sparse_dual_dataset(
+    case_matrix: Path,
+    control_matrix: Path,
+    shared_col: str = "gene_id",
+    profiler: Optional[Profiler] = None,
+    dtype: str = "float64",
+) -> tuple[DualDataset, ConstantGenes]:
+    """Read two sparse matrices, and make dense only the genes that are not zero.
+
+    The matrices are read at the same time, and aligned while still sparse.
+    Genes that are zero in every sample are left out, and only the others
+    are made dense. Pass them to `rank_dual_dataset` as `constant_genes`.
+
+    Args:
+        case_matrix (Path): Path to the case matrix to be read. In any format
+            supported by `read_sparse`.
+        control_matrix (Path): Same as above, with the control matrix.
+        shared_col (str): The name to give to the ID column.
+        profiler (Profiler or None): Records the 'load:case', 'load:control'
+            and 'align' stages, if given.
+        dtype (str): The type of the values, one of `VALUE_DTYPES`.
+
+    Returns:
+        A DualDataset with the genes that are not always zero, and the genes
+        that are.
+
+    Raise:
+        ValueError: If the matrices cannot be merged.
+    """
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        case = pool.submit(_load_sparse_side, case_matrix, dtype, "case", profiler)
+        control = pool.submit(
+            _load_sparse_side, control_matrix, dtype, "control", profiler
+        )
+        case_ids, case, case_samples = case.result()
+        control_ids, control, control_samples = control.result()
+
+    if set(case_samples) & set(control_samples):
+        raise ValueError("Case and control frames share columns other than `on`.")
+
+    with maybe_stage(profiler, "align") as stage:
+        ids, case_rows, control_rows = np.intersect1d(
+            case_ids, control_ids, assume_unique=True, return_indices=True
+        )
+        case, control = case[case_rows], control[control_rows]
+
+        zero = zero_rows(case) & zero_rows(control)
+        varying = np.flatnonzero(~zero)
+
+        dual_dataset = DualDataset.from_arrays(
+            ids[varying],
+            np.ascontiguousarray(case[varying].toarray()),
+            np.ascontiguousarray(control[varying].toarray()),
+            case_samples,
+            control_samples,
+            on=shared_col,
+        )
+        stage.record(dual_dataset, genes=len(varying), zero=int(zero.sum()))
+
+    log.info(f"Left out {zero.sum()} of {len(ids)} genes that are zero in all samples")
+
+    return dual_dataset, ConstantGenes(ids[zero], np.zeros(int(zero.sum())))
@@ -0,0 +1,246 @@
+"""
+Estimate how stable the rank of each gene is, by resampling the samples.
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import Callable, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+from gene_ranker.dual_dataset import DualDataset
+
+log = logging.getLogger(__name__)
+
+STABILITY_MODES = ("bootstrap", "permutation")
+
+ROW_OVERHEAD_BYTES = 16 * 8
+"""The memory kernels use for each row on top of `kernel_memory`.
+
+It covers the per-row statistics (like sums, means and variances) that they
+compute in float64, whatever the size of the row.
+"""
+
+STABILITY_COLUMNS = ("rank", "rank_low", "rank_high", "rank_median", "stability")
+"""The columns added to the output for each method with bootstrap resamples,
+in order."""
+
+NULL_COLUMNS = (
+    "rank",
+    "null_rank_low",
+    "null_rank_high",
+    "null_rank_median",
+    "null_spread",
+)
+"""The columns added to the output for each method with label permutations,
+in order. They describe the ranks under the null hypothesis, not how stable
+the observed rank is, so they are named differently."""
+
+
+@dataclass
+class StabilityOptions:
+    """How to resample the samples to estimate the stability of the ranks."""
+
+    mode: str = "bootstrap"
+    """Either "bootstrap" (resample the samples of each group with
+    replacement) or "permutation" (shuffle the case/control labels)."""
+    resamples: int = 1000
+    """How many times to resample."""
+    confidence: float = 0.95
+    """The fraction of the resampled ranks that fall in the rank interval."""
+    seed: Optional[int] = None
+    """The seed of the random number generator."""
+    max_batch_bytes: int = 256 * 1024**2
+    """The maximum memory used by a batch of resamples.
+
+    This covers the resampled case and control values, and the temporary
+    arrays the kernel makes on them (estimated with its `kernel_memory`).
+    The quantiles of the ranks are also computed on blocks of genes of at
+    most this size. The ranks of all the resamples are kept on top of it,
+    at 4 bytes per gene and resample. At least one resample (or gene) is
+    computed at a time, even if it does not fit.
+    """
+
+    def __post_init__(self):
+        if self.mode not in STABILITY_MODES:
+            raise ValueError(
+                f"Unknown stability mode '{self.mode}'. Use one of {STABILITY_MODES}."
+            )
+        if self.resamples < 1:
+            raise ValueError("The number of resamples must be a positive number.")
+        if not 0 < self.confidence < 1:
+            raise ValueError("The confidence must be between 0 and 1.")
+
+
+def stability_columns(mode: str) -> tuple[str, ...]:
+    """Get the columns `rank_stability` adds with a resampling mode."""
+    return NULL_COLUMNS if mode == "permutation" else STABILITY_COLUMNS
+
+
+def rank_genes(statistics: np.ndarray) -> np.ndarray:
+    """Rank the genes (rows) by their statistic, separately for each column.
+
+    The gene with the highest statistic has rank 1. NaNs are ranked last.
+    """
+    order = np.argsort(-statistics, axis=0, kind="stable")
+    ranks = np.empty(statistics.shape, dtype=np.int32)
+    positions = np.arange(1, statistics.shape[0] + 1, dtype=np.int32)
+    np.put_along_axis(
+        ranks, order, np.broadcast_to(positions[:, None], order.shape), axis=0
+    )
+
+    return ranks
+
+
+def _resample_indices(
+    rng: np.random.Generator, mode: str, n_case: int, n_control: int, size: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Draw the columns of `size` resamples of the concatenated samples.
+
+    Returns:
+        A (size x n_case) and a (size x n_control) array of column indices.
+    """
+    if mode == "bootstrap":
+        # Drawn one resample (row) after the other, so the resamples do not
+        # depend on how many are drawn at once
+        high = np.repeat([n_case, n_control], [n_case, n_control])
+        draws = rng.integers(0, high, size=(size, n_case + n_control))
+        case, control = draws[:, :n_case], n_case + draws[:, n_case:]
+    else:
+        labels = rng.permuted(np.tile(np.arange(n_case + n_control), (size, 1)), axis=1)
+        case, control = labels[:, :n_case], labels[:, n_case:]
+
+    return case, control
+
+
+def resampled_statistics(
+    kernel: Callable[[np.ndarray, np.ndarray], np.ndarray],
+    case: np.ndarray,
+    control: np.ndarray,
+    options: StabilityOptions,
+    kernel_memory: float = 2.0,
+    row_independent: bool = True,
+) -> Iterator[np.ndarray]:
+    """Compute the statistic of every gene on many resamples, in batches.
+
+    Each batch of resamples is stacked into a single tall matrix, so the
+    kernel is called once per batch, not once per resample. Kernels whose
+    statistic of a gene depends on the other genes would see the genes of
+    all the resamples at once, so they are called once per resample.
+
+    Args:
+        kernel (Callable): Computes a statistic for every row of a case and
+            a control array, like `fold_change`.
+        case (np.ndarray): A (genes x case samples) array.
+        control (np.ndarray): A (genes x control samples) array.
+        options (StabilityOptions): How to resample.
+        kernel_memory (float): The memory the kernel uses, as a multiple of
+            the size of its input. See `RankingMethod.kernel_memory`.
+        row_independent (bool): Whether the statistic of each gene only
+            depends on the values of that gene. See
+            `RankingMethod.row_independent`.
+
+    Yields:
+        (genes x resamples in the batch) arrays of statistics.
+    """
+    rng = np.random.default_rng(options.seed)
+    values = np.concatenate([case, control], axis=1)
+    n_genes, n_samples = values.shape
+    n_case = case.shape[1]
+
+    # The resampled values, the temporary arrays of the kernel, and the
+    # per-gene statistics it computes along the way, in float64
+    per_resample = n_genes * (
+        n_samples * values.itemsize * (1 + kernel_memory) + ROW_OVERHEAD_BYTES
+    )
+    batch = int(max(1, min(options.resamples, options.max_batch_bytes // per_resample)))
+    if not row_independent:
+        batch = 1
+    log.debug(f"Resampling in batches of {batch}")
+
+    for start in range(0, options.resamples, batch):
+        size = min(batch, options.resamples - start)
+        case_idx, control_idx = _resample_indices(
+            rng, options.mode, n_case, n_samples - n_case, size
+        )
+        # (genes x size x samples), then one row per (gene, resample)
+        stats = kernel(
+            values[:, case_idx].reshape(n_genes * size, -1),
+            values[:, control_idx].reshape(n_genes * size, -1),
+        )
+        yield np.asarray(stats).reshape(n_genes, size)
+
+
+def rank_stability(
+    kernel: Callable[[np.ndarray, np.ndarray], np.ndarray],
+    dual_dataset: DualDataset,
+    options: StabilityOptions,
+    kernel_memory: float = 2.0,
+    row_independent: bool = True,
+) -> pd.DataFrame:
+    """Estimate how stable the rank of each gene is.
+
+    The genes are ranked again on each resample of the samples. For each
+    gene, this gives the interval of ranks it falls in (with the given
+    confidence), and a stability score: one minus the width of the interval
+    relative to the number of genes. A gene with the same rank in every
+    resample has a score of 1.
+
+    With bootstrap resamples, the interval shows how much the rank depends
+    on the particular samples in the cohort. With label permutations, it
+    shows the ranks the gene gets when the labels carry no information: the
+    columns are then prefixed with "null_", and the score is replaced by the
+    "null_spread", the width of the interval relative to the number of genes
+    (so one minus the score). It is not a measure of stability, but of how
+    far from its null ranks the observed rank is allowed to be by chance.
+
+    Args:
+        kernel (Callable): Computes a statistic for every row of a case and
+            a control array, like `fold_change`. Higher is ranked first.
+        dual_dataset (DualDataset): The data to rank.
+        options (StabilityOptions): How to resample.
+        kernel_memory (float): The memory the kernel uses, as a multiple of
+            the size of its input. See `RankingMethod.kernel_memory`.
+        row_independent (bool): Whether the statistic of each gene only
+            depends on the values of that gene. If not, the resamples are
+            computed one at a time.
+
+    Returns:
+        A pd.DataFrame with the ID column and the `stability_columns` of the
+        mode.
+    """
+    case, control = dual_dataset.case_values, dual_dataset.control_values
+    n_genes = case.shape[0]
+    observed = rank_genes(np.asarray(kernel(case, control))[:, None])[:, 0]
+
+    # Only the ranks are kept, as int32, to bound the memory used
+    ranks = np.concatenate(
+        [
+            rank_genes(stats)
+            for stats in resampled_statistics(
+                kernel, case, control, options, kernel_memory, row_independent
+            )
+        ],
+        axis=1,
+    )
+
+    # np.quantile copies its input, so it runs on blocks of genes
+    tail = (1 - options.confidence) / 2
+    quantiles = np.empty((3, n_genes))
+    block = max(1, options.max_batch_bytes // max(ranks.shape[1] * 8, 1))
+    for start in range(0, n_genes, block):
+        rows = slice(start, start + block)
+        quantiles[:, rows] = np.quantile(ranks[rows], [tail, 0.5, 1 - tail], axis=1)
+    low, median, high = quantiles
+    spread = (high - low) / max(n_genes - 1, 1)
+
+    names = stability_columns(options.mode)
+    scores = spread if options.mode == "permutation" else 1 - spread
+
+    return pd.DataFrame(
+        {
+            dual_dataset.on: dual_dataset.ids,
+            **dict(zip(names, (observed, low, high, median, scores))),
+        }
+    )
@@ -0,0 +1,89 @@
+"""
+Vectorized per-gene summary statistics.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass
+class SufficientStats:
+    """Per-row sufficient statistics of a (genes x samples) matrix.
+
+    To avoid catastrophic cancellation when computing the variance, the sums
+    are not of the raw values but of the values minus a per-row `shift` (the
+    first value of each row). Constant rows therefore have exactly zero
+    variance.
+    """
+
+    n: np.ndarray
+    """The number of values in each row"""
+    shift: np.ndarray
+    """The value subtracted from each row before summing"""
+    sum: np.ndarray
+    """The sum of the shifted values of each row"""
+    sum_sq: np.ndarray
+    """The sum of the squares of the shifted values of each row"""
+
+    @classmethod
+    def from_array(cls, values: np.ndarray) -> "SufficientStats":
+        """Compute the statistics of each row of a 2D array in one pass.
+
+        Float32 values are centered in float32, so the array is never copied
+        to float64, but the sums are always accumulated in float64.
+        """
+        values = np.asarray(values)
+        if not np.issubdtype(values.dtype, np.floating):
+            values = values.astype(np.float64)
+        n_rows, n_cols = values.shape
+
+        if n_cols == 0:
+            zeros = np.zeros(n_rows, dtype=np.float64)
+            return cls(np.zeros(n_rows, dtype=np.int64), zeros, zeros, zeros.copy())
+
+        centered = values - values[:, :1]
+        shift = values[:, 0].astype(np.float64)
+
+        return cls(
+            n=np.full(n_rows, n_cols, dtype=np.int64),
+            shift=shift,
+            sum=np.sum(centered, axis=1, dtype=np.float64),
+            sum_sq=np.einsum("ij,ij->i", centered, centered, dtype=np.float64),
+        )
+
+    def merge(self, other: "SufficientStats") -> "SufficientStats":
+        """Combine the statistics of two sets of columns of the same rows.
+
+        The result is the same as computing the statistics of the two
+        matrices side by side, but only needs their statistics. It keeps the
+        shift of `self`.
+        """
+        # Re-center the sums of `other` on the shift of `self`
+        delta = other.shift - self.shift
+        other_sum = other.sum + other.n * delta
+        other_sum_sq = other.sum_sq + 2 * delta * other.sum + other.n * delta**2
+
+        return SufficientStats(
+            n=self.n + other.n,
+            shift=self.shift.copy(),
+            sum=self.sum + other_sum,
+            sum_sq=self.sum_sq + other_sum_sq,
+        )
+
+    @property
+    def mean(self) -> np.ndarray:
+        """The mean of each row"""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return self.shift + self.sum / self.n
+
+    def var(self, ddof: int = 1) -> np.ndarray:
+        """The variance of each row, with `ddof` delta degrees of freedom"""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            squares = self.sum_sq - self.sum**2 / self.n
+            # Rounding can make these very slightly negative
+            return np.maximum(squares, 0) / (self.n - ddof)
+
+    def std(self, ddof: int = 1) -> np.ndarray:
+        """The standard deviation of each row, with `ddof` delta degrees of freedom"""
+        return np.sqrt(self.var(ddof))
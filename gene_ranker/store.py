@@ -0,0 +1,200 @@
+"""
+Keep the sufficient statistics of a growing cohort on disk, to rank it again
+as new samples arrive without reading the old ones.
+"""
+
+import logging
+import os
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from gene_ranker.dual_dataset import DualDataset
+from gene_ranker.methods.cohen import cohen_d_from_stats
+from gene_ranker.methods.fold_change import fold_change_from_stats
+from gene_ranker.methods.moderated_t import moderated_t_from_stats
+from gene_ranker.methods.signal_to_noise import signal_to_noise_from_stats
+from gene_ranker.methods.welch import welch_t_from_stats
+from gene_ranker.stats import SufficientStats
+
+log = logging.getLogger(__name__)
+
+STATS_METHODS: dict[str, Callable[[SufficientStats, SufficientStats], np.ndarray]] = {
+    "fold_change": fold_change_from_stats,
+    "s2n_ratio": signal_to_noise_from_stats,
+    "cohen_d": cohen_d_from_stats,
+    "welch_t": welch_t_from_stats,
+    "moderated_t": moderated_t_from_stats,
+}
+"""The methods that can be computed from the sufficient statistics alone,
+keyed like in `RANKING_METHODS`."""
+
+_FIELDS = ("n", "shift", "sum", "sum_sq")
+
+
+@dataclass
+class StatsStore:
+    """The per-gene sufficient statistics of the case and control samples.
+
+    Only the statistics are kept, not the values, so the store is small
+    (a few numbers per gene) and new samples can be added to it in a time
+    proportional to the number of new samples.
+    """
+
+    ids: np.ndarray
+    """The IDs of the genes, sorted."""
+    case: SufficientStats
+    """The statistics of the case samples."""
+    control: SufficientStats
+    """The statistics of the control samples."""
+    case_samples: list[str] = field(default_factory=list)
+    """The names of the case samples in the store."""
+    control_samples: list[str] = field(default_factory=list)
+    """The names of the control samples in the store."""
+    on: str = "gene_id"
+    """The name of the ID column."""
+
+    @classmethod
+    def from_dual_dataset(cls, dual_dataset: DualDataset) -> "StatsStore":
+        """Make a new store with the statistics of a DualDataset."""
+        return cls(
+            ids=np.asarray(dual_dataset.ids),
+            case=SufficientStats.from_array(dual_dataset.case_values),
+            control=SufficientStats.from_array(dual_dataset.control_values),
+            case_samples=dual_dataset.case_samples,
+            control_samples=dual_dataset.control_samples,
+            on=dual_dataset.on,
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "StatsStore":
+        """Read a store saved with `save`."""
+        with np.load(path) as stored:
+            return cls(
+                ids=stored["ids"],
+                case=SufficientStats(*(stored[f"case_{x}"] for x in _FIELDS)),
+                control=SufficientStats(*(stored[f"control_{x}"] for x in _FIELDS)),
+                case_samples=stored["case_samples"].tolist(),
+                control_samples=stored["control_samples"].tolist(),
+                on=str(stored["on"]),
+            )
+
+    def save(self, path: Path):
+        """Save the store to a `.npz` file, replacing it atomically."""
+        path = Path(path)
+        arrays = {
+            f"{side}_{x}": getattr(stats, x)
+            for side, stats in (("case", self.case), ("control", self.control))
+            for x in _FIELDS
+        }
+        ids = self.ids.astype(str) if self.ids.dtype == object else self.ids
+
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".npz.tmp")
+        try:
+            with os.fdopen(fd, "wb") as stream:
+                np.savez(
+                    stream,
+                    ids=ids,
+                    case_samples=np.array(self.case_samples, dtype=str),
+                    control_samples=np.array(self.control_samples, dtype=str),
+                    on=np.array(self.on),
+                    **arrays,
+                )
+            os.replace(tmp, path)
+        finally:
+            Path(tmp).unlink(missing_ok=True)
+
+    def _stats_of(self, data: pd.DataFrame) -> tuple[list[str], SufficientStats]:
+        """Compute the statistics of new samples, aligned to the store's genes.
+
+        Raise:
+            ValueError: If some genes in the store are not in `data`, some
+                genes are in it more than once, or some samples are already
+                in the store.
+        """
+        if self.on not in data.columns:
+            raise ValueError(f"Shared column '{self.on}' not in the new samples.")
+        samples = [x for x in data.columns if x != self.on]
+        known = set(self.case_samples) | set(self.control_samples)
+        if repeated := [x for x in samples if x in known]:
+            raise ValueError(f"Samples {repeated} are already in the store.")
+
+        # IDs are compared as strings, like when reading matrices, so that
+        # numeric IDs match whatever type they were read as
+        ids = pd.Index(data[self.on].astype(str))
+        if not ids.is_unique:
+            duplicated = ids[ids.duplicated()].unique()
+            raise ValueError(
+                f"{len(duplicated)} genes appear more than once in the new "
+                f"samples, like '{duplicated[0]}'."
+            )
+        rows = ids.get_indexer(self.ids.astype(str))
+        if (rows == -1).any():
+            missing = self.ids[rows == -1]
+            raise ValueError(
+                f"{len(missing)} genes in the store are not in the new samples, "
+                f"like '{missing[0]}'."
+            )
+        if len(data) > len(self.ids):
+            log.warning(
+                f"Ignoring {len(data) - len(self.ids)} genes that are not in the store."
+            )
+
+        values = data[samples].to_numpy(dtype=float)[rows]
+
+        return samples, SufficientStats.from_array(values)
+
+    def update(
+        self,
+        case: Optional[pd.DataFrame] = None,
+        control: Optional[pd.DataFrame] = None,
+    ):
+        """Add new case and/or control samples to the store, in place.
+
+        Only the new samples are read, so this takes a time proportional to
+        their number. Genes that are not already in the store are ignored.
+
+        Args:
+            case (pd.DataFrame or None): New case samples, with the ID column.
+            control (pd.DataFrame or None): New control samples, with the ID
+                column.
+
+        Raise:
+            ValueError: If the new samples do not have all the genes in the
+                store (once), or are already in the store.
+        """
+        # Compute both before changing anything, so errors leave the store as is
+        new_case = self._stats_of(case) if case is not None else None
+        new_control = self._stats_of(control) if control is not None else None
+
+        if new_case:
+            self.case_samples += new_case[0]
+            self.case = self.case.merge(new_case[1])
+        if new_control:
+            self.control_samples += new_control[0]
+            self.control = self.control.merge(new_control[1])
+
+    def rank(self, methods: list[str]) -> pd.DataFrame:
+        """Rank the genes with some of the `STATS_METHODS`.
+
+        Returns:
+            A pd.DataFrame with the ID column and one ranking column per method.
+
+        Raise:
+            ValueError: If a method cannot be computed from the statistics.
+        """
+        if unknown := [x for x in methods if x not in STATS_METHODS]:
+            raise ValueError(
+                f"Methods {unknown} cannot be computed from the stored statistics. "
+                f"Use one of {list(STATS_METHODS)}."
+            )
+
+        result = pd.DataFrame({self.on: self.ids})
+        for key in methods:
+            result[key] = STATS_METHODS[key](self.case, self.control)
+
+        return result
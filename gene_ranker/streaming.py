@@ -0,0 +1,187 @@
+"""
+Rank matrices that do not fit in memory, a chunk of genes at a time.
+"""
+
+import logging
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Iterator, Optional, TextIO, Union
+
+import pandas as pd
+
+from gene_ranker.dual_dataset import DualDataset
+from gene_ranker.filtering import GeneFilter
+from gene_ranker.methods.base import RankingMethod
+from gene_ranker.parallel import make_executor
+from gene_ranker.ranker import rank_dual_dataset
+from gene_ranker.readers import read_matrix_chunks
+from gene_ranker.writers import ResultWriter
+
+log = logging.getLogger(__name__)
+
+PENDING_WARNING_FACTOR = 10
+"""Warn when this many chunks' worth of genes are waiting to be aligned."""
+
+
+def check_streamable(methods: dict[str, RankingMethod]):
+    """Fail if any of the methods cannot be run on chunks of genes.
+
+    Raises:
+        ValueError: If a method is not row-independent, or needs normalized
+            data (the normalization needs all genes at once).
+    """
+    for key, method in methods.items():
+        if method.normalized:
+            raise ValueError(
+                f"Method '{key}' needs normalized data, which needs all genes "
+                "at once. It cannot be run in chunks."
+            )
+        if not method.row_independent:
+            raise ValueError(
+                f"Method '{key}' is not row-independent. It cannot be run in chunks."
+            )
+
+
+def align_chunks(
+    case_chunks: Iterator[pd.DataFrame],
+    control_chunks: Iterator[pd.DataFrame],
+    on: str = "gene_id",
+    chunk_size: Optional[int] = None,
+) -> Iterator[tuple[pd.DataFrame, pd.DataFrame]]:
+    """Pair up the rows of two streams of chunks by their IDs.
+
+    Rows are yielded as soon as their ID has been seen in both streams, so if
+    the two files list the genes in the same order only about one chunk of
+    each is held in memory. Rows with IDs in only one of the two streams are
+    dropped, like in an inner merge.
+
+    Args:
+        case_chunks (Iterator[pd.DataFrame]): The chunks of the case matrix.
+        control_chunks (Iterator[pd.DataFrame]): The chunks of the control matrix.
+        on (str): The name of the ID column.
+        chunk_size (Optional[int]): The size of the chunks, only used to warn
+            if too many rows are waiting for a match.
+
+    Yields:
+        (case, control) tuples of chunks with the same IDs, in the same order.
+    """
+    pending_case: Optional[pd.DataFrame] = None
+    pending_control: Optional[pd.DataFrame] = None
+    case_chunks, control_chunks = iter(case_chunks), iter(control_chunks)
+    warned = False
+
+    while True:
+        case_chunk = next(case_chunks, None)
+        control_chunk = next(control_chunks, None)
+        if case_chunk is None and control_chunk is None:
+            break
+
+        if case_chunk is not None:
+            case_chunk = case_chunk.set_index(on)
+            pending_case = pd.concat([pending_case, case_chunk])
+        if control_chunk is not None:
+            control_chunk = control_chunk.set_index(on)
+            pending_control = pd.concat([pending_control, control_chunk])
+
+        if pending_case is None or pending_control is None:
+            continue
+
+        matched = pending_case.index.isin(pending_control.index)
+        if matched.any():
+            ids = pending_case.index[matched]
+            yield (
+                pending_case.loc[ids].reset_index(),
+                pending_control.loc[ids].reset_index(),
+            )
+            pending_case = pending_case[~matched]
+            pending_control = pending_control[~pending_control.index.isin(ids)]
+
+        waiting = max(len(pending_case), len(pending_control))
+        if chunk_size and not warned and waiting > chunk_size * PENDING_WARNING_FACTOR:
+            log.warning(
+                f"{waiting} genes are waiting to be matched between case and "
+                "control. Are the two files sorted in the same gene order? "
+                "Memory use is no longer bounded by the chunk size."
+            )
+            warned = True
+
+
+def stream_methods(
+    case_matrix: Path,
+    control_matrix: Path,
+    methods: dict[str, RankingMethod],
+    out_stream: Union[TextIO, ResultWriter],
+    chunk_size: int,
+    shared_col: str = "gene_id",
+    extra_args: Optional[dict[str, dict]] = None,
+    jobs: int = 1,
+    gene_filter: Optional[GeneFilter] = None,
+    precision: str = "float64",
+) -> int:
+    """Rank two matrices a chunk of genes at a time.
+
+    Each chunk is ranked and written to `out_stream` before the next one is
+    read, so the memory used depends on the chunk size, not on the size of
+    the matrices. Rows in the output are in the order they are read in from
+    the case matrix, sorted by ID only within each chunk.
+
+    Args:
+        case_matrix (Path): Path to the case matrix to be read. In any format
+            supported by `read_matrix_chunks`.
+        control_matrix (Path): Same as above, with the control matrix.
+        methods (dict[str, RankingMethod]): The methods to run. They must be
+            row-independent, and not need normalized data.
+        out_stream (TextIO or ResultWriter): Where to write the results to.
+            Text streams are written to as csv. With a ResultWriter, any
+            format can be used; if it sorts its output, only the rankings
+            (not the input) are kept in memory until it is closed.
+        chunk_size (int): The number of genes to read from each file at a time.
+        shared_col (str): The name of the ID column.
+        extra_args (dict[str, dict] or None): Extra arguments to pass to each
+            method, keyed by the same keys as `methods`.
+        jobs (int): The number of processes to use to rank each chunk.
+        gene_filter (GeneFilter or None): Which genes to rank. Since all of
+            its criteria look at one gene at a time, each chunk is filtered
+            on its own.
+        precision (str): The type to rank the values as, either "float64"
+            or "float32".
+
+    Returns:
+        The number of ranked genes.
+    """
+    check_streamable(methods)
+
+    chunks = align_chunks(
+        read_matrix_chunks(case_matrix, chunk_size, shared_col),
+        read_matrix_chunks(control_matrix, chunk_size, shared_col),
+        on=shared_col,
+        chunk_size=chunk_size,
+    )
+
+    if not isinstance(out_stream, ResultWriter):
+        out_stream = ResultWriter(out_stream, "csv", on=shared_col)
+
+    written = 0
+    with make_executor(jobs) if jobs > 1 else nullcontext() as executor:
+        for case, control in chunks:
+            dual_dataset = DualDataset(
+                case=case, control=control, on=shared_col, dtype=precision
+            )
+            if gene_filter:
+                dual_dataset = gene_filter.apply(dual_dataset)
+                if len(dual_dataset.ids) == 0:
+                    continue
+            result = rank_dual_dataset(
+                dual_dataset,
+                methods,
+                extra_args,
+                jobs=jobs,
+                executor=executor,
+            )
+            out_stream.write(result)
+            written += len(result)
+            log.debug(f"Ranked {written} genes so far")
+
+    log.info(f"Ranked {written} genes")
+
+    return written
@@ -0,0 +1,83 @@
+"""
+Generate synthetic expression matrices, for testing and benchmarking.
+"""
+
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+
+def synthetic_counts(
+    n_genes: int,
+    n_samples: int,
+    sparsity: float = 0.0,
+    ties: float = 0.0,
+    dispersion: float = 0.2,
+    rng: Optional[np.random.Generator] = None,
+) -> np.ndarray:
+    """Generate a (genes x samples) matrix of RNA-seq-like integer counts.
+
+    Counts are drawn from negative binomial distributions, with log-normally
+    distributed gene means.
+
+    Args:
+        n_genes (int): The number of genes (rows).
+        n_samples (int): The number of samples (columns).
+        sparsity (float): The fraction of counts that are set to zero.
+        ties (float): The fraction of genes that only take a few distinct
+            values, so that most of their counts are tied.
+        dispersion (float): The dispersion of the negative binomial distributions.
+        rng (np.random.Generator or None): The random generator to use.
+    """
+    rng = rng or np.random.default_rng()
+
+    means = rng.lognormal(mean=4, sigma=2, size=(n_genes, 1))
+    # numpy's negative binomial is parametrized with n and p
+    n = 1 / dispersion
+    counts = rng.negative_binomial(n, n / (n + means), size=(n_genes, n_samples))
+
+    if ties > 0:
+        tied = rng.random(n_genes) < ties
+        levels = rng.integers(0, 4, size=(int(tied.sum()), n_samples))
+        counts[tied] = levels
+
+    if sparsity > 0:
+        counts[rng.random((n_genes, n_samples)) < sparsity] = 0
+
+    return counts
+
+
+def synthetic_dual_matrices(
+    n_genes: int,
+    n_case: int,
+    n_control: int,
+    sparsity: float = 0.0,
+    ties: float = 0.0,
+    seed: Optional[int] = None,
+    id_col: str = "gene_id",
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Generate a pair of log2(count + 1) case and control matrices.
+
+    The matrices have an ID column with names like `gene_1` and samples named
+    `case_1`, `control_1`, etc., so they can be used to make a DualDataset.
+    See `synthetic_counts` for the meaning of the other arguments.
+
+    Returns:
+        A (case, control) tuple of pd.DataFrames.
+    """
+    rng = np.random.default_rng(seed)
+    counts = synthetic_counts(n_genes, n_case + n_control, sparsity, ties, rng=rng)
+    values = np.log2(counts + 1)
+    ids = [f"gene_{i + 1}" for i in range(n_genes)]
+
+    def make_frame(block: np.ndarray, prefix: str) -> pd.DataFrame:
+        frame = pd.DataFrame(
+            block, columns=[f"{prefix}_{i + 1}" for i in range(block.shape[1])]
+        )
+        frame.insert(0, id_col, ids)
+        return frame
+
+    return make_frame(values[:, :n_case], "case"), make_frame(
+        values[:, n_case:], "control"
+    )
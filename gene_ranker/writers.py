@@ -0,0 +1,270 @@
+"""
+Write rankings to disk, in various formats.
+"""
+
+import gzip
+import io
+import logging
+import sys
+from pathlib import Path
+from typing import Optional, TextIO, Union
+
+import numpy as np
+import pandas as pd
+
+from gene_ranker.methods.base import MissingExternalDependency
+from gene_ranker.readers import _format_suffix, _import_pyarrow
+
+log = logging.getLogger(__name__)
+
+OUTPUT_FORMATS = ("csv", "tsv", "rnk", "parquet")
+"""The formats that rankings can be written in."""
+
+FORMAT_SUFFIXES = {
+    ".csv": "csv",
+    ".tsv": "tsv",
+    ".tab": "tsv",
+    ".txt": "tsv",
+    ".rnk": "rnk",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+}
+
+ROWS_PER_BLOCK = 10_000
+"""How many rows to format as text at a time."""
+
+
+def infer_format(path: Optional[Path]) -> str:
+    """Guess the output format from the extension of `path`.
+
+    Compression suffixes are skipped, so "ranks.rnk.gz" gives "rnk".
+    Defaults to "csv", which is also used when writing to stdout.
+    """
+    if path is None:
+        return "csv"
+
+    return FORMAT_SUFFIXES.get(_format_suffix(Path(path)), "csv")
+
+
+def sort_order(values: np.ndarray) -> np.ndarray:
+    """Get the order that sorts `values` from the highest to the lowest.
+
+    NaNs are put last, and ties keep their original order.
+    """
+    return np.argsort(-np.asarray(values, dtype=float), kind="stable")
+
+
+def quote_field(field: str, sep: str) -> str:
+    """Quote a field like the `csv` module does, if it needs quoting.
+
+    Fields with the separator, a quote or a line break are quoted, and their
+    quotes are doubled.
+    """
+    if sep in field or '"' in field or "\n" in field or "\r" in field:
+        return '"' + field.replace('"', '""') + '"'
+    return field
+
+
+def _format_column(values: np.ndarray, sep: str) -> list[str]:
+    if values.dtype.kind == "f":
+        # This gives the shortest string that round-trips at the precision of
+        # the values, so float32 values are not written with float64 noise
+        text = values.astype(str).tolist()
+        for i in np.flatnonzero(np.isnan(values)).tolist():
+            text[i] = ""
+        return text
+    if values.dtype.kind in "iub":
+        return list(map(str, values.tolist()))
+
+    text = ["" if pd.isna(x) else str(x) for x in values.tolist()]
+    # Most columns need no quoting, so check all of them at once first
+    joined = "".join(text)
+    if sep in joined or '"' in joined or "\n" in joined or "\r" in joined:
+        text = [quote_field(x, sep) for x in text]
+    return text
+
+
+def format_rows(frame: pd.DataFrame, sep: str = ",") -> str:
+    """Format the rows of `frame` as delimited text, without a header.
+
+    This is faster than `DataFrame.to_csv`, since each column is formatted in
+    one go. Missing values are written as empty fields, and fields are quoted
+    with the rules of the `csv` module.
+    """
+    columns = [_format_column(frame[x].to_numpy(), sep) for x in frame.columns]
+    if not columns or not len(frame):
+        return ""
+
+    return "\n".join(map(sep.join, zip(*columns))) + "\n"
+
+
+def _open_text(path: Path) -> TextIO:
+    """Open a text file for writing, compressing it according to its suffix."""
+    suffix = path.suffix.lower()
+    if suffix == ".gz":
+        return gzip.open(path, "wt", newline="")
+    if suffix == ".zst":
+        try:
+            import zstandard
+        except ImportError:
+            raise MissingExternalDependency(
+                "Writing zstd-compressed files requires `zstandard`. "
+                "Install it with `pip install zstandard`."
+            )
+        binary = zstandard.ZstdCompressor().stream_writer(path.open("wb"))
+        return io.TextIOWrapper(binary, newline="")
+
+    return path.open("w+", newline="")
+
+
+class ResultWriter:
+    """Writes a ranking to a file, one block of genes at a time.
+
+    Use it as a context manager, and `write` each block of results to it.
+    If the output needs to be sorted, the blocks are kept until the writer
+    is closed, then sorted and written all at once. Otherwise, they are
+    written as they come.
+    """
+
+    def __init__(
+        self,
+        target: Union[Path, TextIO, None] = None,
+        format: Optional[str] = None,
+        sort_by: Optional[str] = None,
+        on: str = "gene_id",
+    ):
+        """Make a new ResultWriter
+
+        Args:
+            target (Path, TextIO or None): The file to write to. If None,
+                writes to stdout. Files ending in `.gz` or `.zst` are
+                compressed. Already open text streams are written to, but
+                not closed.
+            format (str or None): One of `OUTPUT_FORMATS`. If None, it is
+                guessed from the extension of `target`.
+                The `rnk` format (for GSEA) is a headerless tab-separated file
+                with the IDs and one ranking column, always sorted by it.
+            sort_by (str or None): Sort the rows by this column, from the
+                highest value to the lowest. If None, keep the input order.
+            on (str): The name of the ID column.
+
+        Raise:
+            ValueError: If the format is unknown, or cannot be written to
+                stdout.
+        """
+        self._stream: Optional[TextIO] = None
+        self.target: Optional[Path] = None
+        if target is None:
+            self._stream = sys.stdout
+        elif isinstance(target, (str, Path)):
+            self.target = Path(target)
+        else:
+            self._stream = target
+
+        self.format = format or infer_format(self.target)
+        if self.format not in OUTPUT_FORMATS:
+            raise ValueError(
+                f"Unknown output format '{self.format}'. "
+                f"Choose one of {', '.join(OUTPUT_FORMATS)}."
+            )
+        if self.format == "parquet" and self.target is None:
+            raise ValueError("Cannot write parquet to a text stream. Give a file.")
+
+        self.sort_by = sort_by
+        self.on = on
+        self.written = 0
+        self._pending: list[pd.DataFrame] = []
+        self._header_written = False
+        self._parquet = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def _sorted(self) -> bool:
+        return self.sort_by is not None or self.format == "rnk"
+
+    def write(self, result: pd.DataFrame):
+        """Write (or keep, if sorting) a block of results."""
+        if self._sorted:
+            self._pending.append(result)
+        else:
+            self._write(result)
+
+    def close(self):
+        """Write any kept results, and close the output file."""
+        if self._pending:
+            result = pd.concat(self._pending, ignore_index=True)
+            self._pending = []
+            self._write(self._sort(result))
+
+        if self._parquet is not None:
+            self._parquet.close()
+            self._parquet = None
+        if self.target is not None and self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+    def _sort(self, result: pd.DataFrame) -> pd.DataFrame:
+        if self.format == "rnk":
+            rankings = [x for x in result.columns if x != self.on]
+            if self.sort_by is None and len(rankings) != 1:
+                raise ValueError(
+                    "The rnk format has a single ranking column, but there are "
+                    f"{len(rankings)}. Choose one with `sort_by`."
+                )
+            column = self.sort_by or rankings[0]
+        else:
+            column = self.sort_by
+
+        if column not in result.columns:
+            raise ValueError(f"Cannot sort by '{column}': no such column.")
+        if self.format == "rnk":
+            result = result[[self.on, column]]
+
+        order = sort_order(result[column].to_numpy())
+        return result.take(order).reset_index(drop=True)
+
+    def _write(self, result: pd.DataFrame):
+        if self.format == "parquet":
+            self._write_parquet(result)
+        else:
+            self._write_text(result)
+        self.written += len(result)
+
+    def _write_text(self, result: pd.DataFrame):
+        sep = "," if self.format == "csv" else "\t"
+        if self._stream is None:
+            self._stream = _open_text(self.target)
+        if not self._header_written and self.format != "rnk":
+            header = [quote_field(str(x), sep) for x in result.columns]
+            self._stream.write(sep.join(header) + "\n")
+        self._header_written = True
+
+        for start in range(0, len(result), ROWS_PER_BLOCK):
+            block = result.iloc[start : start + ROWS_PER_BLOCK]
+            self._stream.write(format_rows(block, sep))
+
+    def _write_parquet(self, result: pd.DataFrame):
+        pyarrow = _import_pyarrow()
+        from pyarrow import parquet
+
+        table = pyarrow.Table.from_pandas(result, preserve_index=False)
+        if self._parquet is None:
+            self._parquet = parquet.ParquetWriter(self.target, table.schema)
+        self._parquet.write_table(table.cast(self._parquet.schema))
+
+
+def write_result(
+    result: pd.DataFrame,
+    target: Union[Path, TextIO, None] = None,
+    format: Optional[str] = None,
+    sort_by: Optional[str] = None,
+    on: str = "gene_id",
+) -> None:
+    """Write a whole ranking at once. See `ResultWriter` for the arguments."""
+    with ResultWriter(target, format, sort_by, on) as writer:
+        writer.write(result)
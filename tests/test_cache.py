@@ -0,0 +1,143 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+import pydeseq2.preprocessing
+from gene_ranker.cache import FitCache, NormalizationCache, hash_frame
+from gene_ranker.methods.base import MissingExternalDependency, norm_with_deseq
+
+
+@pytest.fixture
+def test_merged_data():
+    return pd.DataFrame(
+        {
+            "gene_id": ["gene_1", "gene_2", "gene_3"],
+            "sample_1": [2.5, 0.1, 6.0],
+            "sample_2": [1.0, 0.3, 3.2],
+            "sample_3": [1.2, 0.5, 5.01],
+            "sample_4": [6.5, 1.6, 0.2],
+        }
+    )
+
+
+def test_hash_frame_depends_on_content(test_merged_data):
+    changed = test_merged_data.copy()
+    changed.loc[0, "sample_1"] = 2.6
+
+    key = hash_frame(test_merged_data, "gene_id")
+    assert key == hash_frame(test_merged_data.copy(), "gene_id")
+    assert key != hash_frame(changed, "gene_id")
+    assert key != hash_frame(test_merged_data, "other_id")
+
+
+def test_cache_roundtrip(tmp_path):
+    cache = NormalizationCache(tmp_path)
+    data = pd.DataFrame(
+        {"a": [1.0, 2.0], "b": [3.0, 4.0]},
+        index=pd.Index(["gene_1", "gene_2"], name="gene_id"),
+    )
+    size_factors = pd.Series([0.5, 2.0], index=data.columns)
+
+    assert cache.get("key") is None
+    cache.put("key", data, size_factors)
+    cached_data, cached_factors = cache.get("key")
+
+    assert_frame_equal(cached_data, data)
+    pd.testing.assert_series_equal(cached_factors, size_factors)
+
+
+def test_cache_eviction(tmp_path):
+    data = pd.DataFrame({"a": np.zeros(100)})
+    size_factors = pd.Series([1.0], index=data.columns)
+
+    cache = NormalizationCache(tmp_path)
+    cache.put("old", data, size_factors)
+    entry_size = (tmp_path / "old.npz").stat().st_size
+    os.utime(tmp_path / "old.npz", (0, 0))
+
+    cache.max_size = entry_size * 1.5
+    cache.put("new", data, size_factors)
+
+    assert cache.get("old") is None
+    assert cache.get("new") is not None
+
+
+def test_norm_with_deseq_uses_cache(tmp_path, test_merged_data, monkeypatch):
+    cache = NormalizationCache(tmp_path)
+    expected = norm_with_deseq(test_merged_data, "gene_id", cache=cache)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Normalization should have been cached")
+
+    monkeypatch.setattr(pydeseq2.preprocessing, "deseq2_norm", fail)
+    cached = norm_with_deseq(test_merged_data, "gene_id", cache=cache)
+
+    assert_frame_equal(cached, expected)
+
+
+def test_fit_cache_round_trip(tmp_path):
+    genes = pd.DataFrame(
+        {"dispersions": [0.1, 0.2], "SE": [1.0, np.nan]},
+        index=pd.Index(["gene_1", "gene_2"], name="gene"),
+    )
+    size_factors = pd.Series([0.9, 1.1, 1.0], index=["s1", "s2", "s3"])
+
+    cache = FitCache(tmp_path)
+    assert cache.get("key") is None
+    cache.put("key", genes, size_factors)
+    cached_genes, cached_factors = cache.get("key")
+
+    assert_frame_equal(cached_genes, genes)
+    pd.testing.assert_series_equal(cached_factors, size_factors)
+
+
+def test_deseq_fit_is_cached(tmp_path, monkeypatch):
+    from gene_ranker.dual_dataset import DualDataset
+    from gene_ranker.methods import deseq_shrinkage
+    from gene_ranker.synthetic import synthetic_dual_matrices
+
+    case, control = synthetic_dual_matrices(200, 4, 4, seed=1)
+    dual_dataset = DualDataset(case, control)
+    expected = deseq_shrinkage.deseq_shrinkage_ranking(dual_dataset, fit_cache=tmp_path)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("The DESeq2 fit should have been cached")
+
+    monkeypatch.setattr(deseq_shrinkage, "fit_deseq", fail)
+    cached = deseq_shrinkage.deseq_shrinkage_ranking(dual_dataset, fit_cache=tmp_path)
+
+    assert_frame_equal(cached, expected)
+
+
+def test_deseq_fit_has_the_stored_internals():
+    # The fit cache reads and writes some internals of PyDESeq2. This fails
+    # if a new version of PyDESeq2 changes them.
+    from gene_ranker.dual_dataset import DualDataset
+    from gene_ranker.methods import deseq_shrinkage
+    from gene_ranker.synthetic import synthetic_dual_matrices
+
+    case, control = synthetic_dual_matrices(50, 3, 3, seed=2)
+    counts, metadata = deseq_shrinkage._counts_and_metadata(DualDataset(case, control))
+    stats = deseq_shrinkage.fit_deseq(counts, metadata, n_cpus=1)
+
+    deseq_shrinkage.check_fit(stats)
+
+    del stats.dds.var["_normed_means"]
+    with pytest.raises(MissingExternalDependency):
+        deseq_shrinkage.check_fit(stats)
+
+
+def test_corrupt_cache_entries_are_dropped(tmp_path):
+    data = pd.DataFrame({"a": np.zeros(100)})
+    size_factors = pd.Series([1.0], index=data.columns)
+
+    cache = NormalizationCache(tmp_path)
+    cache.put("key", data, size_factors)
+    path = tmp_path / "key.npz"
+    path.write_bytes(path.read_bytes()[: path.stat().st_size // 2])
+
+    assert cache.get("key") is None
+    assert not path.exists()
@@ -0,0 +1,134 @@
+import json
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+from gene_ranker.bin import batch_bin
+from gene_ranker.contrasts import read_contrasts
+from gene_ranker.dual_dataset import DualDataset
+
+matrix_data = """\
+gene_id,sample_1,sample_2,sample_3,sample_4,sample_5,sample_6
+gene_3,6.0,3.2,5.01,0.0,0.15,0.26
+gene_1,2.5,1.0,1.2,6.5,4.0,2.2
+gene_2,0.1,0,0.5,1.6,0.1,0.1
+"""
+
+
+@pytest.fixture
+def matrix_path(tmp_path: Path):
+    target = tmp_path / "matrix.csv"
+    target.write_text(matrix_data)
+    return target
+
+
+@pytest.fixture
+def contrasts_path(tmp_path: Path):
+    target = tmp_path / "contrasts.json"
+    contrasts = {
+        "first": {
+            "case": ["sample_1", "sample_2", "sample_3"],
+            "control": ["sample_4", "sample_5", "sample_6"],
+        },
+        "second": {"case": ["sample_4", "sample_5"], "control": ["sample_1"]},
+    }
+    target.write_text(json.dumps(contrasts))
+    return target
+
+
+def test_read_contrasts(contrasts_path):
+    contrasts = read_contrasts(contrasts_path)
+
+    assert [x.name for x in contrasts] == ["first", "second"]
+    assert contrasts[1].case == ["sample_4", "sample_5"]
+    assert contrasts[1].control == ["sample_1"]
+
+
+def test_read_contrasts_invalid(tmp_path):
+    target = tmp_path / "contrasts.json"
+    target.write_text(json.dumps({"first": {"case": ["sample_1"]}}))
+
+    with pytest.raises(ValueError):
+        read_contrasts(target)
+
+
+@pytest.mark.parametrize("name", ["../escape", "a/b", "..", "", "a\\b"])
+def test_read_contrasts_rejects_unsafe_names(tmp_path, name):
+    target = tmp_path / "contrasts.json"
+    target.write_text(json.dumps({name: {"case": ["s1"], "control": ["s2"]}}))
+
+    with pytest.raises(ValueError):
+        read_contrasts(target)
+
+
+def test_dual_dataset_from_matrix(matrix_path):
+    data = pd.read_csv(matrix_path)
+    case = data[["gene_id", "sample_1", "sample_2", "sample_3"]]
+    control = data[["gene_id", "sample_4", "sample_5", "sample_6"]]
+
+    expected = DualDataset(case=case, control=control)
+    dual_data = DualDataset.from_matrix(
+        data, ["sample_1", "sample_2", "sample_3"], ["sample_4", "sample_5", "sample_6"]
+    )
+
+    assert_frame_equal(dual_data.merged, expected.merged)
+    assert_frame_equal(dual_data.case, expected.case.reset_index(drop=True))
+    assert_frame_equal(dual_data.control, expected.control.reset_index(drop=True))
+
+
+def test_batch_bin(tmp_path, matrix_path, contrasts_path):
+    target = tmp_path / "output.csv"
+    batch_bin(
+        [
+            str(matrix_path),
+            str(contrasts_path),
+            "--methods",
+            "fold_change",
+            "--output-file",
+            str(target),
+        ]
+    )
+
+    output = pd.read_csv(target)
+
+    assert output.columns.tolist() == ["contrast", "gene_id", "fold_change"]
+    first = output[output["contrast"] == "first"]
+    assert first["fold_change"].tolist() == pytest.approx([-2.6666666, -0.4, 4.6])
+    second = output[output["contrast"] == "second"]
+    assert second["fold_change"].tolist() == pytest.approx([2.75, 0.75, -5.925])
+
+
+def test_batch_bin_output_dir(tmp_path, matrix_path, contrasts_path):
+    batch_bin(
+        [
+            str(matrix_path),
+            str(contrasts_path),
+            "--methods",
+            "fold_change",
+            "--output-dir",
+            str(tmp_path / "out"),
+        ]
+    )
+
+    assert (tmp_path / "out" / "first.csv").exists()
+    assert (tmp_path / "out" / "second.csv").exists()
+
+
+def test_batch_bin_sort_by(tmp_path, matrix_path, contrasts_path):
+    batch_bin(
+        [
+            str(matrix_path),
+            str(contrasts_path),
+            "--methods",
+            "fold_change",
+            "--output-dir",
+            str(tmp_path / "out"),
+            "--sort-by",
+            "fold_change",
+        ]
+    )
+
+    output = pd.read_csv(tmp_path / "out" / "first.csv")
+    assert output["gene_id"].tolist() == ["gene_3", "gene_2", "gene_1"]
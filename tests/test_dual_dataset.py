@@ -1,5 +1,6 @@
 ## Testing
 # Just a sprinkle of tests
+import numpy as np
 import pytest
 import pandas as pd
 from gene_ranker.dual_dataset import DualDataset
@@ -109,3 +110,46 @@ def test_dual_dataset_detangle(test_case_data, test_control_data):
     assert dual_data.case.equals(test_case_data)
     assert dual_data.control.equals(test_control_data)
 
+
+def test_dual_dataset_values_are_aligned_views():
+    case = pd.DataFrame(
+        {"gene_id": ["gene_3", "gene_1", "gene_2"], "sample_1": [3.0, 1.0, 2.0]}
+    )
+    control = pd.DataFrame(
+        {"gene_id": ["gene_2", "gene_4", "gene_3"], "sample_2": [20.0, 40.0, 30.0]}
+    )
+    dual_data = DualDataset(case=case, control=control)
+
+    assert dual_data.ids.tolist() == ["gene_2", "gene_3"]
+    assert dual_data.case_values.tolist() == [[2.0], [3.0]]
+    assert dual_data.control_values.tolist() == [[20.0], [30.0]]
+    assert dual_data.case_values.flags.c_contiguous
+    first_access = dual_data.case_values
+    assert np.shares_memory(first_access, dual_data.case_values)
+    assert not dual_data.case_values.flags.writeable
+
+
+def test_dual_dataset_rejects_duplicate_ids(test_control_data):
+    case = pd.DataFrame({"gene_id": ["gene_1", "gene_1"], "sample_1": [1.0, 2.0]})
+
+    with pytest.raises(ValueError):
+        DualDataset(case=case, control=test_control_data)
+
+
+def test_dual_dataset_from_arrays_does_not_copy():
+    ids = np.array(["gene_1", "gene_2"], dtype=object)
+    case = np.array([[1.0, 2.0], [3.0, 4.0]])
+    control = np.array([[5.0], [6.0]])
+
+    dual_data = DualDataset.from_arrays(
+        ids, case, control, ["sample_1", "sample_2"], ["sample_3"]
+    )
+
+    assert np.shares_memory(dual_data.case_values, case)
+    assert np.shares_memory(dual_data.control_values, control)
+    assert dual_data.merged.columns.tolist() == [
+        "gene_id",
+        "sample_1",
+        "sample_2",
+        "sample_3",
+    ]
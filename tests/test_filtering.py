@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from gene_ranker.dual_dataset import DualDataset
+from gene_ranker.filtering import GeneFilter, read_gene_list
+from gene_ranker.methods import RANKING_METHODS
+from gene_ranker.ranker import rank_dual_dataset
+
+
+@pytest.fixture
+def dual_dataset():
+    case = pd.DataFrame(
+        {
+            "gene_id": ["gene_1", "gene_2", "gene_3", "gene_4"],
+            "sample_1": [2.5, 0.0, 6.0, 1.0],
+            "sample_2": [1.0, 0.0, 3.2, 0.0],
+        }
+    )
+    control = pd.DataFrame(
+        {
+            "gene_id": ["gene_1", "gene_2", "gene_3", "gene_4"],
+            "sample_3": [6.5, 0.0, 0.0, 0.0],
+            "sample_4": [4.0, 0.3, 0.15, 0.0],
+        }
+    )
+    return DualDataset(case, control)
+
+
+def test_read_gene_list(tmp_path):
+    path = tmp_path / "genes.txt"
+    path.write_text("# a comment\ngene_1\n\ngene_2\textra\ngene_3,extra\n")
+
+    assert read_gene_list(path) == {"gene_1", "gene_2", "gene_3"}
+
+
+def test_expression_filters(dual_dataset):
+    assert (
+        GeneFilter()
+        .mask(dual_dataset.ids, dual_dataset.case_values, dual_dataset.control_values)
+        .all()
+    )
+
+    filtered = GeneFilter(min_mean=1).apply(dual_dataset)
+    assert filtered.ids.tolist() == ["gene_1", "gene_3"]
+
+    filtered = GeneFilter(min_samples_expressed=2).apply(dual_dataset)
+    assert filtered.ids.tolist() == ["gene_1", "gene_3"]
+
+    filtered = GeneFilter(min_samples_expressed=1, expression_threshold=0.5).apply(
+        dual_dataset
+    )
+    assert filtered.ids.tolist() == ["gene_1", "gene_3", "gene_4"]
+
+
+def test_id_filters(dual_dataset):
+    filtered = GeneFilter(allow={"gene_2", "gene_3", "other"}, deny={"gene_3"}).apply(
+        dual_dataset
+    )
+
+    assert filtered.ids.tolist() == ["gene_2"]
+    np.testing.assert_array_equal(filtered.case_values, [[0.0, 0.0]])
+    np.testing.assert_array_equal(filtered.control_values, [[0.0, 0.3]])
+
+
+def test_numeric_ids_match_as_strings():
+    case = pd.DataFrame({"gene_id": [1, 2], "a": [1.0, 2.0]})
+    control = pd.DataFrame({"gene_id": [1, 2], "b": [1.0, 2.0]})
+
+    filtered = GeneFilter(allow={"2"}).apply(DualDataset(case, control))
+
+    assert filtered.ids.tolist() == [2]
+
+
+def test_filter_before_ranking(dual_dataset):
+    result = rank_dual_dataset(
+        dual_dataset,
+        {"fold_change": RANKING_METHODS["fold_change"]},
+        gene_filter=GeneFilter(deny={"gene_1"}),
+    )
+
+    assert result["gene_id"].tolist() == ["gene_2", "gene_3", "gene_4"]
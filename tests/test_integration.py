@@ -1,3 +1,4 @@
+import json
 from io import StringIO
 from pathlib import Path
 
@@ -119,3 +120,183 @@ def test_integration_deseq(tmp_path, case_data_path, control_data_path):
         output = stream.read()
 
     compare_csvs(output, expected_deseq_shrink)
+
+
+def test_integration_multiple_methods(tmp_path, case_data_path, control_data_path):
+    target = tmp_path / "output.csv"
+    args = [
+        case_data_path,
+        control_data_path,
+        "--output-file",
+        target,
+        "--methods",
+        "fold_change",
+        "bws_test",
+    ]
+    args = [str(x) for x in args]
+
+    bin(args)
+
+    output = pd.read_csv(target)
+    fold_change = pd.read_csv(StringIO(expected_fold_change))
+    bws = pd.read_csv(StringIO(expected_bws_test))
+
+    assert output.columns.tolist() == ["gene_id", "fold_change", "bws_test"]
+    pd.testing.assert_series_equal(
+        output["fold_change"], fold_change["ranking"], check_names=False
+    )
+    pd.testing.assert_series_equal(
+        output["bws_test"], bws["ranking"], check_names=False, atol=1e-5
+    )
+
+
+def test_integration_multiple_methods_normalize_once(
+    tmp_path, case_data_path, control_data_path, monkeypatch
+):
+    import gene_ranker.methods.base as base
+
+    calls = []
+    original = base.norm_with_deseq
+
+    def counting_norm(*args, **kwargs):
+        calls.append(1)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(base, "norm_with_deseq", counting_norm)
+
+    target = tmp_path / "output.csv"
+    args = [
+        case_data_path,
+        control_data_path,
+        "--output-file",
+        target,
+        "--methods",
+        "norm_fold_change",
+        "norm_s2n_ratio",
+        "norm_bws_test",
+    ]
+    bin([str(x) for x in args])
+
+    assert len(calls) == 1
+
+
+def test_integration_chunked(tmp_path, case_data_path, control_data_path):
+    target = tmp_path / "output.csv"
+    args = [
+        case_data_path,
+        control_data_path,
+        "--output-file",
+        target,
+        "--chunk-size",
+        "2",
+        "fold_change",
+    ]
+    bin([str(x) for x in args])
+
+    with target.open("r") as stream:
+        output = stream.read()
+
+    compare_csvs(output, expected_fold_change)
+
+
+def test_integration_chunked_rejects_normalized(case_data_path, control_data_path):
+    args = [case_data_path, control_data_path, "--chunk-size", "2", "norm_fold_change"]
+
+    with pytest.raises(SystemExit):
+        bin([str(x) for x in args])
+
+
+def test_integration_profile(tmp_path, case_data_path, control_data_path):
+    target = tmp_path / "output.csv"
+    report_path = tmp_path / "report.json"
+    args = [
+        case_data_path,
+        control_data_path,
+        "--output-file",
+        target,
+        "--profile",
+        report_path,
+        "--methods",
+        "fold_change",
+        "norm_fold_change",
+    ]
+
+    bin([str(x) for x in args])
+
+    report = json.loads(report_path.read_text())
+    names = [x["name"] for x in report["stages"]]
+    # Both matrices are loaded at the same time, in any order
+    assert sorted(names[:2]) == ["load:case", "load:control"]
+    assert names[2:] == [
+        "align",
+        "rank:fold_change",
+        "normalize",
+        "rank:norm_fold_change",
+        "write",
+    ]
+    align = report["stages"][2]
+    assert align["size_bytes"] == 3 * 6 * 8
+    assert all(x["seconds"] >= 0 for x in report["stages"])
+
+
+def test_integration_rnk(tmp_path, case_data_path, control_data_path):
+    target = tmp_path / "output.rnk"
+    args = [case_data_path, control_data_path, "--output-file", target, "fold_change"]
+
+    bin([str(x) for x in args])
+
+    lines = target.read_text().splitlines()
+    assert [x.split("\t")[0] for x in lines] == ["gene_3", "gene_2", "gene_1"]
+
+
+def test_integration_filtering(tmp_path, case_data_path, control_data_path):
+    target = tmp_path / "output.csv"
+    deny_list = tmp_path / "deny.txt"
+    deny_list.write_text("gene_2\n")
+    args = [
+        case_data_path,
+        control_data_path,
+        "--output-file",
+        target,
+        "--deny-list",
+        deny_list,
+        "--min-mean",
+        "1",
+        "fold_change",
+    ]
+
+    bin([str(x) for x in args])
+
+    result = pd.read_csv(target)
+    assert result["gene_id"].tolist() == ["gene_1", "gene_3"]
+
+
+def test_integration_stability(tmp_path, case_data_path, control_data_path):
+    target = tmp_path / "output.csv"
+    args = [
+        case_data_path,
+        control_data_path,
+        "--output-file",
+        target,
+        "--stability",
+        "bootstrap",
+        "--resamples",
+        "20",
+        "--seed",
+        "1",
+        "fold_change",
+    ]
+
+    bin([str(x) for x in args])
+
+    result = pd.read_csv(target)
+    assert result.columns.tolist() == [
+        "gene_id",
+        "ranking",
+        "rank",
+        "rank_low",
+        "rank_high",
+        "rank_median",
+        "stability",
+    ]
+    assert result["rank"].tolist() == [3, 2, 1]
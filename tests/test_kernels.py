@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+from gene_ranker.dual_dataset import DualDataset
+from gene_ranker.methods import RANKING_METHODS
+from gene_ranker.methods.mann_whitney import mann_whitney_auc, mann_whitney_u
+from gene_ranker.methods.medians import median_log_ratio
+from gene_ranker.methods.moderated_t import fit_variance_prior, moderated_t
+from gene_ranker.methods.registry import RankingMethod
+from gene_ranker.methods.welch import welch_t
+from gene_ranker.parallel import make_executor
+from gene_ranker.ranker import rank_dual_dataset
+from gene_ranker.synthetic import synthetic_dual_matrices
+
+
+@pytest.fixture
+def arrays():
+    rng = np.random.default_rng(0)
+    # Low counts, so there are many ties
+    case = np.log2(rng.poisson(5, size=(300, 7)) + 1.0)
+    control = np.log2(rng.poisson(6, size=(300, 5)) + 1.0)
+    return case, control
+
+
+def test_kernels_match_scipy(arrays):
+    case, control = arrays
+
+    np.testing.assert_allclose(
+        welch_t(case, control),
+        stats.ttest_ind(case, control, axis=1, equal_var=False).statistic,
+    )
+    u = stats.mannwhitneyu(case, control, axis=1).statistic
+    np.testing.assert_allclose(mann_whitney_u(case, control), u)
+    np.testing.assert_allclose(mann_whitney_auc(case, control), u / (7 * 5))
+    np.testing.assert_allclose(
+        median_log_ratio(case, control),
+        np.median(case, axis=1) - np.median(control, axis=1),
+    )
+
+
+def test_variance_prior_is_recovered():
+    rng = np.random.default_rng(1)
+    true_var = 0.5 * 4 / rng.chisquare(4, 50_000)
+    variances = true_var * rng.chisquare(10, 50_000) / 10
+
+    prior_df, prior_var = fit_variance_prior(variances, 10)
+
+    assert prior_df == pytest.approx(4, rel=0.05)
+    assert prior_var == pytest.approx(0.5, rel=0.05)
+
+
+def test_moderated_t_shrinks_towards_the_t_statistic(arrays):
+    case, control = arrays
+    t = stats.ttest_ind(case, control, axis=1).statistic
+
+    moderated = moderated_t(case, control)
+
+    assert np.isfinite(moderated).all()
+    assert np.corrcoef(moderated, t)[0, 1] > 0.9
+    # Genes with the same values get the same statistic
+    same = np.tile([[0.0, 1.0, 3.0]], (50, 1))
+    result = moderated_t(same + 1, same)
+    assert np.isfinite(result).all()
+    np.testing.assert_allclose(result, result[0])
+
+
+def test_kernel_only_methods_are_ranked_by_the_framework():
+    case, control = synthetic_dual_matrices(200, 6, 5, seed=2)
+    dual_dataset = DualDataset(case, control)
+    keys = ["welch_t", "moderated_t", "mann_whitney_auc", "median_ratio"]
+    methods = {key: RANKING_METHODS[key] for key in keys}
+
+    result = rank_dual_dataset(dual_dataset, methods)
+
+    for key in keys:
+        expected = methods[key].kernel(
+            dual_dataset.case_values, dual_dataset.control_values
+        )
+        np.testing.assert_allclose(result[key], expected)
+
+    # Row-independent kernels give the same results in parallel blocks
+    parallel = {k: v for k, v in methods.items() if v.row_independent}
+    with make_executor(2) as executor:
+        blocks = rank_dual_dataset(dual_dataset, parallel, jobs=2, executor=executor)
+    pd.testing.assert_frame_equal(blocks, result[blocks.columns])
+
+
+def test_method_needs_exec_or_kernel():
+    with pytest.raises(ValueError):
+        RankingMethod(name="Nothing", exec=None, parser=None)
@@ -0,0 +1,115 @@
+import pickle
+import subprocess
+import sys
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+from gene_ranker.dual_dataset import DualDataset
+from gene_ranker.methods import RANKING_METHODS
+from gene_ranker.methods.base import norm_wrapper
+from gene_ranker.methods.fold_change import fold_change_ranking
+from gene_ranker.parallel import make_executor, rank_in_blocks, split_dual_dataset
+from gene_ranker.ranker import rank_dual_dataset
+from gene_ranker.shared import SharedDualDataset
+
+
+@pytest.fixture
+def random_dual_dataset():
+    rng = np.random.default_rng(0)
+    genes = [f"gene_{i}" for i in range(37)]
+    case = pd.DataFrame(rng.uniform(1, 10, size=(37, 4)), columns=list("abcd"))
+    control = pd.DataFrame(rng.uniform(1, 10, size=(37, 3)), columns=list("efg"))
+    case.insert(0, "gene_id", genes)
+    control.insert(0, "gene_id", genes)
+
+    return DualDataset(case=case, control=control)
+
+
+def test_split_dual_dataset(random_dual_dataset):
+    blocks = split_dual_dataset(random_dual_dataset, 4)
+
+    assert len(blocks) == 4
+    ids = pd.concat([x.merged["gene_id"] for x in blocks], ignore_index=True)
+    assert ids.equals(random_dual_dataset.merged["gene_id"])
+
+
+def test_norm_wrapper_pickles():
+    method = norm_wrapper(fold_change_ranking)
+
+    assert pickle.loads(pickle.dumps(method)).exec is fold_change_ranking
+
+
+def test_parallel_matches_serial(random_dual_dataset):
+    keys = ["fold_change", "s2n_ratio", "bws_test", "norm_cohen_d"]
+    methods = {key: RANKING_METHODS[key] for key in keys}
+
+    serial = rank_dual_dataset(random_dual_dataset, methods)
+    parallel = rank_dual_dataset(random_dual_dataset, methods, jobs=3)
+
+    assert_frame_equal(serial, parallel, check_exact=True)
+
+
+def segment_exists(name):
+    return Path("/dev/shm", name).exists()
+
+
+needs_dev_shm = pytest.mark.skipif(
+    not Path("/dev/shm").is_dir(), reason="Shared memory is not in /dev/shm"
+)
+
+
+@needs_dev_shm
+def test_shared_blocks_rank_like_the_whole_dataset(random_dual_dataset):
+    serial = fold_change_ranking(random_dual_dataset)
+
+    with make_executor(2) as executor:
+        with SharedDualDataset(random_dual_dataset) as shared:
+            names = [shared.case.name, shared.control.name]
+            assert all(segment_exists(x) for x in names)
+            parallel = rank_in_blocks(executor, fold_change_ranking, shared, {}, 3)
+
+    assert_frame_equal(serial, parallel, check_exact=True)
+    assert not any(segment_exists(x) for x in names)
+
+
+def test_shared_blocks_are_views(random_dual_dataset):
+    with SharedDualDataset(random_dual_dataset) as shared:
+        block = shared.blocks(3)[1]
+        block = pickle.loads(pickle.dumps(block))
+        case_shm = SharedMemory(name=block.case.name)
+        control_shm = SharedMemory(name=block.control.name)
+        values = block.dual_dataset(case_shm, control_shm).case_values
+
+        assert not values.flags.owndata
+        assert not values.flags.writeable
+        rows = slice(block.start, block.start + len(block.ids))
+        np.testing.assert_array_equal(values, random_dual_dataset.case_values[rows])
+        del values
+        case_shm.close()
+        control_shm.close()
+
+
+@needs_dev_shm
+@pytest.mark.parametrize("end", ["raise ValueError", "raise KeyboardInterrupt"])
+def test_segments_are_removed_on_errors(end):
+    script = (
+        "import numpy as np\n"
+        "from gene_ranker.dual_dataset import DualDataset\n"
+        "from gene_ranker.shared import SharedDualDataset\n"
+        "data = DualDataset.from_arrays(np.array(['a']), np.ones((1, 1)),"
+        " np.ones((1, 1)), ['x'], ['y'])\n"
+        "shared = SharedDualDataset(data)\n"
+        "print(shared.case.name, shared.control.name, flush=True)\n"
+        f"{end}\n"
+    )
+    run = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True)
+
+    assert run.returncode != 0
+    names = run.stdout.split()
+    assert len(names) == 2
+    assert not any(segment_exists(x) for x in names)
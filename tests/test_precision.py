@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from gene_ranker.filtering import GeneFilter
+from gene_ranker.methods import RANKING_METHODS
+from gene_ranker.methods.base import normalize_dual_dataset
+from gene_ranker.ranker import load_dual_dataset, run_methods
+from gene_ranker.synthetic import synthetic_dual_matrices
+
+METHODS = ["fold_change", "s2n_ratio", "cohen_d", "bws_test", "norm_fold_change"]
+
+
+@pytest.fixture
+def matrices(tmp_path):
+    case, control = synthetic_dual_matrices(500, 6, 5, sparsity=0.1, seed=4)
+    case.to_csv(tmp_path / "case.csv", index=False)
+    control.to_csv(tmp_path / "control.csv", index=False)
+    return tmp_path / "case.csv", tmp_path / "control.csv"
+
+
+def test_float32_is_kept_end_to_end(matrices):
+    dual_dataset = load_dual_dataset(*matrices, dtype="float32")
+    assert dual_dataset.case_values.dtype == np.float32
+
+    normalized = normalize_dual_dataset(dual_dataset.copy())
+    assert normalized.normalized
+    assert normalized.control_values.dtype == np.float32
+
+    filtered = GeneFilter(min_mean=1).apply(normalized)
+    assert filtered.case_values.dtype == np.float32
+
+
+def test_float32_gives_the_same_rank_order(matrices):
+    methods = {key: RANKING_METHODS[key] for key in METHODS}
+    single = run_methods(*matrices, methods, precision="float32")
+    double = run_methods(*matrices, methods, precision="float64")
+
+    for key in METHODS:
+        np.testing.assert_allclose(single[key], double[key], rtol=1e-4, atol=1e-5)
+        order_single = np.argsort(-single[key].to_numpy(), kind="stable")
+        order_double = np.argsort(-double[key].to_numpy(), kind="stable")
+        np.testing.assert_array_equal(order_single, order_double, err_msg=key)
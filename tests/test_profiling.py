@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from gene_ranker.methods import RANKING_METHODS
+from gene_ranker.profiling import Profiler, maybe_stage, size_of
+from gene_ranker.ranker import run_method
+
+
+def test_stage_hooks():
+    profiler = Profiler()
+    seen = []
+    profiler.subscribe(seen.append)
+
+    with profiler.stage("one") as stage:
+        stage.record(np.zeros((4, 2)), note="hello")
+    with pytest.raises(RuntimeError):
+        with profiler.stage("two"):
+            raise RuntimeError()
+
+    assert [x.name for x in seen] == ["one", "two"]
+    assert seen[0].size_bytes == 4 * 2 * 8
+    assert seen[0].shape == (4, 2)
+    assert seen[0].info == {"note": "hello"}
+    assert seen[1].size_bytes is None
+    assert profiler.report()["stages"][0]["name"] == "one"
+
+
+def test_maybe_stage_without_profiler():
+    with maybe_stage(None, "nothing") as stage:
+        stage.record(pd.DataFrame({"a": [1, 2]}))
+
+
+def test_size_of():
+    frame = pd.DataFrame({"a": np.zeros(10)})
+
+    assert size_of(frame) == frame.memory_usage(index=True).sum()
+    assert size_of("not data") is None
+
+
+def test_run_method_profiled(tmp_path):
+    case = tmp_path / "case.csv"
+    control = tmp_path / "control.csv"
+    case.write_text("gene_id,a,b\ng1,1,2\ng2,3,4\n")
+    control.write_text("gene_id,c,d\ng1,2,2\ng2,1,1\n")
+    profiler = Profiler()
+    seen = []
+    profiler.subscribe(lambda x: seen.append(x.name))
+
+    run_method(case, control, RANKING_METHODS["fold_change"], profiler=profiler)
+
+    # The two matrices are loaded at the same time, in any order
+    assert sorted(seen[:2]) == ["load:case", "load:control"]
+    # Stages are named after the method, not the "ranking" output column
+    assert seen[2:] == ["align", "rank:fold_change"]
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+from scipy.stats import rankdata
+
+from gene_ranker.methods import bws
+from gene_ranker.rankdata import rank_rows
+
+
+@pytest.mark.parametrize("ties", ["max", "min", "average"])
+def test_rank_rows_matches_scipy(ties):
+    rng = np.random.default_rng(0)
+    # Low counts, so most rows have many ties (and many zeros)
+    data = rng.poisson(1, size=(200, 15)).astype(float)
+
+    np.testing.assert_array_equal(
+        rank_rows(data, ties), rankdata(data, method=ties, axis=1)
+    )
+    np.testing.assert_array_equal(
+        rank_rows(data[0], ties), rankdata(data[0], method=ties)
+    )
+
+
+def test_rank_rows_keeps_float32():
+    data = np.array([[0.5, 0, 0.5]], dtype=np.float32)
+
+    ranks = rank_rows(data, "average")
+
+    assert ranks.dtype == np.float32
+    np.testing.assert_array_equal(ranks, [[2.5, 1, 2.5]])
+
+
+def test_rank_rows_rejects_unknown_ties():
+    with pytest.raises(ValueError):
+        rank_rows(np.zeros((2, 2)), "dense")
+
+
+def test_bws_rankdata_gives_max_ranks():
+    data = np.array([[3.0, 1.0], [1.0, 0.0]])
+
+    np.testing.assert_array_equal(bws.rankdata(data), [[4, 3], [3, 1]])
@@ -1,13 +1,15 @@
 from io import StringIO
 
+import numpy as np
 import pandas as pd
-import pydeseq2
+import pydeseq2.preprocessing
 import pytest
 from pandas.testing import assert_frame_equal
 
 from gene_ranker.dual_dataset import DualDataset
 from gene_ranker.methods import fold_change_ranking, signal_to_noise_ratio
 from gene_ranker.methods.base import move_col_to_front
+from gene_ranker.methods.bws import bws_score, bws_statistic
 from gene_ranker.ranker import filter_dataset
 
 
@@ -144,3 +146,17 @@ def test_signal_to_noise_ratio(test_case_data, test_control_data):
     computed = signal_to_noise_ratio(dual_data)
 
     assert_frame_equal(expected, computed, check_like=True)
+
+
+@pytest.mark.parametrize("alternative", ["one-sided", "two-sided"])
+def test_bws_statistic_matches_bws_score(alternative):
+    rng = np.random.default_rng(42)
+    # Round the values so that there are plenty of ties, both within and
+    # between case and control.
+    case = rng.integers(0, 4, size=(50, 7)).astype(float)
+    control = rng.integers(0, 4, size=(50, 5)).astype(float)
+
+    expected = [bws_score(x, y, alternative) for x, y in zip(case, control)]
+    computed = bws_statistic(case, control, alternative)
+
+    np.testing.assert_allclose(computed, expected)
@@ -0,0 +1,114 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+from gene_ranker.ranker import load_dual_dataset
+from gene_ranker.readers import read_matrix
+
+
+@pytest.fixture
+def test_case_data():
+    return pd.DataFrame(
+        {
+            "gene_id": ["gene_1", "gene_2", "gene_3"],
+            "sample_1": [2.5, 0.1, 6.0],
+            "sample_2": [1.0, 0, 3.2],
+            "sample_3": [1.2, 0.5, 5.01],
+        }
+    )
+
+
+@pytest.mark.parametrize("name", ["matrix.csv", "matrix.csv.gz", "matrix.tsv"])
+def test_read_text_matrix(tmp_path: Path, test_case_data, name):
+    target = tmp_path / name
+    test_case_data.to_csv(target, index=False, sep="\t" if "tsv" in name else ",")
+
+    assert_frame_equal(read_matrix(target), test_case_data)
+
+
+@pytest.mark.parametrize("name", ["matrix.parquet", "matrix.feather"])
+def test_read_arrow_matrix(tmp_path: Path, test_case_data, name):
+    pytest.importorskip("pyarrow")
+    target = tmp_path / name
+    if name.endswith(".parquet"):
+        test_case_data.to_parquet(target, index=False)
+    else:
+        test_case_data.to_feather(target)
+
+    assert_frame_equal(read_matrix(target), test_case_data)
+
+
+def test_read_npy_matrix(tmp_path: Path, test_case_data):
+    target = tmp_path / "matrix.npy"
+    np.save(target, test_case_data.drop(columns="gene_id").to_numpy())
+    (tmp_path / "matrix.genes.txt").write_text("gene_1\ngene_2\ngene_3\n")
+    (tmp_path / "matrix.samples.txt").write_text("sample_1\nsample_2\nsample_3\n")
+
+    assert_frame_equal(read_matrix(target), test_case_data)
+
+
+def test_read_npy_matrix_needs_ids(tmp_path: Path):
+    target = tmp_path / "matrix.npy"
+    np.save(target, np.zeros((3, 2)))
+
+    with pytest.raises(ValueError):
+        read_matrix(target)
+
+
+@pytest.mark.parametrize(
+    "name", ["matrix.csv", "matrix.tsv", "matrix.parquet", "matrix.npy"]
+)
+@pytest.mark.parametrize("dtype", ["float32", "float64"])
+def test_read_matrix_with_schema(tmp_path: Path, test_case_data, name, dtype):
+    target = tmp_path / name
+    if name.endswith(".parquet"):
+        pytest.importorskip("pyarrow")
+        test_case_data.to_parquet(target, index=False)
+    elif name.endswith(".npy"):
+        np.save(target, test_case_data.drop(columns="gene_id").to_numpy())
+        (tmp_path / "matrix.genes.txt").write_text("gene_1\ngene_2\ngene_3\n")
+        (tmp_path / "matrix.samples.txt").write_text("sample_1\nsample_2\nsample_3\n")
+    else:
+        test_case_data.to_csv(target, index=False, sep="\t" if "tsv" in name else ",")
+
+    expected = test_case_data.astype({f"sample_{i}": dtype for i in (1, 2, 3)})
+    assert_frame_equal(read_matrix(target, dtype=dtype), expected)
+
+
+def test_read_matrix_with_schema_reads_ids_as_strings(tmp_path: Path):
+    target = tmp_path / "matrix.csv"
+    target.write_text("gene_id,a\n10,1\n2,2\n")
+
+    data = read_matrix(target, dtype="float64")
+
+    assert data["gene_id"].tolist() == ["10", "2"]
+    assert data["a"].dtype == np.float64
+
+
+def test_load_checks_columns_first(tmp_path: Path, test_case_data):
+    test_case_data.to_csv(tmp_path / "case.csv", index=False)
+    test_case_data.to_csv(tmp_path / "control.csv", index=False)
+
+    with pytest.raises(ValueError, match="share columns"):
+        load_dual_dataset(tmp_path / "case.csv", tmp_path / "control.csv")
+    with pytest.raises(ValueError, match="not in both"):
+        load_dual_dataset(tmp_path / "case.csv", tmp_path / "control.csv", "id")
+
+
+def test_load_dual_dataset(tmp_path: Path, test_case_data):
+    control = test_case_data.rename(columns=lambda x: x.replace("sample", "ctrl"))
+    test_case_data.iloc[::-1].to_csv(tmp_path / "case.csv", index=False)
+    control.iloc[1:].to_csv(tmp_path / "control.csv", index=False)
+
+    dual_dataset = load_dual_dataset(
+        tmp_path / "case.csv", tmp_path / "control.csv", dtype="float32"
+    )
+
+    assert dual_dataset.ids.tolist() == ["gene_2", "gene_3"]
+    assert dual_dataset.case_values.dtype == np.float32
+    np.testing.assert_array_equal(
+        dual_dataset.control_values, control.iloc[1:, 1:].to_numpy(dtype="float32")
+    )
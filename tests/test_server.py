@@ -0,0 +1,210 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+from gene_ranker.dual_dataset import DualDataset
+from gene_ranker.methods import RANKING_METHODS
+from gene_ranker.ranker import rank_dual_dataset
+from gene_ranker.server import CohortStore, LoadError, NotFound, make_server
+from gene_ranker.synthetic import synthetic_dual_matrices
+
+
+@pytest.fixture
+def cohort_files(tmp_path):
+    case, control = synthetic_dual_matrices(200, 5, 4, seed=1)
+    case.to_csv(tmp_path / "case.csv", index=False)
+    control.to_csv(tmp_path / "control.csv", index=False)
+    case.merge(control, on="gene_id").to_csv(tmp_path / "all.csv", index=False)
+    return tmp_path, case, control
+
+
+def test_store_ranks_like_rank_dual_dataset(cohort_files):
+    path, case, control = cohort_files
+    store = CohortStore()
+    store.register("pair", case=path / "case.csv", control=path / "control.csv")
+    methods = ["fold_change", "norm_fold_change", "cohen_d"]
+
+    result = store.rank("pair", methods)
+    expected = rank_dual_dataset(
+        DualDataset(case, control), {k: RANKING_METHODS[k] for k in methods}
+    )
+    pd.testing.assert_frame_equal(result, expected[result.columns])
+
+    # The aligned and normalized data is kept, and reused
+    normalized = store.contrast("pair", normalized=True)
+    store.rank("pair", methods)
+    assert store.contrast("pair", normalized=True) is normalized
+
+
+def test_store_ranks_sample_subsets(cohort_files):
+    path, case, control = cohort_files
+    store = CohortStore()
+    store.register("all", matrix=path / "all.csv")
+    subset_case, subset_control = ["case_1", "case_2"], ["control_1", "control_3"]
+
+    result = store.rank("all", ["cohen_d"], subset_case, subset_control)
+    expected = rank_dual_dataset(
+        DualDataset(
+            case[["gene_id", *subset_case]], control[["gene_id", *subset_control]]
+        ),
+        {"cohen_d": RANKING_METHODS["cohen_d"]},
+    )
+    pd.testing.assert_frame_equal(result, expected)
+
+    with pytest.raises(ValueError):
+        # A matrix has no default contrast
+        store.rank("all", ["cohen_d"])
+    with pytest.raises(NotFound):
+        store.rank("missing", ["cohen_d"])
+
+
+def test_store_checks_method_options(cohort_files, tmp_path):
+    path, *_ = cohort_files
+    store = CohortStore()
+    store.register("pair", case=path / "case.csv", control=path / "control.csv")
+
+    result = store.rank(
+        "pair", ["cohen_d"], extra_args={"cohen_d": {"backend": "native"}}
+    )
+    assert result.columns.tolist() == ["gene_id", "cohen_d"]
+
+    bad_args = [
+        # Paths on the server cannot be chosen by clients
+        {"deseq_shrinkage": {"fit_cache": str(tmp_path / "chosen")}},
+        {"cohen_d": {"backend": "something"}},
+        {"cohen_d": {"not_an_option": 1}},
+        {"fold_change": {"backend": "native"}},
+        {"cohen_d": ["backend"]},
+        ["cohen_d"],
+    ]
+    for extra_args in bad_args:
+        with pytest.raises(ValueError):
+            store.rank("pair", ["cohen_d", "deseq_shrinkage"], extra_args=extra_args)
+    assert not (tmp_path / "chosen").exists()
+
+
+def test_store_evicts_least_recently_used(cohort_files):
+    path, *_ = cohort_files
+    store = CohortStore(max_cohorts=2)
+    for name in "abc":
+        store.register(name, matrix=path / "all.csv")
+
+    first = store.get("a")
+    store.get("b")
+    store.get("a")
+    store.get("c")
+
+    status = store.status()
+    assert [status[x]["loaded"] for x in "abc"] == [True, False, True]
+    assert store.get("a") is first
+
+
+def test_store_loads_once_for_concurrent_requests(cohort_files, monkeypatch):
+    path, *_ = cohort_files
+    store = CohortStore()
+    store.register("all", matrix=path / "all.csv")
+    store.register("other", matrix=path / "all.csv")
+    loads = []
+    started = threading.Event()
+    release = threading.Event()
+    load = store._load
+
+    def slow_load(name, paths):
+        loads.append(name)
+        if name == "all":
+            started.set()
+            release.wait(10)
+        return load(name, paths)
+
+    monkeypatch.setattr(store, "_load", slow_load)
+
+    with ThreadPoolExecutor(4) as pool:
+        waiting = [pool.submit(store.get, "all") for _ in range(3)]
+        started.wait(10)
+        # Other cohorts are not held up by the slow one
+        pool.submit(store.get, "other").result(timeout=10)
+        release.set()
+        cohorts = [x.result(timeout=10) for x in waiting]
+
+    assert sorted(loads) == ["all", "other"]
+    assert all(x is cohorts[0] for x in cohorts)
+
+
+def test_store_hides_load_errors(tmp_path):
+    store = CohortStore()
+    store.register("broken", matrix=tmp_path / "missing.csv")
+
+    with pytest.raises(LoadError) as error:
+        store.get("broken")
+    assert str(tmp_path) not in str(error.value)
+
+
+def test_server_answers_requests(cohort_files):
+    path, *_ = cohort_files
+    store = CohortStore()
+    store.register("pair", case=path / "case.csv", control=path / "control.csv")
+    server = make_server(store)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = "http://{}:{}".format(*server.server_address[:2])
+
+    def post(route, body):
+        request = urllib.request.Request(
+            url + route,
+            data=json.dumps(body).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(request) as response:
+            return response.read().decode()
+
+    try:
+        # Clients cannot add cohorts unless the server allows it
+        with pytest.raises(urllib.error.HTTPError) as error:
+            post("/cohorts", {"name": "all", "matrix": str(path / "all.csv")})
+        assert error.value.code == 403
+        server.allow_register = True
+        post("/cohorts", {"name": "all", "matrix": str(path / "all.csv")})
+        with pytest.raises(urllib.error.HTTPError) as error:
+            post("/cohorts", {"name": "lost", "matrix": str(path / "lost.csv")})
+        assert error.value.code == 500
+        assert str(path) not in error.value.read().decode()
+
+        with urllib.request.urlopen(url + "/cohorts") as response:
+            assert set(json.loads(response.read())) == {"pair", "all"}
+
+        records = json.loads(
+            post(
+                "/rank",
+                {
+                    "cohort": "all",
+                    "methods": ["fold_change"],
+                    "case": ["case_1", "case_2"],
+                    "control": ["control_1", "control_2"],
+                },
+            )
+        )
+        assert len(records) == 200
+        assert set(records[0]) == {"gene_id", "fold_change"}
+
+        csv = post(
+            "/rank", {"cohort": "pair", "methods": ["s2n_ratio"], "format": "csv"}
+        )
+        assert csv.splitlines()[0] == "gene_id,s2n_ratio"
+
+        with pytest.raises(urllib.error.HTTPError) as error:
+            post("/rank", {"cohort": "missing", "methods": ["fold_change"]})
+        assert error.value.code == 404
+        with pytest.raises(urllib.error.HTTPError) as error:
+            post("/rank", {"cohort": "pair", "methods": ["not_a_method"]})
+        assert error.value.code == 400
+        with pytest.raises(urllib.error.HTTPError) as error:
+            post("/rank", {"cohort": "pair", "methods": ["cohen_d"], "args": []})
+        assert error.value.code == 400
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+from scipy import io, sparse
+
+from gene_ranker.methods import RANKING_METHODS
+from gene_ranker.ranker import load_any_dual_dataset, run_methods
+from gene_ranker.readers import read_matrix
+from gene_ranker.sparse import load_sparse_dual_dataset, split_constant
+from gene_ranker.synthetic import synthetic_dual_matrices
+
+METHODS = [
+    "fold_change",
+    "cohen_d",
+    "mann_whitney_auc",
+    "norm_fold_change",
+    "bws_test",
+    "norm_bws_test",
+    "moderated_t",
+]
+
+
+def write_sparse(frame, path):
+    values = sparse.csr_array(frame.drop(columns="gene_id").to_numpy())
+    if path.suffix == ".npz":
+        sparse.save_npz(path, values)
+    else:
+        io.mmwrite(path, values)
+    stem = path.name[: -len(path.suffix)]
+    (path.parent / f"{stem}.genes.txt").write_text("\n".join(frame["gene_id"]))
+    (path.parent / f"{stem}.samples.txt").write_text("\n".join(frame.columns[1:]))
+
+
+@pytest.fixture
+def frames():
+    case, control = synthetic_dual_matrices(300, 6, 5, sparsity=0.2, seed=2)
+    # Genes never expressed, and a gene expressed the same everywhere
+    case.iloc[:40, 1:] = 0
+    control.iloc[:40, 1:] = 0
+    case.iloc[40, 1:] = 3
+    control.iloc[40, 1:] = 3
+    # Shuffle the control genes, so they have to be aligned
+    control = control.sample(frac=1, random_state=1)
+    return case, control
+
+
+@pytest.mark.parametrize("suffix", [".mtx", ".npz"])
+def test_sparse_input_ranks_like_dense_input(tmp_path, frames, suffix):
+    case, control = frames
+    case.to_csv(tmp_path / "case.csv", index=False)
+    control.to_csv(tmp_path / "control.csv", index=False)
+    write_sparse(case, tmp_path / f"case{suffix}")
+    write_sparse(control, tmp_path / f"control{suffix}")
+
+    methods = {key: RANKING_METHODS[key] for key in METHODS}
+    # Skipping constant genes must not change any result
+    dense = run_methods(tmp_path / "case.csv", tmp_path / "control.csv", methods)
+    skipped = run_methods(
+        tmp_path / "case.csv", tmp_path / "control.csv", methods, skip_constant=True
+    )
+    result = run_methods(
+        tmp_path / f"case{suffix}", tmp_path / f"control{suffix}", methods
+    )
+
+    for other in (skipped, result):
+        assert other["gene_id"].tolist() == dense["gene_id"].tolist()
+        for key in METHODS:
+            np.testing.assert_allclose(other[key], dense[key], rtol=1e-10)
+
+    never_expressed = result["gene_id"].isin(case["gene_id"][:40])
+    assert (result.loc[never_expressed, "mann_whitney_auc"] == 0.5).all()
+    assert (result.loc[never_expressed, "fold_change"] == 0).all()
+
+
+def test_sparse_loader_leaves_out_zero_genes(tmp_path, frames):
+    case, control = frames
+    write_sparse(case, tmp_path / "case.mtx")
+    write_sparse(control, tmp_path / "control.mtx")
+
+    dual_dataset, zeros = load_sparse_dual_dataset(
+        tmp_path / "case.mtx", tmp_path / "control.mtx"
+    )
+
+    assert len(zeros) >= 40
+    assert not np.isin(case["gene_id"][:40], dual_dataset.ids).any()
+    assert len(dual_dataset.ids) + len(zeros) == len(case)
+    assert (zeros.values == 0).all()
+    # Genes that are the same, but not zero, in all samples are normalized
+    assert case["gene_id"][40] in dual_dataset.ids
+
+    # Splitting the dense data finds the same genes
+    dense, _ = load_any_dual_dataset(tmp_path / "case.mtx", tmp_path / "control.mtx")
+    assert len(split_constant(dense, zero=True)[1]) == 0
+
+    restored = zeros.restore(dense)
+    assert restored.ids.tolist() == sorted(case["gene_id"])
+
+
+def test_sparse_matrices_are_read_dense(tmp_path, frames):
+    case, _ = frames
+    write_sparse(case, tmp_path / "case.mtx")
+
+    data = read_matrix(tmp_path / "case.mtx")
+
+    assert data.columns.tolist() == case.columns.tolist()
+    np.testing.assert_array_equal(data.iloc[:, 1:], case.iloc[:, 1:])
+
+
+def test_sparse_and_dense_inputs_cannot_be_mixed(tmp_path, frames):
+    case, control = frames
+    write_sparse(case, tmp_path / "case.mtx")
+    control.to_csv(tmp_path / "control.csv", index=False)
+
+    with pytest.raises(ValueError):
+        load_any_dual_dataset(tmp_path / "case.mtx", tmp_path / "control.csv")
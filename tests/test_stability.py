@@ -0,0 +1,151 @@
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from gene_ranker.dual_dataset import DualDataset
+from gene_ranker.methods import RANKING_METHODS
+from gene_ranker.methods.bws import bws_statistic
+from gene_ranker.methods.fold_change import fold_change
+from gene_ranker.ranker import rank_dual_dataset
+from gene_ranker.stability import (
+    StabilityOptions,
+    rank_genes,
+    rank_stability,
+    resampled_statistics,
+)
+from gene_ranker.synthetic import synthetic_dual_matrices
+
+
+@pytest.fixture
+def dual_dataset():
+    case, control = synthetic_dual_matrices(100, 6, 6, seed=4)
+    # Make the first gene very different between case and control
+    case.iloc[0, 1:] = 20.0
+    return DualDataset(case, control)
+
+
+def test_rank_genes():
+    stats = np.array([[1.0, 3.0], [np.nan, 2.0], [2.0, 1.0]])
+
+    assert rank_genes(stats).tolist() == [[2, 1], [3, 2], [1, 3]]
+
+
+@pytest.mark.parametrize("mode", ["bootstrap", "permutation"])
+@pytest.mark.parametrize("key", ["fold_change", "moderated_t"])
+def test_batches_match_one_by_one(dual_dataset, key, mode):
+    method = RANKING_METHODS[key]
+    options = StabilityOptions(resamples=7, seed=1, mode=mode)
+    case, control = dual_dataset.case_values, dual_dataset.control_values
+
+    def statistics():
+        return list(
+            resampled_statistics(
+                method.kernel,
+                case,
+                control,
+                options,
+                method.kernel_memory,
+                method.row_independent,
+            )
+        )
+
+    batched = np.hstack(statistics())
+
+    # Tiny batches give the same resamples, in the same order
+    options.max_batch_bytes = 1
+    single = statistics()
+    assert len(single) == 7
+    np.testing.assert_allclose(batched, np.hstack(single))
+
+
+@pytest.mark.parametrize(
+    "key", [k for k, v in RANKING_METHODS.items() if v.kernel is not None]
+)
+@pytest.mark.parametrize("dtype", ["float64", "float32"])
+def test_batches_fit_in_max_batch_bytes(key, dtype):
+    method = RANKING_METHODS[key]
+    rng = np.random.default_rng(0)
+    case = rng.normal(size=(2000, 3)).astype(dtype)
+    control = rng.normal(size=(2000, 4)).astype(dtype)
+    options = StabilityOptions(resamples=20, seed=0, max_batch_bytes=8 * 1024**2)
+    # Import the kernel before measuring
+    method.kernel(case[:2], control[:2])
+
+    tracemalloc.start()
+    try:
+        batches = resampled_statistics(
+            method.kernel, case, control, options, method.kernel_memory
+        )
+        next(batches)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # The concatenated input values are not part of the batch
+    assert peak <= options.max_batch_bytes + case.nbytes + control.nbytes
+
+
+@pytest.mark.parametrize("kernel", [fold_change, bws_statistic])
+def test_rank_stability(dual_dataset, kernel):
+    options = StabilityOptions(resamples=50, seed=0)
+
+    result = rank_stability(kernel, dual_dataset, options)
+    again = rank_stability(kernel, dual_dataset, options)
+
+    pd.testing.assert_frame_equal(result, again)
+    assert result.loc[0, "rank"] == 1
+    assert (result["rank_low"] <= result["rank_high"]).all()
+    assert result["stability"].between(0, 1).all()
+    assert result.loc[0, "stability"] > result["stability"].median()
+
+
+def test_quantiles_in_blocks_match(dual_dataset):
+    options = StabilityOptions(resamples=20, seed=3)
+    whole = rank_stability(fold_change, dual_dataset, options)
+
+    # Blocks of a single gene
+    options.max_batch_bytes = 1
+    pd.testing.assert_frame_equal(
+        rank_stability(fold_change, dual_dataset, options), whole
+    )
+
+
+def test_stability_in_pipeline(dual_dataset):
+    result = rank_dual_dataset(
+        dual_dataset,
+        {"fold_change": RANKING_METHODS["fold_change"]},
+        stability=StabilityOptions(resamples=10, seed=0),
+    )
+
+    assert result.columns.tolist() == [
+        "gene_id",
+        "fold_change",
+        "fold_change_rank",
+        "fold_change_rank_low",
+        "fold_change_rank_high",
+        "fold_change_rank_median",
+        "fold_change_stability",
+    ]
+
+    # Permutations describe the null ranks, so the columns are named apart
+    result = rank_dual_dataset(
+        dual_dataset,
+        {"fold_change": RANKING_METHODS["fold_change"]},
+        stability=StabilityOptions(resamples=10, seed=0, mode="permutation"),
+    )
+    assert result.columns.tolist()[2:] == [
+        "fold_change_rank",
+        "fold_change_null_rank_low",
+        "fold_change_null_rank_high",
+        "fold_change_null_rank_median",
+        "fold_change_null_spread",
+    ]
+
+    with pytest.raises(ValueError):
+        rank_dual_dataset(
+            dual_dataset,
+            {"deseq_shrinkage": RANKING_METHODS["deseq_shrinkage"]},
+            stability=StabilityOptions(resamples=10),
+        )
@@ -0,0 +1,92 @@
+import logging
+import subprocess
+import sys
+import time
+
+import pytest
+
+from gene_ranker.methods.registry import LazyCallable, MethodRegistry, RankingMethod
+
+log = logging.getLogger(__name__)
+
+HEAVY_MODULES = ["pydeseq2", "scipy", "pandas"]
+
+
+def run_python(code: str) -> str:
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    return result.stdout
+
+
+def timed_python(code: str) -> float:
+    start = time.perf_counter()
+    run_python(code)
+    return time.perf_counter() - start
+
+
+def test_cli_import_is_light():
+    code = (
+        "import sys\n"
+        "from gene_ranker.bin import bin\n"
+        "from gene_ranker.methods import RANKING_METHODS\n"
+        "list(RANKING_METHODS.values())\n"
+        f"print([x for x in {HEAVY_MODULES} if x in sys.modules])"
+    )
+    stdout = run_python(code)
+
+    assert stdout.strip() == "[]"
+
+
+def test_version_is_light():
+    code = (
+        "import sys\n"
+        "from gene_ranker.bin import bin\n"
+        "try:\n"
+        "    bin(['--version'])\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        f"print([x for x in {HEAVY_MODULES} if x in sys.modules])"
+    )
+    stdout = run_python(code)
+
+    assert stdout.strip().splitlines()[-1] == "[]"
+
+
+def test_startup_time(record_property):
+    # Timings are only recorded (in the JUnit XML report, and in the log),
+    # since they depend on the load of the machine running the tests.
+    # PyDESeq2 is the heaviest import the CLI used to make at startup.
+    version_time = timed_python(
+        "from gene_ranker.bin import bin\n"
+        "try:\n"
+        "    bin(['--version'])\n"
+        "except SystemExit:\n"
+        "    pass\n"
+    )
+    deseq_time = timed_python("import pydeseq2.ds")
+
+    record_property("version_seconds", round(version_time, 3))
+    record_property("pydeseq2_import_seconds", round(deseq_time, 3))
+    log.info(f"--version: {version_time:.3f}s, pydeseq2 import: {deseq_time:.3f}s")
+
+
+def test_lazy_callable():
+    func = LazyCallable("os.path:join")
+
+    assert func._target is None
+    assert func("a", "b") == "a/b" or func("a", "b") == "a\\b"
+    assert func.resolve() is __import__("os").path.join
+
+    with pytest.raises(ValueError):
+        LazyCallable("no_attribute")
+
+
+def test_registry_update():
+    registry = MethodRegistry()
+    method = RankingMethod(name="Test", exec="os.path:join", parser=None)
+
+    registry.update({"test": method})
+
+    assert list(registry) == ["test"]
+    assert registry["test"] is method
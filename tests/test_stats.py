@@ -0,0 +1,36 @@
+import numpy as np
+
+from gene_ranker.stats import SufficientStats
+
+
+def test_sufficient_stats_match_numpy():
+    rng = np.random.default_rng(1)
+    values = rng.normal(loc=1000, scale=2, size=(20, 9))
+
+    stats = SufficientStats.from_array(values)
+
+    np.testing.assert_array_equal(stats.n, np.full(20, 9))
+    np.testing.assert_allclose(stats.mean, values.mean(axis=1))
+    np.testing.assert_allclose(stats.var(ddof=1), values.var(axis=1, ddof=1))
+    np.testing.assert_allclose(stats.std(ddof=0), values.std(axis=1, ddof=0))
+
+
+def test_sufficient_stats_constant_rows():
+    values = np.array([[0.1, 0.1, 0.1], [7.3, 7.3, 7.3]])
+
+    stats = SufficientStats.from_array(values)
+
+    np.testing.assert_array_equal(stats.var(), [0, 0])
+    np.testing.assert_allclose(stats.mean, [0.1, 7.3])
+
+
+def test_merge_matches_full_stats():
+    rng = np.random.default_rng(0)
+    left = rng.normal(1e6, 1, size=(50, 4))
+    right = rng.normal(1e6, 1, size=(50, 3))
+
+    merged = SufficientStats.from_array(left).merge(SufficientStats.from_array(right))
+    full = SufficientStats.from_array(np.hstack([left, right]))
+
+    np.testing.assert_allclose(merged.mean, full.mean)
+    np.testing.assert_allclose(merged.var(), full.var(), rtol=1e-8)
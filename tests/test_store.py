@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from gene_ranker.bin import store_bin
+from gene_ranker.dual_dataset import DualDataset
+from gene_ranker.methods.cohen import cohen_d
+from gene_ranker.methods.fold_change import fold_change
+from gene_ranker.methods.signal_to_noise import signal_to_noise
+from gene_ranker.store import StatsStore
+from gene_ranker.synthetic import synthetic_dual_matrices
+
+
+@pytest.fixture
+def cohort():
+    return synthetic_dual_matrices(300, 6, 5, seed=3)
+
+
+def test_store_update_matches_full_ranking(tmp_path, cohort):
+    case, control = cohort
+    first_case, new_case = case.iloc[:, :4], case.iloc[:, [0, 4, 5, 6]]
+    first_control, new_control = control.iloc[:, :3], control.iloc[:, [0, 3, 4, 5]]
+
+    store = StatsStore.from_dual_dataset(DualDataset(first_case, first_control))
+    store.save(tmp_path / "store.npz")
+    store = StatsStore.load(tmp_path / "store.npz")
+    # New samples can list the genes in any order
+    store.update(case=new_case.sample(frac=1, random_state=0), control=new_control)
+    result = store.rank(["fold_change", "s2n_ratio", "cohen_d"])
+
+    full = DualDataset(case, control)
+    x, y = full.case_values, full.control_values
+    np.testing.assert_array_equal(result["gene_id"], full.ids)
+    np.testing.assert_allclose(result["fold_change"], fold_change(x, y))
+    np.testing.assert_allclose(result["s2n_ratio"], signal_to_noise(x, y))
+    np.testing.assert_allclose(result["cohen_d"], cohen_d(x, y))
+    assert store.case_samples == case.columns[1:].tolist()
+
+
+def test_store_rejects_bad_updates(cohort):
+    case, control = cohort
+    store = StatsStore.from_dual_dataset(DualDataset(case, control))
+
+    with pytest.raises(ValueError, match="already in the store"):
+        store.update(case=case)
+
+    renamed = case.rename(columns={"case_1": "new_0"})[["gene_id", "new_0"]]
+    with pytest.raises(ValueError, match="not in the new samples"):
+        store.update(case=renamed.iloc[:10])
+
+    with pytest.raises(ValueError, match="more than once"):
+        store.update(case=pd.concat([renamed, renamed.iloc[:1]]))
+
+    with pytest.raises(ValueError):
+        store.rank(["bws_test"])
+
+
+def test_store_matches_numeric_ids(cohort):
+    case, control = cohort
+    case["gene_id"] = np.arange(len(case)).astype(str)
+    control["gene_id"] = case["gene_id"]
+    store = StatsStore.from_dual_dataset(DualDataset(case, control))
+
+    new_case = case.rename(columns={"case_1": "new_0"})[["gene_id", "new_0"]]
+    new_case["gene_id"] = new_case["gene_id"].astype(int)
+    store.update(case=new_case)
+
+    assert store.case_samples[-1] == "new_0"
+
+
+def test_store_bin(tmp_path, cohort):
+    case, control = cohort
+    case.iloc[:, :4].to_csv(tmp_path / "case.csv", index=False)
+    case.iloc[:, [0, 4, 5, 6]].to_csv(tmp_path / "new_case.csv", index=False)
+    control.to_csv(tmp_path / "control.csv", index=False)
+    store = tmp_path / "store.npz"
+    output = tmp_path / "output.csv"
+
+    store_bin(
+        ["init", str(store), str(tmp_path / "case.csv"), str(tmp_path / "control.csv")]
+        + ["--no-rank"]
+    )
+    store_bin(
+        ["update", str(store), "--case", str(tmp_path / "new_case.csv")]
+        + ["--methods", "fold_change", "--output-file", str(output)]
+    )
+
+    full = DualDataset(case, control)
+    result = pd.read_csv(output)
+    np.testing.assert_allclose(
+        result["fold_change"], fold_change(full.case_values, full.control_values)
+    )
@@ -0,0 +1,23 @@
+import pandas as pd
+
+from gene_ranker.streaming import align_chunks
+
+
+def test_align_chunks_out_of_order():
+    case = pd.DataFrame(
+        {"gene_id": ["gene_1", "gene_2", "gene_3", "gene_4"], "a": [1, 2, 3, 4]}
+    )
+    control = pd.DataFrame(
+        {"gene_id": ["gene_3", "gene_1", "gene_5", "gene_2"], "b": [7, 5, 9, 6]}
+    )
+
+    def chunks(data, size):
+        return (data.iloc[i : i + size] for i in range(0, len(data), size))
+
+    pairs = list(align_chunks(chunks(case, 2), chunks(control, 2)))
+    case_out = pd.concat([x for x, _ in pairs], ignore_index=True)
+    control_out = pd.concat([y for _, y in pairs], ignore_index=True)
+
+    assert case_out["gene_id"].tolist() == control_out["gene_id"].tolist()
+    assert sorted(case_out["gene_id"]) == ["gene_1", "gene_2", "gene_3"]
+    assert (control_out["b"] - case_out["a"]).tolist() == [4, 4, 4]
@@ -0,0 +1,24 @@
+import numpy as np
+
+from gene_ranker.dual_dataset import DualDataset
+from gene_ranker.synthetic import synthetic_counts, synthetic_dual_matrices
+
+
+def test_synthetic_counts_sparsity():
+    counts = synthetic_counts(200, 50, sparsity=0.5, rng=np.random.default_rng(0))
+
+    assert counts.shape == (200, 50)
+    assert counts.min() >= 0
+    assert 0.45 < np.mean(counts == 0) < 0.8
+
+
+def test_synthetic_dual_matrices():
+    case, control = synthetic_dual_matrices(100, 4, 6, ties=0.5, seed=1)
+    again, _ = synthetic_dual_matrices(100, 4, 6, ties=0.5, seed=1)
+
+    assert case.shape == (100, 5)
+    assert control.shape == (100, 7)
+    assert case.equals(again)
+
+    dual_data = DualDataset(case=case, control=control)
+    assert dual_data.merged.shape == (100, 11)
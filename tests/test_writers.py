@@ -0,0 +1,135 @@
+import gzip
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from gene_ranker.writers import (
+    ResultWriter,
+    format_rows,
+    infer_format,
+    sort_order,
+    write_result,
+)
+
+
+@pytest.fixture
+def result():
+    return pd.DataFrame(
+        {
+            "gene_id": ["gene_1", "gene_2", "gene_3", "gene_4"],
+            "fold_change": [0.5, np.nan, 2.25, -1.0],
+            "bws_test": [1.0, 2.0, 3.0, 4.0],
+        }
+    )
+
+
+def test_infer_format(tmp_path):
+    assert infer_format(None) == "csv"
+    assert infer_format(tmp_path / "out.rnk.gz") == "rnk"
+    assert infer_format(tmp_path / "out.parquet") == "parquet"
+    assert infer_format(tmp_path / "out.unknown") == "csv"
+
+
+def test_sort_order_puts_nans_last():
+    assert sort_order(np.array([1.0, np.nan, 3.0, 1.0])).tolist() == [2, 0, 3, 1]
+
+
+def test_format_rows_matches_pandas(result):
+    expected = io.StringIO()
+    result.to_csv(expected, index=False, header=False)
+
+    assert format_rows(result) == expected.getvalue()
+
+
+@pytest.mark.parametrize("format", ["csv", "tsv"])
+def test_write_ids_that_need_quoting(result, format):
+    result["gene_id"] = ["a,b", 'x"y', "tab\there", "line\nbreak"]
+    result.columns = ["gene_id", "fold,change", "bws_test"]
+    stream = io.StringIO()
+
+    write_result(result, stream, format)
+
+    sep = "," if format == "csv" else "\t"
+    stream.seek(0)
+    pd.testing.assert_frame_equal(pd.read_csv(stream, sep=sep), result)
+
+
+def test_float32_is_written_at_its_precision(result):
+    result["fold_change"] = result["fold_change"].astype(np.float32) / 3
+    stream = io.StringIO()
+
+    write_result(result, stream)
+
+    assert "0.16666667," in stream.getvalue()
+    stream.seek(0)
+    written = pd.read_csv(stream, dtype={"fold_change": np.float32})
+    pd.testing.assert_frame_equal(written, result)
+
+
+def test_write_csv_in_blocks(result):
+    stream = io.StringIO()
+
+    with ResultWriter(stream) as writer:
+        writer.write(result.iloc[:2])
+        writer.write(result.iloc[2:])
+
+    expected = io.StringIO()
+    result.to_csv(expected, index=False)
+    assert stream.getvalue() == expected.getvalue()
+
+
+def test_write_rnk(tmp_path, result):
+    target = tmp_path / "out.rnk"
+
+    write_result(result, target, sort_by="fold_change")
+
+    assert target.read_text() == "gene_3\t2.25\ngene_1\t0.5\ngene_4\t-1.0\ngene_2\t\n"
+
+    with pytest.raises(ValueError):
+        write_result(result, tmp_path / "other.rnk")
+
+
+def test_write_sorted_blocks(result):
+    stream = io.StringIO()
+
+    with ResultWriter(stream, format="tsv", sort_by="bws_test") as writer:
+        writer.write(result.iloc[:2])
+        writer.write(result.iloc[2:])
+
+    lines = stream.getvalue().splitlines()
+    assert lines[0] == "gene_id\tfold_change\tbws_test"
+    assert [x.split("\t")[0] for x in lines[1:]] == [
+        "gene_4",
+        "gene_3",
+        "gene_2",
+        "gene_1",
+    ]
+
+
+def test_write_compressed(tmp_path, result):
+    target = tmp_path / "out.csv.gz"
+
+    write_result(result, target)
+
+    with gzip.open(target, "rt") as stream:
+        pd.testing.assert_frame_equal(pd.read_csv(stream), result)
+
+
+def test_write_parquet(tmp_path, result):
+    pytest.importorskip("pyarrow")
+    target = tmp_path / "out.parquet"
+
+    with ResultWriter(target) as writer:
+        writer.write(result.iloc[:2])
+        writer.write(result.iloc[2:])
+
+    pd.testing.assert_frame_equal(pd.read_parquet(target), result)
+
+
+def test_bad_formats():
+    with pytest.raises(ValueError):
+        ResultWriter(None, format="xlsx")
+    with pytest.raises(ValueError):
+        ResultWriter(None, format="parquet")